@@ -7,12 +7,18 @@ from aiogram.enums import ParseMode
 from app.config import settings
 
 
-def create_bot(token: str | None = None, **kwargs) -> Bot:
+# Connection cap for the long-lived bot shared by web API routes.
+SHARED_BOT_CONNECTION_LIMIT = 20
+
+_shared_bot: Bot | None = None
+
+
+def create_bot(token: str | None = None, *, connection_limit: int | None = None, **kwargs) -> Bot:
     """Create a Bot instance with SOCKS5 proxy and/or custom Telegram API server."""
     proxy_url = settings.get_proxy_url()
     telegram_api_url = settings.get_telegram_api_url()
     session = None
-    if proxy_url or telegram_api_url:
+    if proxy_url or telegram_api_url or connection_limit is not None:
         from aiogram.client.session.aiohttp import AiohttpSession
         from aiogram.client.telegram import TelegramAPIServer
 
@@ -21,8 +27,30 @@ def create_bot(token: str | None = None, **kwargs) -> Bot:
             session_kwargs['proxy'] = proxy_url
         if telegram_api_url:
             session_kwargs['api'] = TelegramAPIServer.from_base(telegram_api_url)
+        if connection_limit is not None:
+            session_kwargs['limit'] = connection_limit
 
         session = AiohttpSession(**session_kwargs)
 
     kwargs.setdefault('default', DefaultBotProperties(parse_mode=ParseMode.HTML))
     return Bot(token=token or settings.BOT_TOKEN, session=session, **kwargs)
+
+
+def get_shared_bot() -> Bot:
+    """Lazily create the process-wide Bot reused by web API routes.
+
+    Its aiohttp session keeps connections to Telegram alive between requests;
+    call ``close_shared_bot()`` on shutdown to release them.
+    """
+    global _shared_bot
+    if _shared_bot is None:
+        _shared_bot = create_bot(connection_limit=SHARED_BOT_CONNECTION_LIMIT)
+    return _shared_bot
+
+
+async def close_shared_bot() -> None:
+    """Close the shared Bot session, if one was created."""
+    global _shared_bot
+    bot, _shared_bot = _shared_bot, None
+    if bot is not None:
+        await bot.session.close()
@@ -18,6 +18,28 @@ logger = structlog.get_logger(__name__)
 
 STATE_TTL_SECONDS = 600  # 10 minutes
 
+# One keep-alive client shared by all providers: a login hits the same host for
+# the token exchange and the user-info fetch, so the second call skips the TLS handshake.
+_http_client: httpx.AsyncClient | None = None
+
+
+def _get_http_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            timeout=30,
+            limits=httpx.Limits(max_connections=40, max_keepalive_connections=10, keepalive_expiry=90),
+        )
+    return _http_client
+
+
+async def close_oauth_http_client() -> None:
+    """Close the shared OAuth HTTP client, if one was opened."""
+    global _http_client
+    client, _http_client = _http_client, None
+    if client is not None:
+        await client.aclose()
+
 
 # --- Typed dicts for provider API responses ---
 
@@ -208,30 +230,30 @@ class GoogleProvider(OAuthProvider):
         return str(request.url)
 
     async def exchange_code(self, code: str, **kwargs: Any) -> OAuthTokenResponse:
-        async with httpx.AsyncClient(timeout=30) as client:
-            response = await client.post(
-                self.TOKEN_URL,
-                json={
-                    'client_id': self.client_id,
-                    'client_secret': self.client_secret,
-                    'code': code,
-                    'grant_type': 'authorization_code',
-                    'redirect_uri': self.redirect_uri,
-                },
-            )
-            response.raise_for_status()
-            data: OAuthTokenResponse = response.json()
-            return data
+        client = _get_http_client()
+        response = await client.post(
+            self.TOKEN_URL,
+            json={
+                'client_id': self.client_id,
+                'client_secret': self.client_secret,
+                'code': code,
+                'grant_type': 'authorization_code',
+                'redirect_uri': self.redirect_uri,
+            },
+        )
+        response.raise_for_status()
+        data: OAuthTokenResponse = response.json()
+        return data
 
     async def get_user_info(self, token_data: OAuthTokenResponse) -> OAuthUserInfo:
         access_token = token_data['access_token']
-        async with httpx.AsyncClient(timeout=30) as client:
-            response = await client.get(
-                self.USERINFO_URL,
-                headers={'Authorization': f'Bearer {access_token}'},
-            )
-            response.raise_for_status()
-            data: GoogleUserInfoResponse = response.json()
+        client = _get_http_client()
+        response = await client.get(
+            self.USERINFO_URL,
+            headers={'Authorization': f'Bearer {access_token}'},
+        )
+        response.raise_for_status()
+        data: GoogleUserInfoResponse = response.json()
 
         return OAuthUserInfo(
             provider='google',
@@ -265,30 +287,30 @@ class YandexProvider(OAuthProvider):
         return str(request.url)
 
     async def exchange_code(self, code: str, **kwargs: Any) -> OAuthTokenResponse:
-        async with httpx.AsyncClient(timeout=30) as client:
-            response = await client.post(
-                self.TOKEN_URL,
-                data={
-                    'client_id': self.client_id,
-                    'client_secret': self.client_secret,
-                    'code': code,
-                    'grant_type': 'authorization_code',
-                },
-            )
-            response.raise_for_status()
-            data: OAuthTokenResponse = response.json()
-            return data
+        client = _get_http_client()
+        response = await client.post(
+            self.TOKEN_URL,
+            data={
+                'client_id': self.client_id,
+                'client_secret': self.client_secret,
+                'code': code,
+                'grant_type': 'authorization_code',
+            },
+        )
+        response.raise_for_status()
+        data: OAuthTokenResponse = response.json()
+        return data
 
     async def get_user_info(self, token_data: OAuthTokenResponse) -> OAuthUserInfo:
         access_token = token_data['access_token']
-        async with httpx.AsyncClient(timeout=30) as client:
-            response = await client.get(
-                self.USERINFO_URL,
-                params={'format': 'json'},
-                headers={'Authorization': f'OAuth {access_token}'},
-            )
-            response.raise_for_status()
-            data: YandexUserInfoResponse = response.json()
+        client = _get_http_client()
+        response = await client.get(
+            self.USERINFO_URL,
+            params={'format': 'json'},
+            headers={'Authorization': f'OAuth {access_token}'},
+        )
+        response.raise_for_status()
+        data: YandexUserInfoResponse = response.json()
 
         default_email = data.get('default_email')
         emails = data.get('emails', [])
@@ -337,30 +359,30 @@ class DiscordProvider(OAuthProvider):
         return str(request.url)
 
     async def exchange_code(self, code: str, **kwargs: Any) -> OAuthTokenResponse:
-        async with httpx.AsyncClient(timeout=30) as client:
-            response = await client.post(
-                self.TOKEN_URL,
-                data={
-                    'client_id': self.client_id,
-                    'client_secret': self.client_secret,
-                    'code': code,
-                    'grant_type': 'authorization_code',
-                    'redirect_uri': self.redirect_uri,
-                },
-            )
-            response.raise_for_status()
-            data: OAuthTokenResponse = response.json()
-            return data
+        client = _get_http_client()
+        response = await client.post(
+            self.TOKEN_URL,
+            data={
+                'client_id': self.client_id,
+                'client_secret': self.client_secret,
+                'code': code,
+                'grant_type': 'authorization_code',
+                'redirect_uri': self.redirect_uri,
+            },
+        )
+        response.raise_for_status()
+        data: OAuthTokenResponse = response.json()
+        return data
 
     async def get_user_info(self, token_data: OAuthTokenResponse) -> OAuthUserInfo:
         access_token = token_data['access_token']
-        async with httpx.AsyncClient(timeout=30) as client:
-            response = await client.get(
-                self.USERINFO_URL,
-                headers={'Authorization': f'Bearer {access_token}'},
-            )
-            response.raise_for_status()
-            data: DiscordUserInfoResponse = response.json()
+        client = _get_http_client()
+        response = await client.get(
+            self.USERINFO_URL,
+            headers={'Authorization': f'Bearer {access_token}'},
+        )
+        response.raise_for_status()
+        data: DiscordUserInfoResponse = response.json()
 
         avatar_url: str | None = None
         if data.get('avatar'):
@@ -433,36 +455,36 @@ class VKProvider(OAuthProvider):
         if not code_verifier:
             raise ValueError('code_verifier is required for VK ID token exchange')
 
-        async with httpx.AsyncClient(timeout=30) as client:
-            response = await client.post(
-                self.TOKEN_URL,
-                data={
-                    'grant_type': 'authorization_code',
-                    'code': code,
-                    'redirect_uri': self.redirect_uri,
-                    'client_id': self.client_id,
-                    'device_id': device_id,
-                    'code_verifier': code_verifier,
-                    'state': state,
-                },
-            )
-            response.raise_for_status()
-            data: OAuthTokenResponse = response.json()
-            return data
+        client = _get_http_client()
+        response = await client.post(
+            self.TOKEN_URL,
+            data={
+                'grant_type': 'authorization_code',
+                'code': code,
+                'redirect_uri': self.redirect_uri,
+                'client_id': self.client_id,
+                'device_id': device_id,
+                'code_verifier': code_verifier,
+                'state': state,
+            },
+        )
+        response.raise_for_status()
+        data: OAuthTokenResponse = response.json()
+        return data
 
     async def get_user_info(self, token_data: OAuthTokenResponse) -> OAuthUserInfo:
         access_token = token_data['access_token']
 
-        async with httpx.AsyncClient(timeout=30) as client:
-            response = await client.post(
-                self.USERINFO_URL,
-                data={
-                    'access_token': access_token,
-                    'client_id': self.client_id,
-                },
-            )
-            response.raise_for_status()
-            data: VKIDUserInfoResponse = response.json()
+        client = _get_http_client()
+        response = await client.post(
+            self.USERINFO_URL,
+            data={
+                'access_token': access_token,
+                'client_id': self.client_id,
+            },
+        )
+        response.raise_for_status()
+        data: VKIDUserInfoResponse = response.json()
 
         user_data = data.get('user')
         if not user_data:
@@ -1,10 +1,14 @@
 """FastAPI dependencies for cabinet module."""
 
+import hashlib
+import time
 from datetime import UTC, datetime
+from typing import Any
 
 import structlog
 from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.config import settings
@@ -14,6 +18,7 @@ from app.database.models import User, UserStatus
 from app.services.blacklist_service import blacklist_service
 from app.services.maintenance_service import maintenance_service
 from app.services.user_revival_service import NotDeletedError, revive_deleted_user
+from app.utils.ttl_cache import TTLCache
 
 from .auth.jwt_handler import get_token_payload
 from .auth.telegram_auth import validate_telegram_init_data
@@ -24,14 +29,94 @@ logger = structlog.get_logger(__name__)
 
 security = HTTPBearer(auto_error=False)
 
+# Verified access-token payloads keyed by token hash. Cabinet clients poll
+# status endpoints with the same token, so re-running signature checks on every
+# request is wasted CPU. Entries never outlive the token's own `exp`.
+_JWT_CACHE_TTL = 30
+_jwt_cache = TTLCache(maxsize=10000, ttl=_JWT_CACHE_TTL)
+
+# Tokens that failed verification are remembered briefly too, so a client
+# retrying with a stale or forged token is rejected without another decode.
+_INVALID_TOKEN = object()
+_INVALID_TOKEN_TTL = 5
+
+
+def _token_cache_key(token: str) -> str:
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()[:32]
+
+
+def _get_cached_access_payload(token: str) -> dict[str, Any] | None:
+    """Return the verified access-token payload, reusing a recent verification."""
+    key = _token_cache_key(token)
+    payload = _jwt_cache.get(key)
+    if payload is _INVALID_TOKEN:
+        return None
+    if payload is not None:
+        return payload
+
+    payload = get_token_payload(token, expected_type='access')
+    if not payload:
+        _jwt_cache.set(key, _INVALID_TOKEN, ttl=_INVALID_TOKEN_TTL)
+        return None
+
+    ttl = _JWT_CACHE_TTL
+    exp = payload.get('exp')
+    if isinstance(exp, (int, float)):
+        ttl = min(ttl, exp - time.time())
+    if ttl > 0:
+        _jwt_cache.set(key, payload, ttl=ttl)
+    return payload
+
+
+def invalidate_cached_token(token: str) -> None:
+    """Drop a token from the verification cache (e.g. on logout)."""
+    _jwt_cache.pop(_token_cache_key(token), None)
+
+
+# Negative user lookups: ids that resolved to no row or to a non-active
+# account. These outcomes reject the request before anything else needs the
+# ORM object, so a recent answer lets retrying clients skip the SELECT.
+# Active users are never cached — downstream handlers need a session-bound row.
+_USER_MISSING = object()
+_user_state_cache = TTLCache(maxsize=5000, ttl=60)
+
+
+async def _get_active_user(db: AsyncSession, user_id: int) -> User | None:
+    """Return the user if it exists and is active, answering recent rejections from cache."""
+    if _user_state_cache.get(user_id) is not None:
+        return None
+
+    user = await get_user_by_id(db, user_id)
+    if user is None:
+        _user_state_cache[user_id] = _USER_MISSING
+        return None
+    if user.status != UserStatus.ACTIVE.value:
+        _user_state_cache[user_id] = user.status
+        return None
+    return user
+
+
+def invalidate_cached_user(user_id: int | None) -> None:
+    """Forget the cached lookup result for a user id."""
+    if user_id is not None:
+        _user_state_cache.pop(user_id, None)
+
+
+@event.listens_for(User.status, 'set')
+def _on_user_status_set(target: User, value, oldvalue, initiator) -> None:
+    invalidate_cached_user(target.id)
+
 
 async def get_cabinet_db() -> AsyncSession:
-    """Get database session for cabinet operations."""
+    """Get database session for cabinet operations.
+
+    FastAPI caches this dependency per request, so auth, permission checks and
+    the endpoint itself share one session. Keep every cabinet dependency on
+    ``Depends(get_cabinet_db)`` (never ``use_cache=False`` or a second session
+    factory) to hold a single pool checkout per request.
+    """
     async with AsyncSessionLocal() as session:
-        try:
-            yield session
-        finally:
-            await session.close()
+        yield session
 
 
 async def get_current_cabinet_user(
@@ -66,7 +151,7 @@ async def get_current_cabinet_user(
         )
 
     token = credentials.credentials
-    payload = get_token_payload(token, expected_type='access')
+    payload = _get_cached_access_payload(token)
 
     if not payload:
         raise HTTPException(
@@ -84,9 +169,16 @@ async def get_current_cabinet_user(
             headers={'WWW-Authenticate': 'Bearer'},
         )
 
+    if _user_state_cache.get(user_id) is _USER_MISSING:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail='User not found',
+        )
+
     user = await get_user_by_id(db, user_id)
 
     if not user:
+        _user_state_cache[user_id] = _USER_MISSING
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail='User not found',
@@ -193,10 +285,11 @@ async def get_current_cabinet_user(
     # users see the blacklist message instead of the friendly revival
     # screen. No duplicate check needed here.
 
+    # Админ по telegram_id ИЛИ email — пропускается и при техработах, и без подписки на канал
+    is_admin = settings.is_admin(telegram_id=user.telegram_id, email=user.email if user.email_verified else None)
+
     # Check maintenance mode (allow admins to pass)
     if maintenance_service.is_maintenance_active():
-        # Проверяем админа по telegram_id ИЛИ email
-        is_admin = settings.is_admin(telegram_id=user.telegram_id, email=user.email if user.email_verified else None)
         if not is_admin:
             status_info = maintenance_service.get_status_info()
             raise HTTPException(
@@ -213,9 +306,6 @@ async def get_current_cabinet_user(
         # Skip for email-only users (no telegram_id)
         if user.telegram_id is not None:
             # Skip admin check
-            is_admin = settings.is_admin(
-                telegram_id=user.telegram_id, email=user.email if user.email_verified else None
-            )
             if not is_admin:
                 from app.services.channel_subscription_service import channel_subscription_service
 
@@ -260,7 +350,7 @@ async def get_optional_cabinet_user(
         return None
 
     token = credentials.credentials
-    payload = get_token_payload(token, expected_type='access')
+    payload = _get_cached_access_payload(token)
 
     if not payload:
         return None
@@ -270,9 +360,9 @@ async def get_optional_cabinet_user(
     except (TypeError, ValueError):
         return None
 
-    user = await get_user_by_id(db, user_id)
+    user = await _get_active_user(db, user_id)
 
-    if not user or user.status != 'active':
+    if not user:
         return None
 
     # Cross-validate Telegram identity (same as get_current_cabinet_user)
@@ -1,14 +1,18 @@
 """Admin routes for broadcasts in cabinet."""
 
+import asyncio
+import re
 from datetime import UTC, datetime
 
 import structlog
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-from sqlalchemy import distinct, func, select
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy import distinct, event, func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.config import settings
+from app.database.database import AsyncSessionLocal
 from app.database.models import BroadcastHistory, Subscription, SubscriptionStatus, Tariff, User
-from app.handlers.admin.messages import get_target_users_count
+from app.handlers.admin.messages import get_all_filter_counts, get_target_users_count
 from app.keyboards.admin import BROADCAST_BUTTONS, DEFAULT_BROADCAST_BUTTONS
 from app.services.broadcast_service import (
     BroadcastConfig,
@@ -17,6 +21,7 @@ from app.services.broadcast_service import (
     broadcast_service,
     email_broadcast_service,
 )
+from app.utils.ttl_cache import TTLCache
 
 from ..dependencies import get_cabinet_db, require_permission
 from ..schemas.broadcasts import (
@@ -112,6 +117,42 @@ EMAIL_FILTER_GROUPS = {
     'expired_email': 'subscription',
 }
 
+# Target keys accepted as-is; `tariff_<id>` targets are matched separately.
+_STATIC_TARGETS = frozenset(FILTER_LABELS) | frozenset(CUSTOM_FILTER_LABELS)
+_TARIFF_TARGET_RE = re.compile(r'tariff_([0-9]+)')
+
+_BROADCAST_BUTTON_KEYS = frozenset(BROADCAST_BUTTONS)
+_DEFAULT_BROADCAST_BUTTON_KEYS = frozenset(DEFAULT_BROADCAST_BUTTONS)
+
+
+# ============ Filters Cache ============
+
+# Recipient counts per filter change slowly, and the broadcasts screen is
+# reopened often. Serve the computed /filters payload for a short while
+# instead of re-running every COUNT; tariff changes and new broadcasts drop it.
+_FILTERS_CACHE_TTL = 60
+_FILTERS_CACHE_KEY = 'filters'
+_filters_cache = TTLCache(maxsize=1, ttl=_FILTERS_CACHE_TTL)
+
+
+# Tariff ids accepted by `tariff_<id>` targets; validated on every preview/create.
+_TARIFF_IDS_CACHE_TTL = 60
+_TARIFF_IDS_CACHE_KEY = 'tariff_ids'
+_tariff_ids_cache = TTLCache(maxsize=1, ttl=_TARIFF_IDS_CACHE_TTL)
+
+
+def invalidate_filters_cache() -> None:
+    """Drop the cached /filters payload."""
+    _filters_cache.clear()
+
+
+@event.listens_for(Tariff, 'after_insert')
+@event.listens_for(Tariff, 'after_update')
+@event.listens_for(Tariff, 'after_delete')
+def _on_tariff_changed(mapper, connection, target: Tariff) -> None:
+    invalidate_filters_cache()
+    _tariff_ids_cache.clear()
+
 
 # ============ Helper Functions ============
 
@@ -123,11 +164,12 @@ def _serialize_broadcast(broadcast: BroadcastHistory) -> BroadcastResponse:
     if broadcast.total_count > 0:
         progress = round((broadcast.sent_count + broadcast.failed_count + blocked) / broadcast.total_count * 100, 1)
 
-    return BroadcastResponse(
+    # Built from a persisted row, so field types are already right — skip validation.
+    return BroadcastResponse.model_construct(
         id=broadcast.id,
         target_type=broadcast.target_type,
         message_text=broadcast.message_text,
-        has_media=broadcast.has_media,
+        has_media=bool(broadcast.has_media),
         media_type=broadcast.media_type,
         media_file_id=broadcast.media_file_id,
         media_caption=broadcast.media_caption,
@@ -209,38 +251,52 @@ def _validate_email_target(target: str) -> bool:
     return target in EMAIL_FILTER_LABELS
 
 
-async def _get_tariff_user_counts(db: AsyncSession) -> dict:
-    """Get count of active users per tariff."""
-    result = await db.execute(
-        select(Subscription.tariff_id, func.count(func.distinct(Subscription.user_id)).label('count'))
+async def _get_active_tariffs_with_user_counts(db: AsyncSession) -> list[tuple[Tariff, int]]:
+    """Get active tariffs (by name) with the count of active users on each, in one query."""
+    # uq_subscriptions_user_tariff_active allows at most one active subscription
+    # per (user_id, tariff_id) with a non-NULL tariff, so COUNT(*) equals the
+    # number of distinct users and Postgres can skip the DISTINCT sort.
+    user_counts = (
+        select(Subscription.tariff_id, func.count().label('count'))
         .join(User, User.id == Subscription.user_id)
         .where(
             User.status == 'active',
             Subscription.status == SubscriptionStatus.ACTIVE.value,
+            Subscription.tariff_id.isnot(None),
         )
         .group_by(Subscription.tariff_id)
+        .subquery()
+    )
+    result = await db.execute(
+        select(Tariff, func.coalesce(user_counts.c.count, 0))
+        .outerjoin(user_counts, user_counts.c.tariff_id == Tariff.id)
+        .where(Tariff.is_active == True)
+        .order_by(Tariff.name)
     )
-    return {row.tariff_id: row.count for row in result.all()}
+    return [(tariff, int(count)) for tariff, count in result.all()]
 
 
-def _validate_target(target: str, tariff_ids: set) -> bool:
+async def _get_tariff_ids(db: AsyncSession) -> frozenset[int]:
+    """Get ids of all tariffs (cached briefly, dropped on tariff changes)."""
+    tariff_ids = _tariff_ids_cache.get(_TARIFF_IDS_CACHE_KEY)
+    if tariff_ids is None:
+        result = await db.execute(select(Tariff.id))
+        tariff_ids = frozenset(row[0] for row in result.all())
+        _tariff_ids_cache[_TARIFF_IDS_CACHE_KEY] = tariff_ids
+    return tariff_ids
+
+
+def _validate_target(target: str, tariff_ids: frozenset[int]) -> bool:
     """Validate target value."""
-    if target in FILTER_LABELS:
-        return True
-    if target in CUSTOM_FILTER_LABELS:
+    if target in _STATIC_TARGETS:
         return True
-    if target.startswith('tariff_'):
-        try:
-            tariff_id = int(target.split('_')[1])
-            return tariff_id in tariff_ids
-        except (ValueError, IndexError):
-            return False
-    return False
+    match = _TARIFF_TARGET_RE.fullmatch(target)
+    return match is not None and int(match.group(1)) in tariff_ids
 
 
 def _validate_buttons(buttons: list[str]) -> bool:
     """Validate button keys."""
-    return all(button in BROADCAST_BUTTONS for button in buttons)
+    return _BROADCAST_BUTTON_KEYS.issuperset(buttons)
 
 
 # ============ Endpoints ============
@@ -252,61 +308,70 @@ async def get_filters(
     db: AsyncSession = Depends(get_cabinet_db),
 ) -> BroadcastFiltersResponse:
     """Get all available filters with user counts."""
+    cached = _filters_cache.get(_FILTERS_CACHE_KEY)
+    if cached is not None:
+        return cached
+
+    counts_failed = False
+    try:
+        counts = await get_all_filter_counts(db)
+    except Exception as e:
+        logger.warning('Failed to get broadcast filter counts', error=e)
+        await db.rollback()
+        # Recount filter by filter so one broken predicate does not zero the rest.
+        counts = {}
+        for key in _STATIC_TARGETS:
+            try:
+                counts[key] = await get_target_users_count(db, key)
+            except Exception as e:
+                logger.warning('Failed to get count for filter', key=key, error=e)
+                await db.rollback()
+                counts_failed = True
+
+    # Items below are built from our own labels and query results, so they
+    # skip pydantic validation via model_construct().
+
     # Basic filters
-    filters = []
-    for key, label in FILTER_LABELS.items():
-        try:
-            count = await get_target_users_count(db, key)
-        except Exception as e:
-            logger.warning('Failed to get count for filter', key=key, error=e)
-            count = 0
-        filters.append(
-            BroadcastFilter(
-                key=key,
-                label=label,
-                count=count,
-                group=FILTER_GROUPS.get(key),
-            )
+    filters = [
+        BroadcastFilter.model_construct(
+            key=key,
+            label=label,
+            count=counts.get(key, 0),
+            group=FILTER_GROUPS.get(key),
         )
+        for key, label in FILTER_LABELS.items()
+    ]
 
     # Custom filters
-    custom_filters = []
-    for key, label in CUSTOM_FILTER_LABELS.items():
-        try:
-            count = await get_target_users_count(db, key)
-        except Exception as e:
-            logger.warning('Failed to get count for custom filter', key=key, error=e)
-            count = 0
-        custom_filters.append(
-            BroadcastFilter(
-                key=key,
-                label=label,
-                count=count,
-                group=CUSTOM_FILTER_GROUPS.get(key),
-            )
+    custom_filters = [
+        BroadcastFilter.model_construct(
+            key=key,
+            label=label,
+            count=counts.get(key, 0),
+            group=CUSTOM_FILTER_GROUPS.get(key),
         )
+        for key, label in CUSTOM_FILTER_LABELS.items()
+    ]
 
     # Tariff filters
-    tariff_counts = await _get_tariff_user_counts(db)
-    result = await db.execute(select(Tariff).where(Tariff.is_active == True).order_by(Tariff.name))
-    tariffs = result.scalars().all()
-
-    tariff_filters = []
-    for tariff in tariffs:
-        tariff_filters.append(
-            TariffFilter(
-                key=f'tariff_{tariff.id}',
-                label=tariff.name,
-                tariff_id=tariff.id,
-                count=tariff_counts.get(tariff.id, 0),
-            )
+    tariff_filters = [
+        TariffFilter.model_construct(
+            key=f'tariff_{tariff.id}',
+            label=tariff.name,
+            tariff_id=tariff.id,
+            count=count,
         )
+        for tariff, count in await _get_active_tariffs_with_user_counts(db)
+    ]
 
-    return BroadcastFiltersResponse(
+    response = BroadcastFiltersResponse(
         filters=filters,
         tariff_filters=tariff_filters,
         custom_filters=custom_filters,
     )
+    if not counts_failed:
+        _filters_cache[_FILTERS_CACHE_KEY] = response
+    return response
 
 
 @router.get('/tariffs', response_model=BroadcastTariffsResponse)
@@ -315,39 +380,38 @@ async def get_tariffs(
     db: AsyncSession = Depends(get_cabinet_db),
 ) -> BroadcastTariffsResponse:
     """Get tariffs for broadcast filtering."""
-    tariff_counts = await _get_tariff_user_counts(db)
-    result = await db.execute(select(Tariff).where(Tariff.is_active == True).order_by(Tariff.name))
-    tariffs = result.scalars().all()
-
     return BroadcastTariffsResponse(
         tariffs=[
-            TariffForBroadcast(
+            TariffForBroadcast.model_construct(
                 id=t.id,
                 name=t.name,
                 filter_key=f'tariff_{t.id}',
-                active_users_count=tariff_counts.get(t.id, 0),
+                active_users_count=count,
             )
-            for t in tariffs
+            for t, count in await _get_active_tariffs_with_user_counts(db)
         ]
     )
 
 
+# Buttons come from module constants, so the /buttons payload is rendered once.
+_BUTTONS_RESPONSE_JSON = BroadcastButtonsResponse(
+    buttons=[
+        BroadcastButton(
+            key=key,
+            label=config.get('default_text', key),
+            default=key in _DEFAULT_BROADCAST_BUTTON_KEYS,
+        )
+        for key, config in BROADCAST_BUTTONS.items()
+    ]
+).model_dump_json()
+
+
 @router.get('/buttons', response_model=BroadcastButtonsResponse)
 async def get_buttons(
     admin: User = Depends(require_permission('broadcasts:read')),
-) -> BroadcastButtonsResponse:
+) -> Response:
     """Get available buttons for broadcasts."""
-    default_buttons = set(DEFAULT_BROADCAST_BUTTONS)
-    buttons = []
-    for key, config in BROADCAST_BUTTONS.items():
-        buttons.append(
-            BroadcastButton(
-                key=key,
-                label=config.get('default_text', key),
-                default=key in default_buttons,
-            )
-        )
-    return BroadcastButtonsResponse(buttons=buttons)
+    return Response(content=_BUTTONS_RESPONSE_JSON, media_type='application/json')
 
 
 @router.post('/preview', response_model=BroadcastPreviewResponse)
@@ -358,8 +422,7 @@ async def preview_broadcast(
 ) -> BroadcastPreviewResponse:
     """Preview broadcast recipients count."""
     # Get tariff IDs for validation
-    result = await db.execute(select(Tariff.id))
-    tariff_ids = {row[0] for row in result.all()}
+    tariff_ids = await _get_tariff_ids(db)
 
     if not _validate_target(request.target, tariff_ids):
         raise HTTPException(
@@ -387,8 +450,7 @@ async def create_broadcast(
 ) -> BroadcastResponse:
     """Create and start a broadcast."""
     # Validate target
-    result = await db.execute(select(Tariff.id))
-    tariff_ids = {row[0] for row in result.all()}
+    tariff_ids = await _get_tariff_ids(db)
 
     if not _validate_target(request.target, tariff_ids):
         raise HTTPException(
@@ -436,8 +498,9 @@ async def create_broadcast(
         category=request.category,
     )
     db.add(broadcast)
+    # id and server-side created_at come back via INSERT ... RETURNING — no refresh needed.
     await db.commit()
-    await db.refresh(broadcast)
+    invalidate_filters_cache()
 
     # Prepare media config
     media_config = None
@@ -459,9 +522,10 @@ async def create_broadcast(
         category=request.category,
     )
 
-    # Start broadcast
-    await broadcast_service.start_broadcast(broadcast.id, config)
-    await db.refresh(broadcast)
+    # Start broadcast. The task runs in the background, so the queued row we
+    # hold is current unless the service failed it right away.
+    if not await broadcast_service.start_broadcast(broadcast.id, config):
+        await db.refresh(broadcast)
 
     logger.info(
         'Admin created broadcast for target', admin_id=admin.id, broadcast_id=broadcast.id, target=request.target
@@ -478,15 +542,26 @@ async def list_broadcasts(
     offset: int = Query(0, ge=0),
 ) -> BroadcastListResponse:
     """Get list of broadcasts with pagination."""
-    total = await db.scalar(select(func.count(BroadcastHistory.id))) or 0
-
+    # Page rows and the total in one round-trip; the window count is evaluated
+    # before LIMIT/OFFSET, so every row carries the full table count.
     result = await db.execute(
-        select(BroadcastHistory).order_by(BroadcastHistory.created_at.desc()).offset(offset).limit(limit)
+        select(BroadcastHistory, func.count().over().label('total'))
+        .order_by(BroadcastHistory.created_at.desc())
+        .offset(offset)
+        .limit(limit)
     )
-    broadcasts = result.scalars().all()
+    rows = result.all()
+
+    if rows:
+        total = rows[0].total
+    elif offset:
+        # Past the last page there is no row to carry the window count.
+        total = await db.scalar(select(func.count(BroadcastHistory.id))) or 0
+    else:
+        total = 0
 
     return BroadcastListResponse(
-        items=[_serialize_broadcast(b) for b in broadcasts],
+        items=[_serialize_broadcast(row[0]) for row in rows],
         total=int(total),
         limit=limit,
         offset=offset,
@@ -499,35 +574,38 @@ async def list_broadcasts(
 @router.get('/email-filters', response_model=EmailFiltersResponse)
 async def get_email_filters(
     admin: User = Depends(require_permission('broadcasts:read')),
-    db: AsyncSession = Depends(get_cabinet_db),
 ) -> EmailFiltersResponse:
     """Get all available email filters with user counts."""
-    filters = []
-    total_with_email = 0
-
-    for key, label in EMAIL_FILTER_LABELS.items():
-        try:
-            count = await _get_email_filter_count(db, key)
-        except Exception as e:
-            logger.warning('Failed to get count for email filter', key=key, error=e)
-            count = 0
-
-        filters.append(
-            EmailFilterItem(
-                key=key,
-                label=label,
-                count=count,
-                group=EMAIL_FILTER_GROUPS.get(key),
-            )
+    # Counts are independent, so run them concurrently. An AsyncSession must not
+    # be shared between tasks — each count checks out its own short-lived session,
+    # capped so the burst never starves the pool.
+    semaphore = asyncio.Semaphore(max(1, min(len(EMAIL_FILTER_LABELS), settings.DATABASE_POOL_SIZE - 2)))
+
+    async def count_filter(key: str) -> int:
+        async with semaphore, AsyncSessionLocal() as session:
+            try:
+                return await _get_email_filter_count(session, key)
+            except Exception as e:
+                logger.warning('Failed to get count for email filter', key=key, error=e)
+                return 0
+
+    results = await asyncio.gather(*(count_filter(key) for key in EMAIL_FILTER_LABELS))
+    counts = dict(zip(EMAIL_FILTER_LABELS, results, strict=True))
+
+    filters = [
+        EmailFilterItem.model_construct(
+            key=key,
+            label=label,
+            count=counts[key],
+            group=EMAIL_FILTER_GROUPS.get(key),
         )
-
-        # Track total with email (all_email filter)
-        if key == 'all_email':
-            total_with_email = count
+        for key, label in EMAIL_FILTER_LABELS.items()
+    ]
 
     return EmailFiltersResponse(
         filters=filters,
-        total_with_email=total_with_email,
+        # Track total with email (all_email filter)
+        total_with_email=counts['all_email'],
     )
 
 
@@ -564,8 +642,7 @@ async def create_combined_broadcast(
 ) -> BroadcastResponse:
     """Create and start a combined broadcast (telegram/email/both)."""
     # Get tariff IDs for target validation
-    result = await db.execute(select(Tariff.id))
-    tariff_ids = {row[0] for row in result.all()}
+    tariff_ids = await _get_tariff_ids(db)
 
     admin_name = admin.username or f'Admin #{admin.id}'
 
@@ -635,10 +712,12 @@ async def create_combined_broadcast(
         email_html_content=request.email_html_content.strip() if request.email_html_content else None,
     )
     db.add(broadcast)
+    # id and server-side created_at come back via INSERT ... RETURNING — no refresh needed.
     await db.commit()
-    await db.refresh(broadcast)
+    invalidate_filters_cache()
 
     # Start broadcasts based on channel
+    started = True
     if request.channel in ('telegram', 'both'):
         # Prepare media config
         media_config = None
@@ -660,7 +739,7 @@ async def create_combined_broadcast(
             category=request.category,
         )
 
-        await broadcast_service.start_broadcast(broadcast.id, telegram_config)
+        started = await broadcast_service.start_broadcast(broadcast.id, telegram_config) and started
 
     if request.channel in ('email', 'both'):
         # For 'both' channel, we use 'all_email' as default email target
@@ -675,9 +754,11 @@ async def create_combined_broadcast(
             initiator_name=admin_name,
         )
 
-        await email_broadcast_service.start_broadcast(broadcast.id, email_config)
+        started = await email_broadcast_service.start_broadcast(broadcast.id, email_config) and started
 
-    await db.refresh(broadcast)
+    # Background tasks own progress updates; only a failed start changed the row.
+    if not started:
+        await db.refresh(broadcast)
 
     logger.info(
         'Admin created broadcast for target',
@@ -743,7 +824,6 @@ async def stop_broadcast(
         broadcast.completed_at = datetime.now(UTC)
 
     await db.commit()
-    await db.refresh(broadcast)
 
     logger.info('Admin stopped broadcast', admin_id=admin.id, broadcast_id=broadcast_id)
 
@@ -9,7 +9,7 @@ from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy import func, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.bot_factory import create_bot
+from app.bot_factory import get_shared_bot
 from app.database.models import PinnedMessage, User
 from app.services.pinned_message_service import (
     broadcast_pinned_message,
@@ -69,14 +69,8 @@ def _serialize_pinned_message(msg: PinnedMessage) -> PinnedMessageResponse:
     )
 
 
-_cached_bot: Bot | None = None
-
-
 def _get_bot() -> Bot:
-    global _cached_bot
-    if _cached_bot is None:
-        _cached_bot = create_bot()
-    return _cached_bot
+    return get_shared_bot()
 
 
 # ============ List / Get Endpoints ============
@@ -2,36 +2,38 @@
 
 from __future__ import annotations
 
+import asyncio
 from datetime import UTC, datetime
 from typing import Any
 
 from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from pydantic import BaseModel, Field
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database.crud.promo_group import (
-    count_promo_group_members,
-    count_promo_groups,
     create_promo_group,
     delete_promo_group,
     get_promo_group_by_id,
-    get_promo_groups_with_counts,
+    get_promo_group_with_count,
+    get_promo_groups_page_with_total,
     update_promo_group,
 )
 from app.database.crud.promocode import (
-    create_promocode,
+    create_promocode_if_code_free,
     delete_promocode,
-    get_promocode_by_code,
     get_promocode_by_id,
     get_promocode_statistics,
-    get_promocodes_count,
-    get_promocodes_list,
+    get_promocodes_page_with_total,
+    is_promocode_code_conflict,
     update_promocode,
 )
 from app.database.crud.tariff import get_tariff_by_id
 from app.database.models import PromoCode, PromoCodeType, PromoCodeUse, PromoGroup, User
+from app.utils.cache import cache, cache_key
 
 from ..dependencies import get_cabinet_db, require_permission
+from ..utils.route_helpers import in_own_session, json_response
 
 
 router = APIRouter(prefix='/admin/promocodes', tags=['Admin Promocodes'])
@@ -162,15 +164,47 @@ class PromoGroupUpdateRequest(BaseModel):
 
 # ============== Helpers ==============
 
+# Stored type value -> enum member, without going through Enum.__call__ per row.
+_PROMO_CODE_TYPES = PromoCodeType._value2member_map_
 
-def _normalize_datetime(value: datetime | None) -> datetime | None:
-    if value is None:
+
+# Admin list pages are re-read far more often than promocodes change, so the
+# rendered JSON is kept in Redis briefly and dropped on every write.
+_LIST_CACHE_TTL = 30
+# v2: bodies are stored raw; the version keeps old JSON-encoded entries from being served.
+_PROMOCODES_LIST_CACHE_PREFIX = 'admin:promocodes:list:v2'
+_PROMO_GROUPS_LIST_CACHE_PREFIX = 'admin:promo_groups:list:v2'
+
+
+async def _get_cached_json_response(key: str) -> Response | None:
+    body = await cache.get_raw(key)
+    if body is None:
         return None
-    if value.tzinfo is not None and value.utcoffset() is not None:
-        return value.astimezone(UTC)
-    if value.tzinfo is not None:
+    return Response(content=body, media_type='application/json')
+
+
+async def _cache_json_response(key: str, model: BaseModel) -> Response:
+    # Pages are assembled with model_construct from already-built items; the
+    # schema's compiled pydantic-core serializer renders them in one pass.
+    # The body is already JSON, so it is stored raw rather than encoded again.
+    body = model.model_dump_json()
+    await cache.set_raw(key, body, _LIST_CACHE_TTL)
+    return Response(content=body, media_type='application/json')
+
+
+async def _invalidate_promocodes_list_cache() -> None:
+    await cache.delete_pattern_scan(f'{_PROMOCODES_LIST_CACHE_PREFIX}:*')
+
+
+async def _invalidate_promo_groups_list_cache() -> None:
+    await cache.delete_pattern_scan(f'{_PROMO_GROUPS_LIST_CACHE_PREFIX}:*')
+
+
+def _normalize_datetime(value: datetime | None) -> datetime | None:
+    """Convert aware datetimes to UTC; None and naive values pass through unchanged."""
+    if value is None or value.tzinfo is None:
         return value
-    return value
+    return value.astimezone(UTC)
 
 
 async def _serialize_promocode(db: AsyncSession, promocode: PromoCode) -> PromoCodeResponse:
@@ -179,8 +213,9 @@ async def _serialize_promocode(db: AsyncSession, promocode: PromoCode) -> PromoC
         tariff = await get_tariff_by_id(db, promocode.tariff_id)
         tariff_name = tariff.name if tariff else None
 
-    promo_type = PromoCodeType(promocode.type)
-    return PromoCodeResponse(
+    promo_type = _PROMO_CODE_TYPES.get(promocode.type, promocode.type)
+    # Built from a persisted row, so field types are already right — skip validation.
+    return PromoCodeResponse.model_construct(
         id=promocode.id,
         code=promocode.code,
         type=promo_type,
@@ -205,30 +240,37 @@ async def _serialize_promocode(db: AsyncSession, promocode: PromoCode) -> PromoC
 
 
 def _serialize_recent_use(use: PromoCodeUse) -> PromoCodeRecentUse:
-    return PromoCodeRecentUse(
+    # get_promocode_statistics sets the user_* fields on every use it returns.
+    return PromoCodeRecentUse.model_construct(
         id=use.id,
         user_id=use.user_id,
-        user_username=getattr(use, 'user_username', None),
-        user_full_name=getattr(use, 'user_full_name', None),
-        user_telegram_id=getattr(use, 'user_telegram_id', None),
+        user_username=use.user_username,
+        user_full_name=use.user_full_name,
+        user_telegram_id=use.user_telegram_id,
         used_at=use.used_at,
     )
 
 
 def _normalize_period_discounts(group: PromoGroup) -> dict[int, int]:
-    raw = group.period_discounts or {}
+    raw = group.period_discounts
+    if not raw or not isinstance(raw, dict):
+        return {}
+    try:
+        return {int(key): int(value) for key, value in raw.items()}
+    except (TypeError, ValueError):
+        pass
+    # Malformed entries are rare; only then walk the items one by one to skip them.
     normalized: dict[int, int] = {}
-    if isinstance(raw, dict):
-        for key, value in raw.items():
-            try:
-                normalized[int(key)] = int(value)
-            except (TypeError, ValueError):
-                continue
+    for key, value in raw.items():
+        try:
+            normalized[int(key)] = int(value)
+        except (TypeError, ValueError):
+            continue
     return normalized
 
 
 def _serialize_promo_group(group: PromoGroup, members_count: int = 0) -> PromoGroupResponse:
-    return PromoGroupResponse(
+    return PromoGroupResponse.model_construct(
         id=group.id,
         name=group.name,
         server_discount_percent=group.server_discount_percent,
@@ -239,8 +281,8 @@ def _serialize_promo_group(group: PromoGroup, members_count: int = 0) -> PromoGr
         apply_discounts_to_addons=group.apply_discounts_to_addons,
         is_default=group.is_default,
         members_count=members_count,
-        created_at=getattr(group, 'created_at', None),
-        updated_at=getattr(group, 'updated_at', None),
+        created_at=group.created_at,
+        updated_at=group.updated_at,
     )
 
 
@@ -272,6 +314,27 @@ def _validate_create_payload(payload: PromoCodeCreateRequest) -> None:
         raise HTTPException(status.HTTP_400_BAD_REQUEST, 'valid_from cannot be greater than valid_until')
 
 
+# Foreign keys an update may set, with the error shown when the referenced row is missing.
+_UPDATE_REFERENCES = (('promo_group_id', 'Promo group not found'), ('tariff_id', 'Tariff not found'))
+
+
+def _update_integrity_error_detail(exc: IntegrityError, updates: dict[str, Any]) -> str:
+    """Name what a failed promocode UPDATE violated: the code index or a missing reference."""
+    if 'code' in updates and is_promocode_code_conflict(exc):
+        return 'Promo code with this code already exists'
+    message = str(exc.orig if exc.orig is not None else exc)
+    references = [(field, detail) for field, detail in _UPDATE_REFERENCES if updates.get(field) is not None]
+    for field, detail in references:
+        # asyncpg names the FK (``promocodes_tariff_id_fkey``); SQLite does not.
+        if field in message:
+            return detail
+    if len(references) == 1:
+        return references[0][1]
+    if references:
+        return 'Promo group or tariff not found'
+    return 'Promo code update violates a database constraint'
+
+
 def _validate_update_payload(payload: PromoCodeUpdateRequest, promocode: PromoCode) -> None:
     if payload.code is not None and not payload.code.strip():
         raise HTTPException(status.HTTP_400_BAD_REQUEST, 'Code must not be empty')
@@ -324,17 +387,24 @@ async def list_promocodes(
     limit: int = Query(50, ge=1, le=200),
     offset: int = Query(0, ge=0),
     is_active: bool | None = Query(default=None),
-) -> PromoCodeListResponse:
+) -> Response:
     """Get list of all promocodes."""
-    total = await get_promocodes_count(db, is_active=is_active) or 0
-    promocodes = await get_promocodes_list(db, offset=offset, limit=limit, is_active=is_active)
+    key = cache_key(_PROMOCODES_LIST_CACHE_PREFIX, limit, offset, is_active)
+    cached = await _get_cached_json_response(key)
+    if cached is not None:
+        return cached
+
+    promocodes, total = await get_promocodes_page_with_total(db, offset=offset, limit=limit, is_active=is_active)
 
     serialized = [await _serialize_promocode(db, p) for p in promocodes]
-    return PromoCodeListResponse(
-        items=serialized,
-        total=int(total),
-        limit=limit,
-        offset=offset,
+    return await _cache_json_response(
+        key,
+        PromoCodeListResponse.model_construct(
+            items=serialized,
+            total=int(total),
+            limit=limit,
+            offset=offset,
+        ),
     )
 
 
@@ -343,21 +413,26 @@ async def get_promocode(
     promocode_id: int,
     admin: User = Depends(require_permission('promocodes:read')),
     db: AsyncSession = Depends(get_cabinet_db),
-) -> PromoCodeDetailResponse:
+) -> Response:
     """Get promocode details with usage statistics."""
-    promocode = await get_promocode_by_id(db, promocode_id)
+    # Statistics only filter uses by id, so they are safe to read before the 404 check.
+    promocode, stats = await asyncio.gather(
+        get_promocode_by_id(db, promocode_id),
+        in_own_session(get_promocode_statistics, promocode_id),
+    )
     if not promocode:
         raise HTTPException(status.HTTP_404_NOT_FOUND, 'Promo code not found')
 
-    stats = await get_promocode_statistics(db, promocode_id)
     base = await _serialize_promocode(db, promocode)
     recent_uses = [_serialize_recent_use(use) for use in stats.get('recent_uses', [])]
 
-    return PromoCodeDetailResponse(
-        **base.model_dump(),
-        total_uses=stats.get('total_uses', 0),
-        today_uses=stats.get('today_uses', 0),
-        recent_uses=recent_uses,
+    return json_response(
+        PromoCodeDetailResponse.model_construct(
+            **dict(base),
+            total_uses=stats.get('total_uses', 0),
+            today_uses=stats.get('today_uses', 0),
+            recent_uses=recent_uses,
+        )
     )
 
 
@@ -366,7 +441,7 @@ async def create_promocode_endpoint(
     payload: PromoCodeCreateRequest,
     admin: User = Depends(require_permission('promocodes:create')),
     db: AsyncSession = Depends(get_cabinet_db),
-) -> PromoCodeResponse:
+) -> Response:
     """Create a new promocode."""
     _validate_create_payload(payload)
 
@@ -374,42 +449,29 @@ async def create_promocode_endpoint(
     normalized_valid_from = _normalize_datetime(payload.valid_from)
     normalized_valid_until = _normalize_datetime(payload.valid_until)
 
-    existing = await get_promocode_by_code(db, normalized_code)
-    if existing:
-        raise HTTPException(status.HTTP_400_BAD_REQUEST, 'Promo code with this code already exists')
-
     # 0 means unlimited — convert to large number for is_valid check (current_uses < max_uses)
     effective_max_uses = 999999 if payload.max_uses == 0 else payload.max_uses
 
-    promocode = await create_promocode(
+    promocode = await create_promocode_if_code_free(
         db,
         code=normalized_code,
         type=payload.type,
         balance_bonus_kopeks=payload.balance_bonus_kopeks,
         subscription_days=payload.subscription_days,
         max_uses=effective_max_uses,
+        valid_from=normalized_valid_from,
         valid_until=normalized_valid_until,
+        is_active=payload.is_active,
+        first_purchase_only=payload.first_purchase_only,
+        promo_group_id=payload.promo_group_id,
+        tariff_id=payload.tariff_id,
         created_by=admin.id,
     )
+    if promocode is None:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, 'Promo code with this code already exists')
 
-    update_fields = {}
-    if normalized_valid_from is not None:
-        update_fields['valid_from'] = normalized_valid_from
-    if payload.is_active is not None and payload.is_active != promocode.is_active:
-        update_fields['is_active'] = payload.is_active
-    if normalized_valid_until is not None:
-        update_fields['valid_until'] = normalized_valid_until
-    if payload.first_purchase_only:
-        update_fields['first_purchase_only'] = payload.first_purchase_only
-    if payload.promo_group_id is not None:
-        update_fields['promo_group_id'] = payload.promo_group_id
-    if payload.tariff_id is not None:
-        update_fields['tariff_id'] = payload.tariff_id
-
-    if update_fields:
-        promocode = await update_promocode(db, promocode, **update_fields)
-
-    return await _serialize_promocode(db, promocode)
+    await _invalidate_promocodes_list_cache()
+    return json_response(await _serialize_promocode(db, promocode), status.HTTP_201_CREATED)
 
 
 @router.patch('/{promocode_id}', response_model=PromoCodeResponse)
@@ -418,23 +480,23 @@ async def update_promocode_endpoint(
     payload: PromoCodeUpdateRequest,
     admin: User = Depends(require_permission('promocodes:edit')),
     db: AsyncSession = Depends(get_cabinet_db),
-) -> PromoCodeResponse:
+) -> Response:
     """Update an existing promocode."""
     promocode = await get_promocode_by_id(db, promocode_id)
     if not promocode:
         raise HTTPException(status.HTTP_404_NOT_FOUND, 'Promo code not found')
 
+    # An empty PATCH changes nothing — skip validation and the write.
+    if not payload.model_fields_set:
+        return json_response(await _serialize_promocode(db, promocode))
+
     _validate_update_payload(payload, promocode)
 
     updates: dict[str, Any] = {}
 
     if payload.code is not None:
-        normalized_code = payload.code.strip().upper()
-        if normalized_code != promocode.code:
-            existing = await get_promocode_by_code(db, normalized_code)
-            if existing and existing.id != promocode_id:
-                raise HTTPException(status.HTTP_400_BAD_REQUEST, 'Promo code with this code already exists')
-        updates['code'] = normalized_code
+        # Duplicates are caught by the unique constraint on commit below.
+        updates['code'] = payload.code.strip().upper()
 
     if payload.type is not None:
         updates['type'] = payload.type.value
@@ -467,10 +529,16 @@ async def update_promocode_endpoint(
         updates['tariff_id'] = payload.tariff_id if payload.tariff_id != 0 else None
 
     if not updates:
-        return await _serialize_promocode(db, promocode)
+        return json_response(await _serialize_promocode(db, promocode))
 
-    promocode = await update_promocode(db, promocode, **updates)
-    return await _serialize_promocode(db, promocode)
+    try:
+        promocode = await update_promocode(db, promocode, **updates)
+    except IntegrityError as exc:
+        await db.rollback()
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, _update_integrity_error_detail(exc, updates)) from exc
+
+    await _invalidate_promocodes_list_cache()
+    return json_response(await _serialize_promocode(db, promocode))
 
 
 @router.delete(
@@ -492,6 +560,7 @@ async def delete_promocode_endpoint(
     if not success:
         raise HTTPException(status.HTTP_400_BAD_REQUEST, 'Failed to delete promo code')
 
+    await _invalidate_promocodes_list_cache()
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
@@ -508,7 +577,7 @@ async def admin_deactivate_discount_promocode(
     user_id: int,
     admin: User = Depends(require_permission('promocodes:edit')),
     db: AsyncSession = Depends(get_cabinet_db),
-) -> DeactivateDiscountResponse:
+) -> Response:
     """Admin: deactivate a user's active discount (promo code or promo offer)."""
     from app.database.crud.user import get_user_by_id as get_user
 
@@ -534,12 +603,16 @@ async def admin_deactivate_discount_promocode(
         )
 
         if result['success']:
-            return DeactivateDiscountResponse(
-                success=True,
-                message=f'Discount promo code deactivated for user {user_id}',
-                deactivated_code=result.get('deactivated_code'),
-                discount_percent=result.get('discount_percent', 0),
-                user_id=user_id,
+            # Rolling back the use changes the code's current_uses.
+            await _invalidate_promocodes_list_cache()
+            return json_response(
+                DeactivateDiscountResponse(
+                    success=True,
+                    message=f'Discount promo code deactivated for user {user_id}',
+                    deactivated_code=result.get('deactivated_code'),
+                    discount_percent=result.get('discount_percent', 0),
+                    user_id=user_id,
+                )
             )
 
         error_messages = {
@@ -560,12 +633,14 @@ async def admin_deactivate_discount_promocode(
     target_user.updated_at = datetime.now(UTC)
     await db.commit()
 
-    return DeactivateDiscountResponse(
-        success=True,
-        message=f'Promo offer deactivated for user {user_id}',
-        deactivated_code=None,
-        discount_percent=old_percent,
-        user_id=user_id,
+    return json_response(
+        DeactivateDiscountResponse(
+            success=True,
+            message=f'Promo offer deactivated for user {user_id}',
+            deactivated_code=None,
+            discount_percent=old_percent,
+            user_id=user_id,
+        )
     )
 
 
@@ -580,20 +655,27 @@ async def list_promo_groups(
     db: AsyncSession = Depends(get_cabinet_db),
     limit: int = Query(50, ge=1, le=200),
     offset: int = Query(0, ge=0),
-) -> PromoGroupListResponse:
+) -> Response:
     """Get list of all promo groups."""
-    total = await count_promo_groups(db)
-    groups_with_counts = await get_promo_groups_with_counts(
+    key = cache_key(_PROMO_GROUPS_LIST_CACHE_PREFIX, limit, offset)
+    cached = await _get_cached_json_response(key)
+    if cached is not None:
+        return cached
+
+    groups_with_counts, total = await get_promo_groups_page_with_total(
         db,
         offset=offset,
         limit=limit,
     )
 
-    return PromoGroupListResponse(
-        items=[_serialize_promo_group(group, members_count=count) for group, count in groups_with_counts],
-        total=total,
-        limit=limit,
-        offset=offset,
+    return await _cache_json_response(
+        key,
+        PromoGroupListResponse.model_construct(
+            items=[_serialize_promo_group(group, members_count=count) for group, count in groups_with_counts],
+            total=total,
+            limit=limit,
+            offset=offset,
+        ),
     )
 
 
@@ -602,14 +684,14 @@ async def get_promo_group(
     group_id: int,
     admin: User = Depends(require_permission('promo_groups:read')),
     db: AsyncSession = Depends(get_cabinet_db),
-) -> PromoGroupResponse:
+) -> Response:
     """Get promo group details."""
-    group = await get_promo_group_by_id(db, group_id)
-    if not group:
+    group_with_count = await get_promo_group_with_count(db, group_id)
+    if not group_with_count:
         raise HTTPException(status.HTTP_404_NOT_FOUND, 'Promo group not found')
 
-    members_count = await count_promo_group_members(db, group_id)
-    return _serialize_promo_group(group, members_count=members_count)
+    group, members_count = group_with_count
+    return json_response(_serialize_promo_group(group, members_count=members_count))
 
 
 @promo_groups_router.post('', response_model=PromoGroupResponse, status_code=status.HTTP_201_CREATED)
@@ -617,10 +699,8 @@ async def create_promo_group_endpoint(
     payload: PromoGroupCreateRequest,
     admin: User = Depends(require_permission('promo_groups:create')),
     db: AsyncSession = Depends(get_cabinet_db),
-) -> PromoGroupResponse:
+) -> Response:
     """Create a new promo group."""
-    from sqlalchemy.exc import IntegrityError
-
     try:
         group = await create_promo_group(
             db,
@@ -640,7 +720,8 @@ async def create_promo_group_endpoint(
             'Promo group with this name already exists',
         )
 
-    return _serialize_promo_group(group, members_count=0)
+    await _invalidate_promo_groups_list_cache()
+    return json_response(_serialize_promo_group(group, members_count=0), status.HTTP_201_CREATED)
 
 
 @promo_groups_router.patch('/{group_id}', response_model=PromoGroupResponse)
@@ -649,14 +730,18 @@ async def update_promo_group_endpoint(
     payload: PromoGroupUpdateRequest,
     admin: User = Depends(require_permission('promo_groups:edit')),
     db: AsyncSession = Depends(get_cabinet_db),
-) -> PromoGroupResponse:
+) -> Response:
     """Update a promo group."""
-    from sqlalchemy.exc import IntegrityError
-
-    group = await get_promo_group_by_id(db, group_id)
-    if not group:
+    # Editing a group never moves users, so the members count is read up front.
+    group_with_count = await get_promo_group_with_count(db, group_id)
+    if not group_with_count:
         raise HTTPException(status.HTTP_404_NOT_FOUND, 'Promo group not found')
 
+    group, members_count = group_with_count
+
+    if not payload.model_fields_set:
+        return json_response(_serialize_promo_group(group, members_count=members_count))
+
     try:
         group = await update_promo_group(
             db,
@@ -677,8 +762,8 @@ async def update_promo_group_endpoint(
             'Promo group with this name already exists',
         )
 
-    members_count = await count_promo_group_members(db, group_id)
-    return _serialize_promo_group(group, members_count=members_count)
+    await _invalidate_promo_groups_list_cache()
+    return json_response(_serialize_promo_group(group, members_count=members_count))
 
 
 @promo_groups_router.delete('/{group_id}', status_code=status.HTTP_204_NO_CONTENT)
@@ -696,4 +781,6 @@ async def delete_promo_group_endpoint(
     if not success:
         raise HTTPException(status.HTTP_400_BAD_REQUEST, 'Cannot delete default promo group')
 
+    # Promocodes of a deleted group have their promo_group_id nulled.
+    await asyncio.gather(_invalidate_promo_groups_list_cache(), _invalidate_promocodes_list_cache())
     return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -1,27 +1,56 @@
 """Admin routes for managing users in cabinet."""
 
+import asyncio
 import math
+from collections.abc import Callable
 from datetime import UTC, datetime, timedelta
+from functools import lru_cache, partial
+from typing import Any
 
 import structlog
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-from sqlalchemy import Integer, and_, delete as sa_delete, func, literal, or_, select
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy import (
+    Executable,
+    Row,
+    Select,
+    delete as sa_delete,
+    func,
+    lambda_stmt,
+    literal,
+    or_,
+    select,
+    update as sa_update,
+)
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import noload, selectinload
 
 from app.cabinet.utils.device_ownership import verify_hwid_belongs_to_user
 from app.config import settings
+from app.database.constants import POSTGRES_INT4_MAX, POSTGRES_INT4_MIN
 from app.database.crud.campaign import get_campaign_registration_by_user
 from app.database.crud.subscription import (
+    add_subscription_traffic,
+    calc_device_limit_on_tariff_switch,
+    create_paid_subscription,
+    deactivate_subscription,
     extend_subscription,
+    get_subscription_by_id_for_user,
+    get_subscription_by_user_and_tariff,
+    is_active_paid_subscription,
+    reactivate_subscription,
+    wipe_trial_subscriptions,
 )
-from app.database.crud.tariff import get_tariff_by_id
+from app.database.crud.tariff import get_all_tariffs, get_tariff_by_id
+from app.database.crud.transaction import create_transaction
 from app.database.crud.user import (
     add_user_balance,
+    count_referrals,
     delete_user as soft_delete_user,
-    get_referrals,
+    get_referrals_page,
     get_user_by_id,
     get_user_by_telegram_id,
+    get_user_with_subscriptions,
     get_users_count,
     get_users_list,
     get_users_spending_stats,
@@ -35,6 +64,7 @@ from app.database.crud.user_device_alias import (
     set_alias,
 )
 from app.database.crud.user_promo_group import sync_user_primary_promo_group
+from app.database.database import AsyncSessionLocal
 from app.database.models import (
     GuestPurchase,
     PaymentMethod,
@@ -43,6 +73,7 @@ from app.database.models import (
     Subscription,
     SubscriptionServer,
     SubscriptionStatus,
+    Tariff,
     TrafficPurchase,
     Transaction,
     TransactionType,
@@ -50,11 +81,20 @@ from app.database.models import (
     UserPromoGroup,
     UserStatus,
 )
+from app.external.remnawave_api import UserStatus as PanelUserStatus
 from app.services.permission_service import PermissionService
-from app.utils.subscription_utils import coerce_panel_device_limit
+from app.services.remnawave_service import RemnaWaveService
+from app.services.subscription_service import (
+    SubscriptionService,
+    get_traffic_reset_strategy,
+    reset_subscription_with_panel,
+)
+from app.services.user_service import UserService
+from app.utils.subscription_utils import coerce_panel_device_limit, resolve_hwid_device_limit_for_payload
 from app.utils.timezone import panel_datetime_to_utc
+from app.utils.ttl_cache import TTLCache
 
-from ..dependencies import get_cabinet_db, require_permission
+from ..dependencies import get_cabinet_db, invalidate_cached_user, require_permission
 from ..schemas.users import (
     AdminUserGiftItem,
     AdminUserGiftsResponse,
@@ -115,17 +155,64 @@ from ..schemas.users import (
     UserSubscriptionInfo,
     UserTransactionItem,
 )
+from ..utils.route_helpers import in_own_session, json_response
 
 
 logger = structlog.get_logger(__name__)
 
+# Latest detached panel sync per subscription id. Holding the task also keeps a
+# strong ref (asyncio.create_task may garbage collect an unreferenced task), and a
+# new sync for the same subscription waits for it, so quick successive edits never
+# race each other into api.create_user.
+_panel_sync_tasks: dict[int, asyncio.Task] = {}
+
+# How long shutdown waits for in-flight panel syncs before cancelling them
+_PANEL_SYNC_DRAIN_TIMEOUT = 10
+
+# Spending stats of a user without completed transactions (shared, never mutated)
+_EMPTY_STATS = {'total_spent': 0, 'purchase_count': 0}
+
+_BYTES_PER_GB = 1024**3
+
+# Transaction types shown to admins as negative amounts
+_EXPENSE_TYPES = frozenset(
+    {
+        TransactionType.WITHDRAWAL.value,
+        TransactionType.SUBSCRIPTION_PAYMENT.value,
+        TransactionType.GIFT_PAYMENT.value,
+    }
+)
+
+# The /stats aggregates scan every user and subscription, and the admin
+# dashboard polls them. Serve the rendered body for a short while instead.
+_STATS_CACHE_TTL = 30
+_STATS_CACHE_KEY = 'stats'
+_stats_cache = TTLCache(maxsize=1, ttl=_STATS_CACHE_TTL)
+
 router = APIRouter(prefix='/admin/users', tags=['Cabinet Admin Users'])
 
 
-def _build_user_list_item(user: User, spending_stats: dict = None) -> UserListItem:
-    """Build UserListItem from User model."""
-    stats = spending_stats or {}
-    user_stats = stats.get(user.id, {'total_spent': 0, 'purchase_count': 0})
+async def _fetch_one_or_none(db: AsyncSession, statement: Executable) -> Row | None:
+    return (await db.execute(statement)).one_or_none()
+
+
+async def _fetch_scalars(db: AsyncSession, statement: Select) -> list[Any]:
+    return list((await db.execute(statement)).scalars().all())
+
+
+def _build_user_list_item(user: User, spending_stats: dict = None, now: datetime | None = None) -> UserListItem:
+    """Build UserListItem from User model.
+
+    Reads ``user.subscriptions`` (with their tariffs) and ``user.promo_group``,
+    so the users must come with those relationships eager-loaded, as
+    get_users_list does; an async session cannot lazy-load them here.
+
+    The items are built with ``model_construct`` from already typed ORM
+    values, so a page skips validation entirely; routing the rows through
+    ``TypeAdapter(list[UserListItem])`` would only add it back.
+    """
+    user_stats = (spending_stats or {}).get(user.id) or _EMPTY_STATS
+    now = now or datetime.now(UTC)
 
     subscription_status = None
     subscription_is_trial = False
@@ -151,7 +238,7 @@ def _build_user_list_item(user: User, spending_stats: dict = None) -> UserListIt
         traffic_limit_gb = subscription.traffic_limit_gb or 0
         device_limit = subscription.device_limit or 0
         if subscription.end_date:
-            delta = subscription.end_date - datetime.now(UTC)
+            delta = subscription.end_date - now
             days_remaining = max(0, delta.days)
 
     # Build per-subscription list (always — bulk actions need it for any mode)
@@ -160,10 +247,10 @@ def _build_user_list_item(user: User, spending_stats: dict = None) -> UserListIt
         for s in subs:
             s_days = 0
             if s.end_date:
-                s_delta = s.end_date - datetime.now(UTC)
+                s_delta = s.end_date - now
                 s_days = max(0, s_delta.days)
             sub_list.append(
-                SubscriptionListItem(
+                SubscriptionListItem.model_construct(
                     id=s.id,
                     tariff_id=s.tariff_id,
                     tariff_name=s.tariff.name if s.tariff else None,
@@ -177,7 +264,7 @@ def _build_user_list_item(user: User, spending_stats: dict = None) -> UserListIt
                 )
             )
 
-    return UserListItem(
+    return UserListItem.model_construct(
         id=user.id,
         telegram_id=user.telegram_id,
         username=user.username,
@@ -202,25 +289,28 @@ def _build_user_list_item(user: User, spending_stats: dict = None) -> UserListIt
         subscriptions=sub_list,
         promo_group_id=user.promo_group_id,
         promo_group_name=user.promo_group.name if user.promo_group else None,
-        total_spent_kopeks=user_stats.get('total_spent', 0),
-        purchase_count=user_stats.get('purchase_count', 0),
+        total_spent_kopeks=user_stats['total_spent'],
+        purchase_count=user_stats['purchase_count'],
         has_restrictions=user.has_restrictions,
         restriction_topup=user.restriction_topup,
         restriction_subscription=user.restriction_subscription,
     )
 
 
-def _build_subscription_info(subscription: Subscription, tariff_name: str | None = None) -> UserSubscriptionInfo:
+def _build_subscription_info(
+    subscription: Subscription, tariff_name: str | None = None, now: datetime | None = None
+) -> UserSubscriptionInfo:
     """Build UserSubscriptionInfo from Subscription model."""
     days_remaining = 0
     is_active = False
 
     if subscription.end_date:
-        delta = subscription.end_date - datetime.now(UTC)
+        now = now or datetime.now(UTC)
+        delta = subscription.end_date - now
         days_remaining = max(0, delta.days)
-        is_active = subscription.status == SubscriptionStatus.ACTIVE.value and subscription.end_date > datetime.now(UTC)
+        is_active = subscription.status == SubscriptionStatus.ACTIVE.value and subscription.end_date > now
 
-    return UserSubscriptionInfo(
+    return UserSubscriptionInfo.model_construct(
         id=subscription.id,
         status=subscription.status,
         is_trial=subscription.is_trial,
@@ -237,31 +327,55 @@ def _build_subscription_info(subscription: Subscription, tariff_name: str | None
     )
 
 
-async def _build_subscription_info_async(db: AsyncSession, subscription: Subscription) -> UserSubscriptionInfo:
-    """Build UserSubscriptionInfo from Subscription model, fetching tariff name and traffic purchases."""
-    tariff_name = None
-    if subscription.tariff_id:
-        tariff = await get_tariff_by_id(db, subscription.tariff_id)
-        if tariff:
-            tariff_name = tariff.name
+def _build_transaction_item(transaction: Transaction) -> UserTransactionItem:
+    """Build UserTransactionItem from Transaction model; expenses are shown as negative amounts."""
+    amount_kopeks = transaction.amount_kopeks
+    if transaction.type in _EXPENSE_TYPES:
+        amount_kopeks = -abs(amount_kopeks)
+
+    return UserTransactionItem.model_construct(
+        id=transaction.id,
+        type=transaction.type,
+        amount_kopeks=amount_kopeks,
+        amount_rubles=amount_kopeks / 100,
+        description=transaction.description,
+        payment_method=transaction.payment_method,
+        is_completed=transaction.is_completed,
+        created_at=transaction.created_at,
+    )
+
+
+async def _build_subscriptions_info(db: AsyncSession, subscriptions: list[Subscription]) -> list[UserSubscriptionInfo]:
+    """Build UserSubscriptionInfo for several subscriptions.
+
+    Tariff names and traffic purchases are fetched with one IN query each
+    instead of one pair of queries per subscription.
+    """
+    if not subscriptions:
+        return []
+
+    tariff_ids = {s.tariff_id for s in subscriptions if s.tariff_id}
+    tariff_names: dict[int, str] = {}
+    if tariff_ids:
+        tariff_result = await db.execute(select(Tariff.id, Tariff.name).where(Tariff.id.in_(tariff_ids)))
+        tariff_names = dict(tariff_result.all())
 
     # Fetch traffic purchases
     now = datetime.now(UTC)
     tp_query = (
         select(TrafficPurchase)
-        .where(TrafficPurchase.subscription_id == subscription.id)
+        .where(TrafficPurchase.subscription_id.in_([s.id for s in subscriptions]))
         .order_by(TrafficPurchase.created_at.desc())
     )
     tp_result = await db.execute(tp_query)
-    purchases = tp_result.scalars().all()
 
-    traffic_purchase_items = []
-    for p in purchases:
+    traffic_purchase_items: dict[int, list[TrafficPurchaseItem]] = {}
+    for p in tp_result.scalars().all():
         delta = p.expires_at - now
         days_remaining = max(0, delta.days)
         is_expired = now >= p.expires_at
-        traffic_purchase_items.append(
-            TrafficPurchaseItem(
+        traffic_purchase_items.setdefault(p.subscription_id, []).append(
+            TrafficPurchaseItem.model_construct(
                 id=p.id,
                 traffic_gb=p.traffic_gb,
                 expires_at=p.expires_at,
@@ -271,10 +385,18 @@ async def _build_subscription_info_async(db: AsyncSession, subscription: Subscri
             )
         )
 
-    info = _build_subscription_info(subscription, tariff_name=tariff_name)
-    info.purchased_traffic_gb = getattr(subscription, 'purchased_traffic_gb', 0) or 0
-    info.traffic_purchases = traffic_purchase_items
-    return info
+    infos = []
+    for subscription in subscriptions:
+        info = _build_subscription_info(subscription, tariff_name=tariff_names.get(subscription.tariff_id), now=now)
+        info.purchased_traffic_gb = getattr(subscription, 'purchased_traffic_gb', 0) or 0
+        info.traffic_purchases = traffic_purchase_items.get(subscription.id, [])
+        infos.append(info)
+    return infos
+
+
+async def _build_subscription_info_async(db: AsyncSession, subscription: Subscription) -> UserSubscriptionInfo:
+    """Build UserSubscriptionInfo from Subscription model, fetching tariff name and traffic purchases."""
+    return (await _build_subscriptions_info(db, [subscription]))[0]
 
 
 async def _sync_subscription_to_panel(
@@ -291,27 +413,22 @@ async def _sync_subscription_to_panel(
     Returns dict with changes/errors.
     """
     try:
-        from app.config import settings
-        from app.external.remnawave_api import UserStatus as PanelUserStatus
-        from app.services.remnawave_service import RemnaWaveService
-        from app.services.subscription_service import get_traffic_reset_strategy
-        from app.utils.subscription_utils import resolve_hwid_device_limit_for_payload
-
         service = RemnaWaveService()
         if not service.is_configured:
             logger.warning('Remnawave not configured, skipping panel sync for user', user_id=user.id)
             return {'skipped': True, 'reason': 'Remnawave not configured'}
 
+        now = datetime.now(UTC)
         is_active = (
             subscription.status in (SubscriptionStatus.ACTIVE.value, SubscriptionStatus.TRIAL.value)
             and subscription.end_date
-            and subscription.end_date > datetime.now(UTC)
+            and subscription.end_date > now
         )
         panel_status = PanelUserStatus.ACTIVE if is_active else PanelUserStatus.DISABLED
 
         expire_at = subscription.end_date
-        if expire_at and expire_at <= datetime.now(UTC):
-            expire_at = datetime.now(UTC) + timedelta(minutes=1)
+        if expire_at and expire_at <= now:
+            expire_at = now + timedelta(minutes=1)
 
         # При multi-tariff create-path ниже приклеивается `_<remnawave_short_id>`.
         # build_remnawave_subscription_username гарантирует, что итоговая строка
@@ -339,133 +456,127 @@ async def _sync_subscription_to_panel(
         )
 
         hwid_limit = resolve_hwid_device_limit_for_payload(subscription)
-        traffic_limit_bytes = subscription.traffic_limit_gb * (1024**3) if subscription.traffic_limit_gb > 0 else 0
+        traffic_limit_bytes = subscription.traffic_limit_gb * _BYTES_PER_GB if subscription.traffic_limit_gb > 0 else 0
 
-        # Загружаем tariff для определения внешнего сквада
-        try:
-            await db.refresh(subscription, ['tariff'])
-        except Exception:
-            pass
+        # tariff уже подгружен вместе с подписками (get_user_by_id)
         ext_squad_uuid = subscription.tariff.external_squad_uuid if subscription.tariff else None
 
         changes = {}
-        async with service.get_api_client() as api:
-            # Multi-tariff: each subscription has its own panel user
-            if settings.is_multi_tariff_enabled():
-                panel_uuid = subscription.remnawave_uuid
-            else:
-                panel_uuid = user.remnawave_uuid
-
-            # Try to find existing user by UUID first
-            if panel_uuid:
-                existing_user = await api.get_user_by_uuid(panel_uuid)
-                if not existing_user:
-                    logger.warning('Stale remnawave_uuid, clearing', user_id=user.id, panel_uuid=panel_uuid)
-                    panel_uuid = None
-                    if settings.is_multi_tariff_enabled():
-                        subscription.remnawave_uuid = None
-                    else:
-                        user.remnawave_uuid = None
-
-            # Fallback: search by telegram_id (single-tariff only)
-            if not panel_uuid and not settings.is_multi_tariff_enabled() and user.telegram_id:
-                existing_users = await api.get_user_by_telegram_id(user.telegram_id)
-                if existing_users:
-                    panel_uuid = existing_users[0].uuid
-                    user.remnawave_uuid = panel_uuid
-                    changes['remnawave_uuid_discovered'] = panel_uuid
-
-            # Fallback: search by email (single-tariff, OAuth users)
-            if not panel_uuid and not settings.is_multi_tariff_enabled() and user.email:
-                existing_users = await api.get_user_by_email(user.email)
-                if existing_users:
-                    panel_uuid = existing_users[0].uuid
-                    user.remnawave_uuid = panel_uuid
-                    changes['remnawave_uuid_discovered'] = panel_uuid
-
-            if panel_uuid:
-                # Update existing user
-                update_kwargs = {
-                    'uuid': panel_uuid,
-                    'status': panel_status,
-                    'traffic_limit_bytes': traffic_limit_bytes,
-                    'traffic_limit_strategy': get_traffic_reset_strategy(subscription.tariff),
-                    'description': description,
-                }
-                if expire_at:
-                    update_kwargs['expire_at'] = expire_at
-                if subscription.connected_squads:
-                    update_kwargs['active_internal_squads'] = subscription.connected_squads
-                if hwid_limit is not None:
-                    update_kwargs['hwid_device_limit'] = hwid_limit
-
-                # Внешний сквад: синхронизируем из тарифа (если задан)
-                # Не отправляем null — RemnaWave API не принимает null для externalSquadUuid (A039)
-                if ext_squad_uuid is not None:
-                    update_kwargs['external_squad_uuid'] = ext_squad_uuid
+        api = await service.get_shared_api_client()
+        # Multi-tariff: each subscription has its own panel user
+        if settings.is_multi_tariff_enabled():
+            panel_uuid = subscription.remnawave_uuid
+        else:
+            panel_uuid = user.remnawave_uuid
+
+        # Try to find existing user by UUID first
+        if panel_uuid:
+            existing_user = await api.get_user_by_uuid(panel_uuid)
+            if not existing_user:
+                logger.warning('Stale remnawave_uuid, clearing', user_id=user.id, panel_uuid=panel_uuid)
+                panel_uuid = None
+                if settings.is_multi_tariff_enabled():
+                    subscription.remnawave_uuid = None
+                else:
+                    user.remnawave_uuid = None
+
+        # Fallback: search by telegram_id (single-tariff only)
+        if not panel_uuid and not settings.is_multi_tariff_enabled() and user.telegram_id:
+            existing_users = await api.get_user_by_telegram_id(user.telegram_id)
+            if existing_users:
+                panel_uuid = existing_users[0].uuid
+                user.remnawave_uuid = panel_uuid
+                changes['remnawave_uuid_discovered'] = panel_uuid
+
+        # Fallback: search by email (single-tariff, OAuth users)
+        if not panel_uuid and not settings.is_multi_tariff_enabled() and user.email:
+            existing_users = await api.get_user_by_email(user.email)
+            if existing_users:
+                panel_uuid = existing_users[0].uuid
+                user.remnawave_uuid = panel_uuid
+                changes['remnawave_uuid_discovered'] = panel_uuid
+
+        if panel_uuid:
+            # Update existing user
+            update_kwargs = {
+                'uuid': panel_uuid,
+                'status': panel_status,
+                'traffic_limit_bytes': traffic_limit_bytes,
+                'traffic_limit_strategy': get_traffic_reset_strategy(subscription.tariff),
+                'description': description,
+            }
+            if expire_at:
+                update_kwargs['expire_at'] = expire_at
+            if subscription.connected_squads:
+                update_kwargs['active_internal_squads'] = subscription.connected_squads
+            if hwid_limit is not None:
+                update_kwargs['hwid_device_limit'] = hwid_limit
+
+            # Внешний сквад: синхронизируем из тарифа (если задан)
+            # Не отправляем null — RemnaWave API не принимает null для externalSquadUuid (A039)
+            if ext_squad_uuid is not None:
+                update_kwargs['external_squad_uuid'] = ext_squad_uuid
 
-                try:
-                    updated_panel_user = await api.update_user(**update_kwargs)
-                    subscription.subscription_url = updated_panel_user.subscription_url
-                    subscription.subscription_crypto_link = updated_panel_user.happ_crypto_link
-                    subscription.remnawave_short_uuid = updated_panel_user.short_uuid
-                    changes['action'] = 'updated'
-                    logger.info('Updated user in Remnawave panel', user_id=user.id)
-                except Exception as update_error:
-                    error_code = (getattr(update_error, 'response_data', None) or {}).get('errorCode', '')
-                    if (
-                        hasattr(update_error, 'status_code') and update_error.status_code == 404
-                    ) or error_code == 'A018':
-                        panel_uuid = None  # Will create new
-                    else:
-                        raise
-
-            if not panel_uuid:
-                # Create new user
-                create_kwargs = {
-                    'username': username,
-                    'expire_at': expire_at or (datetime.now(UTC) + timedelta(days=30)),
-                    'status': panel_status,
-                    'traffic_limit_bytes': traffic_limit_bytes,
-                    'traffic_limit_strategy': get_traffic_reset_strategy(subscription.tariff),
-                    'telegram_id': user.telegram_id,
-                    'email': user.email,
-                    'description': description,
-                    'active_internal_squads': subscription.connected_squads or [],
-                }
-                if hwid_limit is not None:
-                    create_kwargs['hwid_device_limit'] = hwid_limit
-                if ext_squad_uuid is not None:
-                    create_kwargs['external_squad_uuid'] = ext_squad_uuid
-
-                # multi-tariff suffix уже встроен в `username` через
-                # build_remnawave_subscription_username — больше ничего не клеим.
-
-                new_panel_user = await api.create_user(**create_kwargs)
-                subscription.remnawave_uuid = new_panel_user.uuid
-                subscription.remnawave_short_uuid = new_panel_user.short_uuid
-                subscription.subscription_url = new_panel_user.subscription_url
-                subscription.subscription_crypto_link = new_panel_user.happ_crypto_link
-                # Legacy: also set user-level UUID in single mode
-                if not settings.is_multi_tariff_enabled():
-                    user.remnawave_uuid = new_panel_user.uuid
-                changes['action'] = 'created'
-                changes['panel_uuid'] = new_panel_user.uuid
-                logger.info('Created user in Remnawave panel', user_id=user.id, uuid=new_panel_user.uuid)
-
-            # Reset traffic on panel if requested
-            _reset_uuid = subscription.remnawave_uuid if settings.is_multi_tariff_enabled() else user.remnawave_uuid
-            if reset_traffic and _reset_uuid:
-                try:
-                    await api.reset_user_traffic(_reset_uuid)
-                    changes['traffic_reset'] = True
-                    reason_text = f' ({reset_traffic_reason})' if reset_traffic_reason else ''
-                    logger.info('Reset RemnaWave traffic for user', user_id=user.id, reason=reason_text)
-                except Exception as reset_exc:
-                    logger.warning('Failed to reset RemnaWave traffic', user_id=user.id, error=reset_exc)
-
-            user.last_remnawave_sync = datetime.now(UTC)
-            await db.commit()
+            try:
+                updated_panel_user = await api.update_user(**update_kwargs)
+                subscription.subscription_url = updated_panel_user.subscription_url
+                subscription.subscription_crypto_link = updated_panel_user.happ_crypto_link
+                subscription.remnawave_short_uuid = updated_panel_user.short_uuid
+                changes['action'] = 'updated'
+                logger.info('Updated user in Remnawave panel', user_id=user.id)
+            except Exception as update_error:
+                error_code = (getattr(update_error, 'response_data', None) or {}).get('errorCode', '')
+                if (hasattr(update_error, 'status_code') and update_error.status_code == 404) or error_code == 'A018':
+                    panel_uuid = None  # Will create new
+                else:
+                    raise
+
+        if not panel_uuid:
+            # Create new user
+            create_kwargs = {
+                'username': username,
+                'expire_at': expire_at or (now + timedelta(days=30)),
+                'status': panel_status,
+                'traffic_limit_bytes': traffic_limit_bytes,
+                'traffic_limit_strategy': get_traffic_reset_strategy(subscription.tariff),
+                'telegram_id': user.telegram_id,
+                'email': user.email,
+                'description': description,
+                'active_internal_squads': subscription.connected_squads or [],
+            }
+            if hwid_limit is not None:
+                create_kwargs['hwid_device_limit'] = hwid_limit
+            if ext_squad_uuid is not None:
+                create_kwargs['external_squad_uuid'] = ext_squad_uuid
+
+            # multi-tariff suffix уже встроен в `username` через
+            # build_remnawave_subscription_username — больше ничего не клеим.
+
+            new_panel_user = await api.create_user(**create_kwargs)
+            subscription.remnawave_uuid = new_panel_user.uuid
+            subscription.remnawave_short_uuid = new_panel_user.short_uuid
+            subscription.subscription_url = new_panel_user.subscription_url
+            subscription.subscription_crypto_link = new_panel_user.happ_crypto_link
+            # Legacy: also set user-level UUID in single mode
+            if not settings.is_multi_tariff_enabled():
+                user.remnawave_uuid = new_panel_user.uuid
+            changes['action'] = 'created'
+            changes['panel_uuid'] = new_panel_user.uuid
+            logger.info('Created user in Remnawave panel', user_id=user.id, uuid=new_panel_user.uuid)
+
+        # Reset traffic on panel if requested
+        _reset_uuid = subscription.remnawave_uuid if settings.is_multi_tariff_enabled() else user.remnawave_uuid
+        if reset_traffic and _reset_uuid:
+            try:
+                await api.reset_user_traffic(_reset_uuid)
+                changes['traffic_reset'] = True
+                reason_text = f' ({reset_traffic_reason})' if reset_traffic_reason else ''
+                logger.info('Reset RemnaWave traffic for user', user_id=user.id, reason=reason_text)
+            except Exception as reset_exc:
+                logger.warning('Failed to reset RemnaWave traffic', user_id=user.id, error=reset_exc)
+
+        user.last_remnawave_sync = datetime.now(UTC)
+        await db.commit()
 
         return changes
 
@@ -474,6 +585,101 @@ async def _sync_subscription_to_panel(
         return {'error': 'Ошибка синхронизации пользователя с панелью'}
 
 
+async def _sync_subscription_to_panel_in_background(
+    user_id: int,
+    subscription_id: int,
+    *,
+    reset_traffic: bool = False,
+    reset_traffic_reason: str | None = None,
+    enable_after_sync: bool = False,
+) -> None:
+    """Sync a subscription to the panel on a session of its own (fire-and-forget).
+
+    The request session is gone by the time this runs, so the user and
+    subscription are re-loaded from the committed state.
+    """
+    try:
+        async with AsyncSessionLocal() as db:
+            user = await get_user_by_id(db, user_id)
+            subscription = next((s for s in user.subscriptions if s.id == subscription_id), None) if user else None
+            if not subscription:
+                logger.warning(
+                    'Subscription vanished before panel sync', user_id=user_id, subscription_id=subscription_id
+                )
+                return
+
+            changes = await _sync_subscription_to_panel(
+                db,
+                user,
+                subscription,
+                reset_traffic=reset_traffic,
+                reset_traffic_reason=reset_traffic_reason,
+            )
+            if not enable_after_sync or 'error' in changes:
+                return
+
+            # Явно включаем пользователя на панели (PATCH может не снять LIMITED-статус)
+            enable_uuid = subscription.remnawave_uuid if settings.is_multi_tariff_enabled() else user.remnawave_uuid
+            if enable_uuid and subscription.status == SubscriptionStatus.ACTIVE.value:
+                await SubscriptionService().enable_remnawave_user(enable_uuid)
+    except Exception as e:
+        logger.error('Background panel sync failed', user_id=user_id, subscription_id=subscription_id, error=e)
+
+
+async def _sync_after(previous: asyncio.Task | None, user_id: int, subscription_id: int, **kwargs: Any) -> None:
+    if previous is not None:
+        # asyncio.wait neither raises the previous sync's error nor cancels it
+        await asyncio.wait([previous])
+    await _sync_subscription_to_panel_in_background(user_id, subscription_id, **kwargs)
+
+
+def _forget_panel_sync(subscription_id: int, task: asyncio.Task) -> None:
+    if _panel_sync_tasks.get(subscription_id) is task:
+        del _panel_sync_tasks[subscription_id]
+
+
+def _schedule_panel_sync(user_id: int, subscription_id: int, **kwargs: Any) -> None:
+    """Push a subscription to the panel without holding up the admin request.
+
+    Syncs of one subscription run one after another: each re-reads the committed
+    state, so a later sync sees the panel user an earlier one created.
+    """
+    task = asyncio.create_task(
+        _sync_after(_panel_sync_tasks.get(subscription_id), user_id, subscription_id, **kwargs),
+        name=f'panel-sync-subscription-{subscription_id}',
+    )
+    _panel_sync_tasks[subscription_id] = task
+    task.add_done_callback(partial(_forget_panel_sync, subscription_id))
+
+
+async def drain_panel_sync_tasks(timeout: float = _PANEL_SYNC_DRAIN_TIMEOUT) -> None:
+    """Let in-flight panel syncs finish on shutdown, cancelling any still running after ``timeout``.
+
+    Must run before the shared RemnaWave API client is closed.
+    """
+    tasks = list(_panel_sync_tasks.values())
+    if not tasks:
+        return
+    _, pending = await asyncio.wait(tasks, timeout=timeout)
+    for task in pending:
+        task.cancel()
+    if pending:
+        logger.warning('Cancelled unfinished panel syncs on shutdown', count=len(pending))
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+async def _disable_panel_users(subscription_service: SubscriptionService, panel_uuids: list[str | None]) -> None:
+    """Disable several panel users at once instead of one HTTP round trip after another.
+
+    Each call opens its own API client and logs its own failure, so errors are
+    only collected here to keep one bad UUID from cancelling the rest.
+    """
+    await asyncio.gather(
+        *(subscription_service.disable_remnawave_user(uuid) for uuid in panel_uuids if uuid),
+        return_exceptions=True,
+    )
+
+
 # === List & Search ===
 
 
@@ -558,13 +764,16 @@ async def list_users(
     user_ids = [u.id for u in users]
     spending_stats = await get_users_spending_stats(db, user_ids) if user_ids else {}
 
-    items = [_build_user_list_item(u, spending_stats) for u in users]
+    now = datetime.now(UTC)
+    items = [_build_user_list_item(u, spending_stats, now) for u in users]
 
-    return UsersListResponse(
-        users=items,
-        total=total,
-        offset=offset,
-        limit=limit,
+    return json_response(
+        UsersListResponse.model_construct(
+            users=items,
+            total=total,
+            offset=offset,
+            limit=limit,
+        )
     )
 
 
@@ -574,95 +783,97 @@ async def get_users_stats(
     db: AsyncSession = Depends(get_cabinet_db),
 ):
     """Get overall users statistics."""
-    stats = await get_users_statistics(db)
+    cached = _stats_cache.get(_STATS_CACHE_KEY)
+    if cached is not None:
+        return Response(content=cached, media_type='application/json')
+
+    now = datetime.now(UTC)
+
+    # The statements are wrapped in lambda_stmt so SQLAlchemy builds and
+    # compiles each of them once; the thresholds travel as bound parameters.
 
     # Get subscription stats
-    sub_stats_query = select(
-        func.count(Subscription.id).label('total'),
-        func.sum(
-            func.cast(
-                and_(
-                    Subscription.status == SubscriptionStatus.ACTIVE.value,
-                    Subscription.end_date > datetime.now(UTC),
-                ),
-                Integer,
-            )
-        ).label('active'),
-        func.sum(func.cast(Subscription.is_trial == True, Integer)).label('trial'),
-        func.sum(
-            func.cast(
-                or_(
-                    Subscription.status == SubscriptionStatus.EXPIRED.value,
-                    Subscription.end_date <= datetime.now(UTC),
-                ),
-                Integer,
-            )
-        ).label('expired'),
+    sub_stats_query = lambda_stmt(
+        lambda: select(
+            func.count().label('total'),
+            func.count()
+            .filter(Subscription.status == SubscriptionStatus.ACTIVE.value, Subscription.end_date > now)
+            .label('active'),
+            func.count().filter(Subscription.is_trial == True).label('trial'),
+            func.count()
+            .filter(or_(Subscription.status == SubscriptionStatus.EXPIRED.value, Subscription.end_date <= now))
+            .label('expired'),
+        ).select_from(Subscription)
     )
-    sub_result = await db.execute(sub_stats_query)
-    sub_row = sub_result.one_or_none()
-
-    users_with_subscription = sub_row.total or 0 if sub_row else 0
-    users_with_active = sub_row.active or 0 if sub_row else 0
-    users_with_trial = sub_row.trial or 0 if sub_row else 0
-    users_with_expired = sub_row.expired or 0 if sub_row else 0
 
     # Get balance stats
-    balance_query = select(
-        func.sum(User.balance_kopeks).label('total'),
-        func.avg(User.balance_kopeks).label('avg'),
-    ).where(User.status == UserStatus.ACTIVE.value)
-    balance_result = await db.execute(balance_query)
-    balance_row = balance_result.one_or_none()
-    total_balance = balance_row.total or 0 if balance_row else 0
-    avg_balance = int(balance_row.avg or 0) if balance_row else 0
+    balance_query = lambda_stmt(
+        lambda: select(
+            func.sum(User.balance_kopeks).label('total'),
+            func.avg(User.balance_kopeks).label('avg'),
+        ).where(User.status == UserStatus.ACTIVE.value)
+    )
 
     # Get activity stats
-    now = datetime.now(UTC)
     today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
     week_ago = now - timedelta(days=7)
     month_ago = now - timedelta(days=30)
 
-    active_today_q = select(func.count(User.id)).where(
-        User.last_activity >= today_start,
-        User.status == UserStatus.ACTIVE.value,
-    )
-    active_week_q = select(func.count(User.id)).where(
-        User.last_activity >= week_ago,
-        User.status == UserStatus.ACTIVE.value,
-    )
-    active_month_q = select(func.count(User.id)).where(
-        User.last_activity >= month_ago,
-        User.status == UserStatus.ACTIVE.value,
+    # Activity and deleted-user counts share one pass over users
+    activity_query = lambda_stmt(
+        lambda: select(
+            func.count()
+            .filter(User.last_activity >= today_start, User.status == UserStatus.ACTIVE.value)
+            .label('today'),
+            func.count().filter(User.last_activity >= week_ago, User.status == UserStatus.ACTIVE.value).label('week'),
+            func.count().filter(User.last_activity >= month_ago, User.status == UserStatus.ACTIVE.value).label('month'),
+            func.count().filter(User.status == UserStatus.DELETED.value).label('deleted'),
+        ).select_from(User)
     )
 
-    active_today = (await db.execute(active_today_q)).scalar() or 0
-    active_week = (await db.execute(active_week_q)).scalar() or 0
-    active_month = (await db.execute(active_month_q)).scalar() or 0
+    # The aggregates are independent, so run them side by side on their own sessions
+    stats, sub_row, balance_row, activity_row = await asyncio.gather(
+        get_users_statistics(db),
+        in_own_session(_fetch_one_or_none, sub_stats_query),
+        in_own_session(_fetch_one_or_none, balance_query),
+        in_own_session(_fetch_one_or_none, activity_query),
+    )
 
-    # Count deleted users
-    deleted_q = select(func.count(User.id)).where(User.status == UserStatus.DELETED.value)
-    deleted_count = (await db.execute(deleted_q)).scalar() or 0
+    users_with_subscription = sub_row.total or 0 if sub_row else 0
+    users_with_active = sub_row.active or 0 if sub_row else 0
+    users_with_trial = sub_row.trial or 0 if sub_row else 0
+    users_with_expired = sub_row.expired or 0 if sub_row else 0
 
-    return UsersStatsResponse(
-        total_users=stats['total_users'],
-        active_users=stats['active_users'],
-        blocked_users=stats['blocked_users'],
-        deleted_users=deleted_count,
-        new_today=stats['new_today'],
-        new_week=stats['new_week'],
-        new_month=stats['new_month'],
-        users_with_subscription=users_with_subscription,
-        users_with_active_subscription=users_with_active,
-        users_with_trial=users_with_trial,
-        users_with_expired_subscription=users_with_expired,
-        total_balance_kopeks=total_balance,
-        total_balance_rubles=total_balance / 100,
-        avg_balance_kopeks=avg_balance,
-        active_today=active_today,
-        active_week=active_week,
-        active_month=active_month,
+    total_balance = balance_row.total or 0 if balance_row else 0
+    avg_balance = int(balance_row.avg or 0) if balance_row else 0
+    active_today = activity_row.today or 0 if activity_row else 0
+    active_week = activity_row.week or 0 if activity_row else 0
+    active_month = activity_row.month or 0 if activity_row else 0
+    deleted_count = activity_row.deleted or 0 if activity_row else 0
+
+    response = json_response(
+        UsersStatsResponse.model_construct(
+            total_users=stats['total_users'],
+            active_users=stats['active_users'],
+            blocked_users=stats['blocked_users'],
+            deleted_users=deleted_count,
+            new_today=stats['new_today'],
+            new_week=stats['new_week'],
+            new_month=stats['new_month'],
+            users_with_subscription=users_with_subscription,
+            users_with_active_subscription=users_with_active,
+            users_with_trial=users_with_trial,
+            users_with_expired_subscription=users_with_expired,
+            total_balance_kopeks=total_balance,
+            total_balance_rubles=total_balance / 100,
+            avg_balance_kopeks=avg_balance,
+            active_today=active_today,
+            active_week=active_week,
+            active_month=active_month,
+        )
     )
+    _stats_cache[_STATS_CACHE_KEY] = response.body
+    return response
 
 
 # === User Detail ===
@@ -681,96 +892,80 @@ async def get_user_detail(
             status_code=status.HTTP_404_NOT_FOUND,
             detail='User not found',
         )
+    return json_response(await _build_user_detail(db, user))
 
-    # Get spending stats
-    spending_stats = await get_users_spending_stats(db, [user.id])
-    user_stats = spending_stats.get(user.id, {'total_spent': 0, 'purchase_count': 0})
 
-    # Build subscription info (all subscriptions + legacy single)
+async def _build_user_detail(db: AsyncSession, user: User) -> UserDetailResponse:
+    """Build UserDetailResponse for a user loaded with its relationships."""
+    # Referral counters in one round-trip; total referral earnings come from
+    # their canonical source, ReferralEarning
+    referral_counters_q = select(
+        select(func.count(User.id)).where(User.referred_by_id == user.id).scalar_subquery().label('referrals_count'),
+        select(func.coalesce(func.sum(ReferralEarning.amount_kopeks), 0))
+        .where(ReferralEarning.user_id == user.id)
+        .scalar_subquery()
+        .label('earnings'),
+    )
+    transactions_q = (
+        select(Transaction).where(Transaction.user_id == user.id).order_by(Transaction.created_at.desc()).limit(20)
+    )
+
+    # Build subscription info (all subscriptions + legacy single) on the request
+    # session while the independent reads run on sessions of their own
     subs = getattr(user, 'subscriptions', None) or []
-    all_subscriptions_info = []
-    for sub in subs:
-        all_subscriptions_info.append(await _build_subscription_info_async(db, sub))
+    (
+        spending_stats,
+        referral_counters,
+        transactions,
+        campaign_reg,
+        all_subscriptions_info,
+    ) = await asyncio.gather(
+        in_own_session(get_users_spending_stats, [user.id]),
+        in_own_session(_fetch_one_or_none, referral_counters_q),
+        in_own_session(_fetch_scalars, transactions_q),
+        in_own_session(get_campaign_registration_by_user, user.id),
+        _build_subscriptions_info(db, subs),
+    )
+    user_stats = spending_stats.get(user.id) or _EMPTY_STATS
 
     # Legacy: pick first active or most recent for backward compat
     subscription_info = None
     primary_sub = next((s for s in subs if s.is_active), subs[0] if subs else None)
     if primary_sub:
-        subscription_info = await _build_subscription_info_async(db, primary_sub)
+        subscription_info = all_subscriptions_info[subs.index(primary_sub)]
 
     # Build promo group info
     promo_group_info = None
     if user.promo_group:
-        promo_group_info = UserPromoGroupInfo(
+        promo_group_info = UserPromoGroupInfo.model_construct(
             id=user.promo_group.id,
             name=user.promo_group.name,
             is_default=user.promo_group.is_default,
         )
 
-    # Get referrals count
-    referrals = await get_referrals(db, user.id)
-    referrals_count = len(referrals)
-
-    # Calculate total referral earnings (canonical source: ReferralEarning)
-    referral_earnings_q = select(func.coalesce(func.sum(ReferralEarning.amount_kopeks), 0)).where(
-        ReferralEarning.user_id == user.id
-    )
-    referral_earnings = (await db.execute(referral_earnings_q)).scalar() or 0
+    # Referrer is eager-loaded together with the user
+    referrer = user.referrer if user.referred_by_id else None
+    referred_by_username = (referrer.username or referrer.full_name) if referrer else None
 
-    # Get referrer info
-    referred_by_username = None
-    if user.referred_by_id:
-        referrer_q = select(User).where(User.id == user.referred_by_id)
-        referrer_result = await db.execute(referrer_q)
-        referrer = referrer_result.scalar_one_or_none()
-        if referrer:
-            referred_by_username = referrer.username or referrer.full_name
-
-    referral_info = UserReferralInfo(
+    referral_info = UserReferralInfo.model_construct(
         referral_code=user.referral_code or '',
-        referrals_count=referrals_count,
-        total_earnings_kopeks=referral_earnings,
+        referrals_count=referral_counters.referrals_count or 0,
+        total_earnings_kopeks=referral_counters.earnings or 0,
         commission_percent=user.referral_commission_percent,
         referred_by_id=user.referred_by_id,
         referred_by_username=referred_by_username,
     )
 
-    # Get recent transactions
-    transactions_q = (
-        select(Transaction).where(Transaction.user_id == user.id).order_by(Transaction.created_at.desc()).limit(20)
-    )
-    transactions_result = await db.execute(transactions_q)
-    transactions = transactions_result.scalars().all()
-
-    _EXPENSE_TYPES = {
-        TransactionType.WITHDRAWAL.value,
-        TransactionType.SUBSCRIPTION_PAYMENT.value,
-        TransactionType.GIFT_PAYMENT.value,
-    }
-
-    recent_transactions = [
-        UserTransactionItem(
-            id=t.id,
-            type=t.type,
-            amount_kopeks=-abs(t.amount_kopeks) if t.type in _EXPENSE_TYPES else t.amount_kopeks,
-            amount_rubles=-abs(t.amount_kopeks) / 100 if t.type in _EXPENSE_TYPES else t.amount_kopeks / 100,
-            description=t.description,
-            payment_method=t.payment_method,
-            is_completed=t.is_completed,
-            created_at=t.created_at,
-        )
-        for t in transactions
-    ]
+    recent_transactions = [_build_transaction_item(t) for t in transactions]
 
     # Get campaign info
     campaign_name = None
     campaign_id = None
-    campaign_reg = await get_campaign_registration_by_user(db, user.id)
     if campaign_reg and campaign_reg.campaign:
         campaign_name = campaign_reg.campaign.name
         campaign_id = campaign_reg.campaign.id
 
-    return UserDetailResponse(
+    return UserDetailResponse.model_construct(
         id=user.id,
         telegram_id=user.telegram_id,
         username=user.username,
@@ -791,8 +986,8 @@ async def get_user_detail(
         subscriptions=all_subscriptions_info,
         promo_group=promo_group_info,
         referral=referral_info,
-        total_spent_kopeks=user_stats.get('total_spent', 0),
-        purchase_count=user_stats.get('purchase_count', 0),
+        total_spent_kopeks=user_stats['total_spent'],
+        purchase_count=user_stats['purchase_count'],
         used_promocodes=user.used_promocodes or 0,
         has_had_paid_subscription=user.has_had_paid_subscription,
         lifetime_used_traffic_bytes=user.lifetime_used_traffic_bytes or 0,
@@ -826,7 +1021,7 @@ async def get_user_by_telegram(
             status_code=status.HTTP_404_NOT_FOUND,
             detail='User not found',
         )
-    return await get_user_detail(user.id, admin, db)
+    return json_response(await _build_user_detail(db, user))
 
 
 # === Panel Info ===
@@ -848,8 +1043,6 @@ async def get_user_panel_info(
         )
 
     try:
-        from app.services.remnawave_service import RemnaWaveService
-
         service = RemnaWaveService()
         if not service.is_configured:
             return UserPanelInfoResponse(found=False)
@@ -859,8 +1052,6 @@ async def get_user_panel_info(
 
             # Multi-tariff: use per-subscription UUID
             if settings.is_multi_tariff_enabled() and subscription_id:
-                from app.database.crud.subscription import get_subscription_by_id_for_user
-
                 sub = await get_subscription_by_id_for_user(db, subscription_id, user_id)
                 if sub and sub.remnawave_uuid:
                     panel_user = await api.get_user_by_uuid(sub.remnawave_uuid)
@@ -928,16 +1119,12 @@ async def get_subscription_request_history(
     limit: int = Query(20, ge=1, le=100),
 ):
     """Get subscription request history from RemnaWave panel."""
-    from app.database.crud.user import get_user_by_id
-
     user = await get_user_by_id(db, user_id)
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='User not found')
 
     panel_uuid = None
     if settings.is_multi_tariff_enabled() and subscription_id:
-        from app.database.crud.subscription import get_subscription_by_id_for_user
-
         sub = await get_subscription_by_id_for_user(db, subscription_id, user_id)
         if sub:
             panel_uuid = sub.remnawave_uuid
@@ -948,8 +1135,6 @@ async def get_subscription_request_history(
         return {'total': 0, 'records': []}
 
     try:
-        from app.services.remnawave_service import RemnaWaveService
-
         service = RemnaWaveService()
         if not service.is_configured:
             return {'total': 0, 'records': []}
@@ -980,8 +1165,6 @@ async def get_user_node_usage(
     # Resolve panel UUID
     _panel_uuid = None
     if settings.is_multi_tariff_enabled() and subscription_id:
-        from app.database.crud.subscription import get_subscription_by_id_for_user
-
         sub = await get_subscription_by_id_for_user(db, subscription_id, user_id)
         if sub:
             _panel_uuid = sub.remnawave_uuid
@@ -992,8 +1175,6 @@ async def get_user_node_usage(
         return UserNodeUsageResponse(items=[])
 
     try:
-        from app.services.remnawave_service import RemnaWaveService
-
         service = RemnaWaveService()
         if not service.is_configured:
             return UserNodeUsageResponse(items=[])
@@ -1191,8 +1372,6 @@ async def update_user_subscription(
 
         # Проверка: нельзя создать вторую активную подписку с тем же тарифом
         if is_multi_tariff and request.tariff_id:
-            from app.database.crud.subscription import get_subscription_by_user_and_tariff
-
             existing = await get_subscription_by_user_and_tariff(db, user.id, request.tariff_id)
             if existing:
                 raise HTTPException(
@@ -1200,8 +1379,6 @@ async def update_user_subscription(
                     detail='User already has an active subscription for this tariff. Extend it instead.',
                 )
 
-        from app.database.crud.subscription import create_paid_subscription
-
         days = request.days or 30
         is_trial = request.is_trial or False
         traffic_limit = request.traffic_limit_gb or 100
@@ -1219,8 +1396,6 @@ async def update_user_subscription(
                 if tariff.allowed_squads:
                     connected_squads = tariff.allowed_squads
 
-        from sqlalchemy.exc import IntegrityError
-
         try:
             new_sub = await create_paid_subscription(
                 db=db,
@@ -1240,7 +1415,7 @@ async def update_user_subscription(
             )
 
         # Sync to Remnawave panel
-        await _sync_subscription_to_panel(db, user, new_sub)
+        _schedule_panel_sync(user.id, new_sub.id)
 
         logger.info('Admin created subscription for user', admin_id=admin.id, user_id=user_id)
 
@@ -1264,10 +1439,9 @@ async def update_user_subscription(
             )
 
         await extend_subscription(db, subscription, request.days)
-        await db.refresh(subscription)
 
         # Sync to Remnawave panel
-        await _sync_subscription_to_panel(db, user, subscription)
+        _schedule_panel_sync(user.id, subscription.id)
 
         logger.info(
             'Admin extended subscription for user by days', admin_id=admin.id, user_id=user_id, days=request.days
@@ -1288,16 +1462,14 @@ async def update_user_subscription(
 
         # Сокращение через отрицательный аргумент: extend_subscription(-N) уменьшает end_date
         await extend_subscription(db, subscription, -request.days)
-        await db.refresh(subscription)
 
         # Check if subscription expired after shortening
         if subscription.end_date <= datetime.now(UTC):
             subscription.status = SubscriptionStatus.EXPIRED.value
             await db.commit()
-            await db.refresh(subscription)
 
         # Sync to Remnawave panel
-        await _sync_subscription_to_panel(db, user, subscription)
+        _schedule_panel_sync(user.id, subscription.id)
 
         logger.info(
             'Admin shortened subscription for user by days', admin_id=admin.id, user_id=user_id, days=request.days
@@ -1323,10 +1495,9 @@ async def update_user_subscription(
             subscription.status = SubscriptionStatus.EXPIRED.value
 
         await db.commit()
-        await db.refresh(subscription)
 
         # Sync to Remnawave panel
-        await _sync_subscription_to_panel(db, user, subscription)
+        _schedule_panel_sync(user.id, subscription.id)
 
         logger.info('Admin set end_date for user subscription', admin_id=admin.id, user_id=user_id)
 
@@ -1353,8 +1524,6 @@ async def update_user_subscription(
         # Проверка: нельзя сменить тариф, если у пользователя уже есть
         # другая активная подписка с целевым тарифом
         if is_multi_tariff and request.tariff_id != subscription.tariff_id:
-            from app.database.crud.subscription import get_subscription_by_user_and_tariff
-
             existing = await get_subscription_by_user_and_tariff(db, user.id, request.tariff_id)
             if existing and existing.id != subscription.id:
                 raise HTTPException(
@@ -1363,8 +1532,6 @@ async def update_user_subscription(
                 )
 
         # Preserve extra purchased devices above the old tariff's base limit
-        from app.database.crud.subscription import calc_device_limit_on_tariff_switch
-
         old_tariff = await get_tariff_by_id(db, subscription.tariff_id) if subscription.tariff_id else None
 
         subscription.tariff_id = request.tariff_id
@@ -1387,9 +1554,7 @@ async def update_user_subscription(
         # A trial stays a trial across a tariff change and expires normally.
 
         # Сбрасываем докупленный трафик при смене тарифа
-        from sqlalchemy import delete as sql_delete
-
-        await db.execute(sql_delete(TrafficPurchase).where(TrafficPurchase.subscription_id == subscription.id))
+        await db.execute(sa_delete(TrafficPurchase).where(TrafficPurchase.subscription_id == subscription.id))
         subscription.purchased_traffic_gb = 0
         subscription.traffic_reset_at = None
 
@@ -1397,8 +1562,6 @@ async def update_user_subscription(
             subscription.traffic_used_gb = 0.0
 
         # Записываем транзакцию о смене тарифа
-        from app.database.crud.transaction import create_transaction
-
         await create_transaction(
             db=db,
             user_id=user.id,
@@ -1409,19 +1572,14 @@ async def update_user_subscription(
         )
 
         await db.commit()
-        await db.refresh(subscription)
 
         # Синхронизируем с RemnaWave (discovery/create + сброс трафика по админ-настройке)
-        try:
-            await _sync_subscription_to_panel(
-                db,
-                user,
-                subscription,
-                reset_traffic=settings.RESET_TRAFFIC_ON_TARIFF_SWITCH,
-                reset_traffic_reason='смена тарифа (cabinet admin)',
-            )
-        except Exception as e:
-            logger.error('Failed to sync tariff switch with RemnaWave', error=e)
+        _schedule_panel_sync(
+            user.id,
+            subscription.id,
+            reset_traffic=settings.RESET_TRAFFIC_ON_TARIFF_SWITCH,
+            reset_traffic_reason='смена тарифа (cabinet admin)',
+        )
 
         logger.info('Admin changed tariff for user to', admin_id=admin.id, user_id=user_id, tariff_name=tariff.name)
 
@@ -1439,10 +1597,9 @@ async def update_user_subscription(
             subscription.traffic_used_gb = request.traffic_used_gb
 
         await db.commit()
-        await db.refresh(subscription)
 
         # Sync to Remnawave panel
-        await _sync_subscription_to_panel(db, user, subscription)
+        _schedule_panel_sync(user.id, subscription.id)
 
         logger.info('Admin updated traffic for user', admin_id=admin.id, user_id=user_id)
 
@@ -1461,7 +1618,6 @@ async def update_user_subscription(
 
         subscription.autopay_enabled = request.autopay_enabled
         await db.commit()
-        await db.refresh(subscription)
 
         state = 'enabled' if request.autopay_enabled else 'disabled'
         logger.info('Admin autopay for user', admin_id=admin.id, state=state, user_id=user_id)
@@ -1479,10 +1635,9 @@ async def update_user_subscription(
         if subscription.tariff and getattr(subscription.tariff, 'is_daily', False):
             subscription.is_daily_paused = True
         await db.commit()
-        await db.refresh(subscription)
 
         # Sync to Remnawave panel
-        await _sync_subscription_to_panel(db, user, subscription)
+        _schedule_panel_sync(user.id, subscription.id)
 
         logger.info('Admin cancelled subscription for user', admin_id=admin.id, user_id=user_id)
 
@@ -1497,8 +1652,6 @@ async def update_user_subscription(
         # наспамленные дни, обнулить трафик/сквады, пометить DISABLED и ОТКЛЮЧИТЬ в
         # панели RemnaWave (не удаляя). Пользователь и его тикеты сохраняются —
         # дальше юзер сам покупает тариф с нуля и выбирает срок.
-        from app.services.subscription_service import reset_subscription_with_panel
-
         result = await reset_subscription_with_panel(db, user, subscription)
 
         logger.info(
@@ -1519,8 +1672,6 @@ async def update_user_subscription(
         # Проверка: нельзя активировать, если у пользователя уже есть
         # другая активная подписка с тем же тарифом
         if is_multi_tariff and subscription.tariff_id:
-            from app.database.crud.subscription import get_subscription_by_user_and_tariff
-
             existing = await get_subscription_by_user_and_tariff(db, user.id, subscription.tariff_id)
             if existing and existing.id != subscription.id:
                 raise HTTPException(
@@ -1529,14 +1680,14 @@ async def update_user_subscription(
                 )
 
         subscription.status = SubscriptionStatus.ACTIVE.value
-        if subscription.end_date and subscription.end_date <= datetime.now(UTC):
+        now = datetime.now(UTC)
+        if subscription.end_date and subscription.end_date <= now:
             # Extend by 30 days if expired
-            subscription.end_date = datetime.now(UTC) + timedelta(days=30)
+            subscription.end_date = now + timedelta(days=30)
         await db.commit()
-        await db.refresh(subscription)
 
         # Sync to Remnawave panel
-        await _sync_subscription_to_panel(db, user, subscription)
+        _schedule_panel_sync(user.id, subscription.id)
 
         logger.info('Admin activated subscription for user', admin_id=admin.id, user_id=user_id)
 
@@ -1553,27 +1704,13 @@ async def update_user_subscription(
                 detail='traffic_gb parameter is required for add_traffic action',
             )
 
-        from app.database.crud.subscription import add_subscription_traffic, reactivate_subscription
-
         await add_subscription_traffic(db, subscription, request.traffic_gb)
 
         # Реактивируем подписку если она была DISABLED/EXPIRED (например, после LIMITED/EXPIRED в RemnaWave)
         await reactivate_subscription(db, subscription)
 
-        await db.refresh(subscription)
-
-        # Sync to Remnawave panel
-        await _sync_subscription_to_panel(db, user, subscription)
-
-        # Явно включаем пользователя на панели (PATCH может не снять LIMITED-статус)
-        _enable_uuid = (
-            subscription.remnawave_uuid if settings.is_multi_tariff_enabled() else getattr(user, 'remnawave_uuid', None)
-        )
-        if _enable_uuid and subscription.status == 'active':
-            from app.services.subscription_service import SubscriptionService
-
-            subscription_service = SubscriptionService()
-            await subscription_service.enable_remnawave_user(_enable_uuid)
+        # Sync to Remnawave panel, then explicitly enable the panel user
+        _schedule_panel_sync(user.id, subscription.id, enable_after_sync=True)
 
         logger.info('Admin added traffic for user', admin_id=admin.id, traffic_gb=request.traffic_gb, user_id=user_id)
 
@@ -1629,10 +1766,9 @@ async def update_user_subscription(
             subscription.traffic_reset_at = None
 
         await db.commit()
-        await db.refresh(subscription)
 
         # Sync to Remnawave panel
-        await _sync_subscription_to_panel(db, user, subscription)
+        _schedule_panel_sync(user.id, subscription.id)
 
         logger.info(
             'Admin removed traffic purchase ( GB) for user',
@@ -1657,10 +1793,9 @@ async def update_user_subscription(
 
         subscription.device_limit = request.device_limit
         await db.commit()
-        await db.refresh(subscription)
 
         # Sync to Remnawave panel
-        await _sync_subscription_to_panel(db, user, subscription)
+        _schedule_panel_sync(user.id, subscription.id)
 
         logger.info(
             'Admin set device limit to for user', admin_id=admin.id, device_limit=request.device_limit, user_id=user_id
@@ -1681,6 +1816,19 @@ async def update_user_subscription(
 # === Available Tariffs ===
 
 
+@lru_cache(maxsize=512)
+def _period_prices_info(period_prices: tuple[tuple[str, int], ...]) -> tuple[PeriodPriceInfo, ...]:
+    """Period prices of a tariff, sorted by days.
+
+    Keyed by the tariff's (days, price) pairs, so an edited tariff just gets a new
+    entry. The models are shared between responses and must not be mutated.
+    """
+    return tuple(
+        PeriodPriceInfo(days=int(days), price_kopeks=price_kopeks, price_rubles=price_kopeks / 100)
+        for days, price_kopeks in sorted(period_prices, key=lambda item: int(item[0]))
+    )
+
+
 @router.get('/{user_id}/available-tariffs', response_model=UserAvailableTariffsResponse)
 async def get_user_available_tariffs(
     user_id: int,
@@ -1694,17 +1842,15 @@ async def get_user_available_tariffs(
     Takes into account user's promo group to determine which tariffs are accessible.
     Shows all tariffs with availability flag.
     """
-    user = await get_user_by_id(db, user_id)
+    user = await get_user_with_subscriptions(db, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail='User not found',
         )
 
-    # Get all tariffs
-    from app.database.crud.tariff import get_all_tariffs
-
-    tariffs = await get_all_tariffs(db, include_inactive=include_inactive)
+    # Get all tariffs, ordered by display_order, then tier_level in SQL
+    tariffs = await get_all_tariffs(db, include_inactive=include_inactive, order_by_tier_level=True)
 
     # Get current subscription tariff
     current_tariff_id = None
@@ -1724,17 +1870,7 @@ async def get_user_available_tariffs(
         requires_promo_group = bool(tariff.allowed_promo_groups)
 
         # Build period prices
-        period_prices = []
-        if tariff.period_prices:
-            for days_str, price_kopeks in sorted(tariff.period_prices.items(), key=lambda x: int(x[0])):
-                days = int(days_str)
-                period_prices.append(
-                    PeriodPriceInfo(
-                        days=days,
-                        price_kopeks=price_kopeks,
-                        price_rubles=price_kopeks / 100,
-                    )
-                )
+        period_prices = list(_period_prices_info(tuple(tariff.period_prices.items()))) if tariff.period_prices else []
 
         tariff_items.append(
             UserAvailableTariffItem(
@@ -1764,9 +1900,6 @@ async def get_user_available_tariffs(
             )
         )
 
-    # Sort by display_order, then by tier_level
-    tariff_items.sort(key=lambda t: (t.display_order, t.tier_level))
-
     return UserAvailableTariffsResponse(
         user_id=user.id,
         promo_group_id=user.promo_group_id,
@@ -1789,14 +1922,17 @@ async def update_user_status(
     db: AsyncSession = Depends(get_cabinet_db),
 ):
     """Update user status (active, blocked, deleted)."""
-    user = await get_user_by_id(db, user_id)
-    if not user:
+    # Only the status column is needed: no-op requests stop here, and the write below
+    # never loads the user with its subscriptions and promo groups.
+    old_status = None
+    if POSTGRES_INT4_MIN <= user_id <= POSTGRES_INT4_MAX:
+        old_status = (await db.execute(select(User.status).where(User.id == user_id))).scalar_one_or_none()
+    if old_status is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail='User not found',
         )
 
-    old_status = user.status
     new_status = request.status.value
 
     if old_status == new_status:
@@ -1807,10 +1943,10 @@ async def update_user_status(
             message='Status unchanged',
         )
 
-    user.status = new_status
-    user.updated_at = datetime.now(UTC)
+    await db.execute(sa_update(User).where(User.id == user_id).values(status=new_status, updated_at=datetime.now(UTC)))
     await db.commit()
-    await db.refresh(user)
+    # A bulk UPDATE skips the User.status set-event, so drop the cached auth state by hand
+    invalidate_cached_user(user_id)
 
     action = f'{old_status} -> {new_status}'
     if request.reason:
@@ -1834,8 +1970,6 @@ async def block_user(
     db: AsyncSession = Depends(get_cabinet_db),
 ):
     """Block a user — sets DB status AND disables panel user in RemnaWave."""
-    from app.services.user_service import UserService
-
     user_service = UserService()
     success = await user_service.block_user(
         db,
@@ -1861,8 +1995,6 @@ async def unblock_user(
     db: AsyncSession = Depends(get_cabinet_db),
 ):
     """Unblock a user — sets DB status AND re-enables panel user in RemnaWave."""
-    from app.services.user_service import UserService
-
     user_service = UserService()
     success = await user_service.unblock_user(db, user_id, admin.id)
     if not success:
@@ -1935,27 +2067,34 @@ async def update_user_promo_group(
     db: AsyncSession = Depends(get_cabinet_db),
 ):
     """Update user promo group."""
-    user = await get_user_by_id(db, user_id)
-    if not user:
+    new_promo_group_id = request.promo_group_id
+
+    # One round trip for the bare user row and the requested group's name (NULL when
+    # the group does not exist). No relationships are needed here, and the loaded user
+    # is what sync_user_primary_promo_group later picks up from the identity map.
+    # The group lookup rides along with the user row, so caching groups would save nothing.
+    promo_group_name_q = (
+        select(PromoGroup.name).where(PromoGroup.id == new_promo_group_id).scalar_subquery()
+        if new_promo_group_id is not None
+        else literal(None)
+    )
+    row = (
+        await db.execute(select(User, promo_group_name_q.label('promo_group_name')).where(User.id == user_id))
+    ).one_or_none()
+    if not row:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail='User not found',
         )
 
+    user, promo_group_name = row
     old_promo_group_id = user.promo_group_id
-    new_promo_group_id = request.promo_group_id
-    promo_group_name = None
 
-    if new_promo_group_id is not None:
-        # Verify promo group exists
-        result = await db.execute(select(PromoGroup).where(PromoGroup.id == new_promo_group_id))
-        promo_group = result.scalar_one_or_none()
-        if not promo_group:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail='Promo group not found',
-            )
-        promo_group_name = promo_group.name
+    if new_promo_group_id is not None and promo_group_name is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail='Promo group not found',
+        )
 
     # Update M2M table (authoritative source) — not just the legacy FK column.
     # Without this, sync_user_primary_promo_group overwrites the admin change
@@ -1974,7 +2113,6 @@ async def update_user_promo_group(
     await db.flush()
     await sync_user_primary_promo_group(db, user_id)
     await db.commit()
-    await db.refresh(user)
 
     logger.info(
         'Admin changed promo group for user',
@@ -2270,8 +2408,6 @@ async def get_user_devices(
     # Resolve panel UUID
     _dev_uuid = None
     if settings.is_multi_tariff_enabled() and subscription_id:
-        from app.database.crud.subscription import get_subscription_by_id_for_user
-
         sub = await get_subscription_by_id_for_user(db, subscription_id, user_id)
         if sub:
             _dev_uuid = sub.remnawave_uuid
@@ -2282,8 +2418,6 @@ async def get_user_devices(
         return UserDevicesResponse()
 
     try:
-        from app.services.remnawave_service import RemnaWaveService
-
         service = RemnaWaveService()
         if not service.is_configured:
             return UserDevicesResponse()
@@ -2351,8 +2485,6 @@ async def delete_user_device(
 
     _uuid = None
     if settings.is_multi_tariff_enabled() and subscription_id:
-        from app.database.crud.subscription import get_subscription_by_id_for_user
-
         sub = await get_subscription_by_id_for_user(db, subscription_id, user_id)
         if sub:
             _uuid = sub.remnawave_uuid
@@ -2363,8 +2495,6 @@ async def delete_user_device(
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='User has no panel account')
 
     try:
-        from app.services.remnawave_service import RemnaWaveService
-
         service = RemnaWaveService()
         async with service.get_api_client() as api:
             success = await api.remove_device(_uuid, hwid)
@@ -2440,8 +2570,6 @@ async def reset_user_devices(
 
     _rst_uuid = None
     if settings.is_multi_tariff_enabled() and subscription_id:
-        from app.database.crud.subscription import get_subscription_by_id_for_user
-
         sub = await get_subscription_by_id_for_user(db, subscription_id, user_id)
         if sub:
             _rst_uuid = sub.remnawave_uuid
@@ -2452,8 +2580,6 @@ async def reset_user_devices(
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='User has no panel account')
 
     try:
-        from app.services.remnawave_service import RemnaWaveService
-
         service = RemnaWaveService()
         async with service.get_api_client() as api:
             devices_info = await api.get_user_devices_all(_rst_uuid)
@@ -2495,22 +2621,48 @@ async def delete_user(
     Delete a user.
 
     - **soft_delete=True**: Mark user as deleted (default)
-    - **soft_delete=False**: Permanently delete from database
+    - **soft_delete=False**: Permanently delete from database. Runs a single
+      ``DELETE FROM users``, so dependent rows follow the FK ``ondelete`` rules:
+      CASCADE foreign keys remove the user's subscriptions, transactions,
+      referral earnings and the like, and the panel is not touched. Rows whose
+      FK has no ``ondelete`` (e.g. saved payment methods) block the delete with
+      409. Use ``DELETE /{user_id}/full`` to clean up the panel and all related
+      records as well.
     """
-    user = await get_user_by_id(db, user_id)
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail='User not found',
-        )
-
     if request.soft_delete:
+        user = await get_user_by_id(db, user_id)
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail='User not found',
+            )
         await soft_delete_user(db, user)
         action = 'soft deleted'
     else:
-        # Hard delete
-        await db.delete(user)
-        await db.commit()
+        # Hard delete as a single statement: dependent rows follow the FK ondelete rules
+        # in the database instead of being loaded and detached by the ORM first.
+        deleted = 0
+        try:
+            if POSTGRES_INT4_MIN <= user_id <= POSTGRES_INT4_MAX:
+                result = await db.execute(sa_delete(User).where(User.id == user_id))
+                deleted = result.rowcount
+            if deleted:
+                await db.commit()
+        except IntegrityError as exc:
+            await db.rollback()
+            logger.warning('Hard delete blocked by related records', user_id=user_id, error=str(exc.orig))
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=(
+                    'User has related records (e.g. saved payment methods) that prevent a permanent delete; '
+                    'use full deletion instead'
+                ),
+            ) from exc
+        if not deleted:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail='User not found',
+            )
         action = 'permanently deleted'
 
     reason_text = f' (reason: {request.reason})' if request.reason else ''
@@ -2537,8 +2689,6 @@ async def full_delete_user(
     - Removing all related records (payments, transactions, etc.)
     - Removing user from database
     """
-    from app.services.user_service import UserService
-
     user = await get_user_by_id(db, user_id)
     if not user:
         raise HTTPException(
@@ -2601,8 +2751,6 @@ async def reset_user_trial(
     # Delete subscriptions if any exist
     subs = getattr(user, 'subscriptions', None) or []
     if subs:
-        from app.database.crud.subscription import is_active_paid_subscription
-
         # In multi-tariff: only delete trial subscriptions, keep paid ones
         trial_subs = [s for s in subs if s.is_trial]
         non_trial_subs = [s for s in subs if not s.is_trial]
@@ -2623,8 +2771,6 @@ async def reset_user_trial(
                 # Снос триала — общий код с ботовым bulk-сбросом: удаляет панель-юзера
                 # ПЕРВЫМ (race-safe относительно синк-воскрешения), затем строки в БД и
                 # чистит устаревший single-tariff remnawave_uuid.
-                from app.database.crud.subscription import wipe_trial_subscriptions
-
                 wiped = await wipe_trial_subscriptions(db, subs_to_delete)
                 subscription_deleted = wiped > 0
 
@@ -2681,16 +2827,9 @@ async def reset_user_subscription(
     # Deactivate in Remnawave panel if requested
     if request.deactivate_in_panel:
         try:
-            from app.services.subscription_service import SubscriptionService
-
             subscription_service = SubscriptionService()
             if settings.is_multi_tariff_enabled():
-                for sub in subs:
-                    if sub.remnawave_uuid:
-                        try:
-                            await subscription_service.disable_remnawave_user(sub.remnawave_uuid)
-                        except Exception:
-                            pass
+                await _disable_panel_users(subscription_service, [sub.remnawave_uuid for sub in subs])
                 panel_deactivated = True
             elif user.remnawave_uuid:
                 panel_deactivated = await subscription_service.disable_remnawave_user(user.remnawave_uuid)
@@ -2700,12 +2839,12 @@ async def reset_user_subscription(
             panel_error = 'Ошибка обработки пользователя в Remnawave'
             logger.warning('Failed to disable Remnawave user during subscription reset', error=e)
 
-    # Delete all subscriptions from database
-    from sqlalchemy import delete
-
-    for sub in subs:
-        await db.execute(delete(SubscriptionServer).where(SubscriptionServer.subscription_id == sub.id))
-    await db.execute(delete(Subscription).where(Subscription.user_id == user_id))
+    # Delete all subscriptions from database: one statement for the server links of
+    # every subscription, one for the subscriptions themselves
+    await db.execute(
+        sa_delete(SubscriptionServer).where(SubscriptionServer.subscription_id.in_([sub.id for sub in subs]))
+    )
+    await db.execute(sa_delete(Subscription).where(Subscription.user_id == user_id))
     subscription_deleted = True
 
     user.updated_at = datetime.now(UTC)
@@ -2750,8 +2889,6 @@ async def disable_user(
     panel_error: str | None = None
 
     # Deactivate subscriptions in panel (skip if active paid subscription)
-    from app.database.crud.subscription import deactivate_subscription, is_active_paid_subscription
-
     subs = getattr(user, 'subscriptions', None) or []
     has_active_paid = any(is_active_paid_subscription(s) for s in subs)
 
@@ -2763,16 +2900,9 @@ async def disable_user(
         )
     else:
         try:
-            from app.services.subscription_service import SubscriptionService
-
             subscription_service = SubscriptionService()
             if settings.is_multi_tariff_enabled():
-                for sub in subs:
-                    if sub.remnawave_uuid:
-                        try:
-                            await subscription_service.disable_remnawave_user(sub.remnawave_uuid)
-                        except Exception:
-                            pass
+                await _disable_panel_users(subscription_service, [sub.remnawave_uuid for sub in subs])
                 panel_deactivated = True
             elif user.remnawave_uuid:
                 panel_deactivated = await subscription_service.disable_remnawave_user(user.remnawave_uuid)
@@ -2825,24 +2955,31 @@ async def get_user_referrals(
     db: AsyncSession = Depends(get_cabinet_db),
 ):
     """Get list of users referred by this user."""
-    user = await get_user_by_id(db, user_id)
-    if not user:
+    # Only the referrer's existence matters here, not its subscriptions and promo groups
+    user_exists = None
+    if POSTGRES_INT4_MIN <= user_id <= POSTGRES_INT4_MAX:
+        user_exists = (await db.execute(select(User.id).where(User.id == user_id))).scalar_one_or_none()
+    if not user_exists:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail='User not found',
         )
 
-    referrals = await get_referrals(db, user.id)
-
-    # Apply pagination manually
-    total = len(referrals)
-    referrals = referrals[offset : offset + limit]
+    # The page is bounded by `limit` and fully buffered on purpose: the spending stats
+    # below need every id on it before any item is built, so streaming rows buys nothing.
+    referrals = await get_referrals_page(db, user_id, offset, limit)
+    # A full page may not be the last one; otherwise the total follows from it
+    if len(referrals) == limit or (not referrals and offset):
+        total = await count_referrals(db, user_id)
+    else:
+        total = offset + len(referrals)
 
     # Get spending stats
     user_ids = [r.id for r in referrals]
     spending_stats = await get_users_spending_stats(db, user_ids) if user_ids else {}
 
-    items = [_build_user_list_item(r, spending_stats) for r in referrals]
+    now = datetime.now(UTC)
+    items = [_build_user_list_item(r, spending_stats, now) for r in referrals]
 
     return UsersListResponse(
         users=items,
@@ -2872,45 +3009,35 @@ async def get_user_transactions(
             detail='User not found',
         )
 
-    query = select(Transaction).where(Transaction.user_id == user.id)
-
+    conditions = [Transaction.user_id == user.id]
     if transaction_type:
-        query = query.where(Transaction.type == transaction_type)
+        conditions.append(Transaction.type == transaction_type)
 
-    # Get total count
-    count_query = select(func.count(Transaction.id)).where(Transaction.user_id == user.id)
-    if transaction_type:
-        count_query = count_query.where(Transaction.type == transaction_type)
-    total = (await db.execute(count_query)).scalar() or 0
-
-    # Get transactions
-    query = query.order_by(Transaction.created_at.desc()).offset(offset).limit(limit)
-    result = await db.execute(query)
-    transactions = result.scalars().all()
-
-    _EXPENSE_TYPES = {
-        TransactionType.WITHDRAWAL.value,
-        TransactionType.SUBSCRIPTION_PAYMENT.value,
-        TransactionType.GIFT_PAYMENT.value,
-    }
+    # Page rows and the total in one round-trip; the window count is evaluated
+    # before LIMIT/OFFSET, so every row carries the full count.
+    result = await db.execute(
+        select(Transaction, func.count().over().label('total'))
+        .where(*conditions)
+        .order_by(Transaction.created_at.desc())
+        .offset(offset)
+        .limit(limit)
+    )
+    rows = result.all()
+    transactions = [row[0] for row in rows]
+
+    if rows:
+        total = rows[0].total
+    elif offset:
+        # Past the last page there is no row to carry the window count.
+        total = await db.scalar(select(func.count(Transaction.id)).where(*conditions)) or 0
+    else:
+        total = 0
 
-    items = [
-        UserTransactionItem(
-            id=t.id,
-            type=t.type,
-            amount_kopeks=-abs(t.amount_kopeks) if t.type in _EXPENSE_TYPES else t.amount_kopeks,
-            amount_rubles=-abs(t.amount_kopeks) / 100 if t.type in _EXPENSE_TYPES else t.amount_kopeks / 100,
-            description=t.description,
-            payment_method=t.payment_method,
-            is_completed=t.is_completed,
-            created_at=t.created_at,
-        )
-        for t in transactions
-    ]
+    items = [_build_transaction_item(t) for t in transactions]
 
     return {
         'transactions': items,
-        'total': total,
+        'total': int(total),
         'offset': offset,
         'limit': limit,
     }
@@ -2918,6 +3045,47 @@ async def get_user_transactions(
 
 # === Panel Sync ===
 
+# Subscription fields whose new value is masked in the sync-from-panel change report
+_SECRET_SYNC_FIELDS = frozenset({'subscription_crypto_link'})
+
+
+def _end_date_diff_seconds(bot_end: datetime, panel_expire: datetime) -> float:
+    return abs((bot_end - panel_datetime_to_utc(panel_expire)).total_seconds())
+
+
+def _end_dates_mismatch(bot_end: datetime, panel_expire: datetime) -> bool:
+    diff_seconds = _end_date_diff_seconds(bot_end, panel_expire)
+    # Allow for timezone offset (3 hours = MSK) and small sync delays:
+    # a diff of ~3 hours (10800 sec) +/- 5 min is assumed to be a timezone issue
+    is_timezone_diff = abs(diff_seconds - 10800) < 300
+    return diff_seconds > 3600 and not is_timezone_diff
+
+
+# Bot-vs-panel sync checks as (mismatches, describe) pairs, in report order. Each pair is
+# applied to the matching (bot, panel) values; describe only runs for actual mismatches.
+_SYNC_CHECKS: tuple[tuple[Callable[[Any, Any], bool], Callable[[Any, Any], str]], ...] = (
+    (
+        lambda bot, panel: (bot in ('active', 'trial')) != (panel.upper() == 'ACTIVE'),
+        lambda bot, panel: f'Status: bot={bot}, panel={panel}',
+    ),
+    (
+        _end_dates_mismatch,
+        lambda bot, panel: f'End date differs by {_end_date_diff_seconds(bot, panel) / 3600:.1f} hours',
+    ),
+    (
+        lambda bot, panel: abs(bot - panel) > 1,
+        lambda bot, panel: f'Traffic limit: bot={bot}GB, panel={panel:.1f}GB',
+    ),
+    (
+        lambda bot, panel: abs(bot - panel) > 0.5,
+        lambda bot, panel: f'Traffic used: bot={bot:.2f}GB, panel={panel:.2f}GB',
+    ),
+    (
+        lambda bot, panel: bot != panel,
+        lambda bot, panel: f'Device limit: bot={bot}, panel={panel}',
+    ),
+)
+
 
 @router.get('/{user_id}/sync/status', response_model=PanelSyncStatusResponse)
 async def get_user_sync_status(
@@ -2932,7 +3100,7 @@ async def get_user_sync_status(
     Shows differences between bot data and panel data.
     When subscription_id is provided, checks that specific subscription instead of first-active.
     """
-    user = await get_user_by_id(db, user_id)
+    user = await get_user_with_subscriptions(db, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -2983,103 +3151,72 @@ async def get_user_sync_status(
     differences = []
 
     try:
-        from app.services.remnawave_service import RemnaWaveService
-
         service = RemnaWaveService()
         if service.is_configured:
-            async with service.get_api_client() as api:
-                panel_user = None
-
-                # Try by UUID first (works for all users including OAuth)
-                if effective_uuid:
-                    panel_user = await api.get_user_by_uuid(effective_uuid)
-
-                # Fallback: search by telegram_id
-                if not panel_user and user.telegram_id:
-                    panel_users = await api.get_user_by_telegram_id(user.telegram_id)
-                    if panel_users:
-                        panel_user = panel_users[0]
-
-                # Fallback: search by email (OAuth users)
-                if not panel_user and user.email:
-                    panel_users_by_email = await api.get_user_by_email(user.email)
-                    if panel_users_by_email:
-                        panel_user = panel_users_by_email[0]
-
-                if panel_user:
-                    panel_found = True
-                    panel_status = panel_user.status.value if panel_user.status else None
-                    panel_expire_at = panel_user.expire_at
-                    panel_traffic_limit = (
-                        panel_user.traffic_limit_bytes / (1024**3) if panel_user.traffic_limit_bytes else 0
-                    )
-                    panel_traffic_used = (
-                        panel_user.used_traffic_bytes / (1024**3) if panel_user.used_traffic_bytes else 0
-                    )
-                    panel_device_limit = panel_user.hwid_device_limit or 0
-                    # Extract squad UUIDs from active_internal_squads
-                    panel_squads = [
-                        s.get('uuid', '') for s in (panel_user.active_internal_squads or []) if s.get('uuid')
-                    ]
-
-                    # Check differences
-                    if bot_sub_status and panel_status:
-                        bot_active = bot_sub_status in ('active', 'trial')
-                        panel_active = panel_status.upper() == 'ACTIVE'
-                        if bot_active != panel_active:
-                            differences.append(f'Status: bot={bot_sub_status}, panel={panel_status}')
-
-                    if bot_sub_end_date and panel_expire_at:
-                        bot_end_utc = bot_sub_end_date if bot_sub_end_date.tzinfo else bot_sub_end_date
-                        panel_end_utc = panel_datetime_to_utc(panel_expire_at)
-
-                        diff_seconds = abs((bot_end_utc - panel_end_utc).total_seconds())
-                        # Allow for timezone offset (3 hours = MSK) and small sync delays
-                        # If diff is ~3 hours (10800 sec) +/- 5 min, assume it's timezone issue
-                        is_timezone_diff = abs(diff_seconds - 10800) < 300  # 3 hours +/- 5 min
-                        if diff_seconds > 3600 and not is_timezone_diff:  # More than 1 hour and not timezone
-                            differences.append(f'End date differs by {diff_seconds / 3600:.1f} hours')
-
-                    if abs(bot_traffic_limit - panel_traffic_limit) > 1:
-                        differences.append(
-                            f'Traffic limit: bot={bot_traffic_limit}GB, panel={panel_traffic_limit:.1f}GB'
-                        )
+            # The lookups need the bot-side UUID, so they cannot overlap the user read;
+            # the shared client at least saves opening a new connection per status check.
+            api = await service.get_shared_api_client()
+            panel_user = None
 
-                    if abs(bot_traffic_used - panel_traffic_used) > 0.5:
-                        differences.append(
-                            f'Traffic used: bot={bot_traffic_used:.2f}GB, panel={panel_traffic_used:.2f}GB'
-                        )
+            # Try by UUID first (works for all users including OAuth)
+            if effective_uuid:
+                panel_user = await api.get_user_by_uuid(effective_uuid)
+
+            # Fallback: search by telegram_id
+            if not panel_user and user.telegram_id:
+                panel_users = await api.get_user_by_telegram_id(user.telegram_id)
+                if panel_users:
+                    panel_user = panel_users[0]
+
+            # Fallback: search by email (OAuth users)
+            if not panel_user and user.email:
+                panel_users_by_email = await api.get_user_by_email(user.email)
+                if panel_users_by_email:
+                    panel_user = panel_users_by_email[0]
 
-                    # Compare device limits
-                    if bot_device_limit != panel_device_limit:
-                        differences.append(f'Device limit: bot={bot_device_limit}, panel={panel_device_limit}')
-
-                    # Compare squads
-                    bot_squads_set = set(bot_squads) if bot_squads else set()
-                    panel_squads_set = set(panel_squads) if panel_squads else set()
-                    if bot_squads_set != panel_squads_set:
-                        only_in_bot = bot_squads_set - panel_squads_set
-                        only_in_panel = panel_squads_set - bot_squads_set
-                        squad_diff_parts = []
-                        if only_in_bot:
-                            squad_diff_parts.append(f'only in bot: {len(only_in_bot)}')
-                        if only_in_panel:
-                            squad_diff_parts.append(f'only in panel: {len(only_in_panel)}')
-                        differences.append(f'Squads mismatch ({", ".join(squad_diff_parts)})')
+            if panel_user:
+                panel_found = True
+                panel_status = panel_user.status.value if panel_user.status else None
+                panel_expire_at = panel_user.expire_at
+                panel_traffic_limit = (panel_user.traffic_limit_bytes or 0) / _BYTES_PER_GB
+                panel_traffic_used = (panel_user.used_traffic_bytes or 0) / _BYTES_PER_GB
+                panel_device_limit = panel_user.hwid_device_limit or 0
+                # Extract squad UUIDs from active_internal_squads
+                panel_squads = [s.get('uuid', '') for s in (panel_user.active_internal_squads or []) if s.get('uuid')]
+
+                # Check differences; a check is skipped when either side has no value
+                compared = (
+                    (bot_sub_status, panel_status),
+                    (bot_sub_end_date, panel_expire_at),
+                    (bot_traffic_limit, panel_traffic_limit),
+                    (bot_traffic_used, panel_traffic_used),
+                    (bot_device_limit, panel_device_limit),
+                )
+                differences = [
+                    describe(bot_value, panel_value)
+                    for (mismatches, describe), (bot_value, panel_value) in zip(_SYNC_CHECKS, compared, strict=True)
+                    if bot_value is not None and panel_value is not None and mismatches(bot_value, panel_value)
+                ]
+
+                # Compare squads: one symmetric difference, split by side only when reporting
+                bot_squads_set = frozenset(bot_squads)
+                mismatched_squads = bot_squads_set.symmetric_difference(panel_squads)
+                if mismatched_squads:
+                    only_in_bot = len(mismatched_squads & bot_squads_set)
+                    only_in_panel = len(mismatched_squads) - only_in_bot
+                    squad_diff_parts = []
+                    if only_in_bot:
+                        squad_diff_parts.append(f'only in bot: {only_in_bot}')
+                    if only_in_panel:
+                        squad_diff_parts.append(f'only in panel: {only_in_panel}')
+                    differences.append(f'Squads mismatch ({", ".join(squad_diff_parts)})')
 
     except Exception as e:
         logger.warning('Failed to get panel data for user', user_id=user_id, error=e)
         differences.append(f'Error fetching panel data: {e!s}')
 
-    # Resolve tariff name for context
-    sub_tariff_name: str | None = None
-    if active_sub:
-        try:
-            await db.refresh(active_sub, ['tariff'])
-            if active_sub.tariff:
-                sub_tariff_name = active_sub.tariff.name
-        except Exception:
-            pass
+    # Resolve tariff name for context (tariffs come eager-loaded with the subscriptions)
+    sub_tariff_name = active_sub.tariff.name if active_sub and active_sub.tariff else None
 
     return PanelSyncStatusResponse(
         user_id=user.id,
@@ -3119,8 +3256,12 @@ async def sync_user_from_panel(
 
     Fetches user data from Remnawave panel and updates local database.
     When subscription_id is provided, syncs that specific subscription instead of first-active.
+
+    Meant for one user: each call costs its own panel lookups. For mass syncs use
+    POST /admin/remnawave/sync/from-panel, which pages through the whole panel user list.
     """
-    user = await get_user_by_id(db, user_id)
+    # Subscriptions (with tariffs) come in the same round trip; referrer and promo groups are not needed
+    user = await get_user_with_subscriptions(db, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -3128,8 +3269,6 @@ async def sync_user_from_panel(
         )
 
     try:
-        from app.services.remnawave_service import RemnaWaveService
-
         service = RemnaWaveService()
         if not service.is_configured:
             raise HTTPException(
@@ -3153,225 +3292,215 @@ async def sync_user_from_panel(
         else:
             selected_sub = None
 
-        async with service.get_api_client() as api:
-            # Find user in panel: UUID → telegram_id → email
-            panel_user = None
-
-            if settings.is_multi_tariff_enabled():
-                if selected_sub and selected_sub.remnawave_uuid:
-                    # Specific subscription requested — use its UUID directly
-                    panel_user = await api.get_user_by_uuid(selected_sub.remnawave_uuid)
-                elif selected_sub and not selected_sub.remnawave_uuid:
-                    # The subscription lost its panel UUID (e.g. a spurious user.deleted
-                    # webhook wiped it). Re-link it to its live panel user by
-                    # telegram_id/email — but only UNAMBIGUOUSLY: choose a panel user that
-                    # is NOT already linked to another of this user's subscriptions, so we
-                    # never bind two subs to the same panel user (telegram_id is one-to-many
-                    # in multi-tariff). This is what makes the panel->bot repair work after
-                    # the sibling-expiry corruption.
-                    linked_uuids = {s.remnawave_uuid for s in from_subs if s.id != selected_sub.id and s.remnawave_uuid}
-                    candidates = []
-                    if user.telegram_id:
-                        candidates = list(await api.get_user_by_telegram_id(user.telegram_id) or [])
-                    if not candidates and user.email:
-                        candidates = list(await api.get_user_by_email(user.email) or [])
-                    orphans = [pu for pu in candidates if pu.uuid not in linked_uuids]
-                    if len(orphans) == 1:
-                        panel_user = orphans[0]
-                        changes['remnawave_uuid'] = {'old': None, 'new': panel_user.uuid}
-                        selected_sub.remnawave_uuid = panel_user.uuid
-                    elif len(orphans) > 1:
-                        raise HTTPException(
-                            status_code=status.HTTP_409_CONFLICT,
-                            detail=(
-                                'Multiple panel users match this account; cannot safely re-link '
-                                'this subscription. Resolve manually.'
-                            ),
-                        )
-                    else:
-                        raise HTTPException(
-                            status_code=status.HTTP_400_BAD_REQUEST,
-                            detail='This subscription is not linked to the panel and no matching panel user was found.',
-                        )
+        api = await service.get_shared_api_client()
+        # Find user in panel: UUID → telegram_id → email
+        panel_user = None
+
+        if settings.is_multi_tariff_enabled():
+            if selected_sub and selected_sub.remnawave_uuid:
+                # Specific subscription requested — use its UUID directly
+                panel_user = await api.get_user_by_uuid(selected_sub.remnawave_uuid)
+            elif selected_sub and not selected_sub.remnawave_uuid:
+                # The subscription lost its panel UUID (e.g. a spurious user.deleted
+                # webhook wiped it). Re-link it to its live panel user by
+                # telegram_id/email — but only UNAMBIGUOUSLY: choose a panel user that
+                # is NOT already linked to another of this user's subscriptions, so we
+                # never bind two subs to the same panel user (telegram_id is one-to-many
+                # in multi-tariff). This is what makes the panel->bot repair work after
+                # the sibling-expiry corruption.
+                linked_uuids = {s.remnawave_uuid for s in from_subs if s.id != selected_sub.id and s.remnawave_uuid}
+                candidates = []
+                if user.telegram_id:
+                    candidates = list(await api.get_user_by_telegram_id(user.telegram_id) or [])
+                if not candidates and user.email:
+                    candidates = list(await api.get_user_by_email(user.email) or [])
+                orphans = [pu for pu in candidates if pu.uuid not in linked_uuids]
+                if len(orphans) == 1:
+                    panel_user = orphans[0]
+                    changes['remnawave_uuid'] = {'old': None, 'new': panel_user.uuid}
+                    selected_sub.remnawave_uuid = panel_user.uuid
+                elif len(orphans) > 1:
+                    raise HTTPException(
+                        status_code=status.HTTP_409_CONFLICT,
+                        detail=(
+                            'Multiple panel users match this account; cannot safely re-link '
+                            'this subscription. Resolve manually.'
+                        ),
+                    )
                 else:
-                    # No specific subscription — iterate all subscription UUIDs
-                    sub_uuids = [s.remnawave_uuid for s in from_subs if s.remnawave_uuid]
-                    for _uuid in sub_uuids:
-                        panel_user = await api.get_user_by_uuid(_uuid)
-                        if panel_user:
-                            break
-            elif user.remnawave_uuid:
-                panel_user = await api.get_user_by_uuid(user.remnawave_uuid)
-
-            if not panel_user and user.telegram_id:
-                panel_users = await api.get_user_by_telegram_id(user.telegram_id)
-                if panel_users:
-                    panel_user = panel_users[0]
-
-            if not panel_user and user.email:
-                panel_users_by_email = await api.get_user_by_email(user.email)
-                if panel_users_by_email:
-                    panel_user = panel_users_by_email[0]
-
-            if not panel_user:
-                return SyncFromPanelResponse(
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail='This subscription is not linked to the panel and no matching panel user was found.',
+                    )
+            else:
+                # No specific subscription — iterate all subscription UUIDs
+                sub_uuids = [s.remnawave_uuid for s in from_subs if s.remnawave_uuid]
+                for _uuid in sub_uuids:
+                    panel_user = await api.get_user_by_uuid(_uuid)
+                    if panel_user:
+                        break
+        elif user.remnawave_uuid:
+            panel_user = await api.get_user_by_uuid(user.remnawave_uuid)
+
+        if not panel_user and user.telegram_id:
+            panel_users = await api.get_user_by_telegram_id(user.telegram_id)
+            if panel_users:
+                panel_user = panel_users[0]
+
+        if not panel_user and user.email:
+            panel_users_by_email = await api.get_user_by_email(user.email)
+            if panel_users_by_email:
+                panel_user = panel_users_by_email[0]
+
+        if not panel_user:
+            return json_response(
+                SyncFromPanelResponse(
                     success=False,
                     message='User not found in panel',
                     errors=['No user found in Remnawave panel by UUID, telegram_id, or email'],
                 )
-
-            # Build panel info. active_internal_squads is a list[dict] (see the
-            # diagnostic in get_user_sync_status / auth.py); the previous .uuid/str
-            # checks matched nothing, so panel squads were never extracted and the
-            # repair could not restore connected_squads. Handle dict (real), str and
-            # object forms defensively.
-            active_squads = []
-            for squad in getattr(panel_user, 'active_internal_squads', None) or []:
-                if isinstance(squad, dict):
-                    squad_uuid = squad.get('uuid')
-                elif isinstance(squad, str):
-                    squad_uuid = squad
-                else:
-                    squad_uuid = getattr(squad, 'uuid', None)
-                if squad_uuid:
-                    active_squads.append(squad_uuid)
-
-            panel_info = PanelUserInfo(
-                uuid=panel_user.uuid,
-                short_uuid=panel_user.short_uuid,
-                username=panel_user.username,
-                status=panel_user.status.value if panel_user.status else None,
-                expire_at=panel_datetime_to_utc(panel_user.expire_at) if panel_user.expire_at else None,
-                traffic_limit_gb=panel_user.traffic_limit_bytes / (1024**3) if panel_user.traffic_limit_bytes else 0,
-                traffic_used_gb=panel_user.used_traffic_bytes / (1024**3) if panel_user.used_traffic_bytes else 0,
-                device_limit=coerce_panel_device_limit(panel_user.hwid_device_limit),
-                subscription_url=panel_user.subscription_url,
-                active_squads=active_squads,
             )
 
-            # Update remnawave_uuid if different
-            # In multi-tariff mode the UUID belongs to the subscription, not the user
-            if not settings.is_multi_tariff_enabled() and user.remnawave_uuid != panel_user.uuid:
-                changes['remnawave_uuid'] = {'old': user.remnawave_uuid, 'new': panel_user.uuid}
-                user.remnawave_uuid = panel_user.uuid
-
-            # Update subscription if requested
-            # Use explicitly selected subscription or fall back to first-active
-            sync_sub = selected_sub or next((s for s in from_subs if s.is_active), from_subs[0] if from_subs else None)
-            if request.update_subscription and sync_sub:
-                sub = sync_sub
-
-                # Update end date (normalize timezone)
-                if panel_user.expire_at:
-                    panel_expire_utc = panel_datetime_to_utc(panel_user.expire_at)
-
-                    sub_end_utc = sub.end_date
-                    if sub_end_utc is not None and sub_end_utc.tzinfo is None:
-                        sub_end_utc = sub_end_utc.replace(tzinfo=UTC)
-                    if sub_end_utc != panel_expire_utc:
-                        # Предупреждаем если локальная дата новее панельной
-                        # (например, автопокупка уже продлила подписку)
-                        if sub_end_utc and panel_expire_utc and sub_end_utc > panel_expire_utc:
-                            logger.warning(
-                                'Sync: локальная end_date новее панельной, перезаписываем. '
-                                'Возможно автопокупка уже продлила подписку.',
-                                user_id=user_id,
-                                local_end_date=sub_end_utc.isoformat(),
-                                panel_expire_at=panel_expire_utc.isoformat(),
-                            )
-                            errors.append(
-                                f'Warning: local end_date ({sub_end_utc.isoformat()}) is newer than '
-                                f'panel expire_at ({panel_expire_utc.isoformat()}). '
-                                f'Panel value applied — check if auto-purchase extended subscription.'
-                            )
-                        changes['end_date'] = {
-                            'old': sub.end_date.isoformat() if sub.end_date else None,
-                            'new': panel_expire_utc.isoformat(),
-                        }
-                        sub.end_date = panel_expire_utc
-
-                # Update status
-                panel_status_str = panel_user.status.value if panel_user.status else 'DISABLED'
-                now = datetime.now(UTC)
-                # Compare with normalized panel expire date
-                panel_expire_for_check = panel_expire_utc if panel_user.expire_at else None
-                if panel_status_str == 'ACTIVE' and panel_expire_for_check and panel_expire_for_check > now:
-                    new_status = SubscriptionStatus.ACTIVE.value
-                elif panel_expire_for_check and panel_expire_for_check <= now:
-                    new_status = SubscriptionStatus.EXPIRED.value
-                else:
-                    new_status = SubscriptionStatus.DISABLED.value
-
-                if sub.status != new_status:
-                    changes['status'] = {'old': sub.status, 'new': new_status}
-                    sub.status = new_status
+        # Build panel info. active_internal_squads is a list[dict] (see the
+        # diagnostic in get_user_sync_status / auth.py); the previous .uuid/str
+        # checks matched nothing, so panel squads were never extracted and the
+        # repair could not restore connected_squads. Handle dict (real), str and
+        # object forms defensively.
+        active_squads = []
+        for squad in getattr(panel_user, 'active_internal_squads', None) or []:
+            if isinstance(squad, dict):
+                squad_uuid = squad.get('uuid')
+            elif isinstance(squad, str):
+                squad_uuid = squad
+            else:
+                squad_uuid = getattr(squad, 'uuid', None)
+            if squad_uuid:
+                active_squads.append(squad_uuid)
 
-                # Update traffic limit
-                panel_traffic_limit = (
-                    int(panel_user.traffic_limit_bytes / (1024**3)) if panel_user.traffic_limit_bytes else 0
-                )
-                if sub.traffic_limit_gb != panel_traffic_limit:
-                    changes['traffic_limit_gb'] = {'old': sub.traffic_limit_gb, 'new': panel_traffic_limit}
-                    sub.traffic_limit_gb = panel_traffic_limit
-
-                # Update device limit
-                panel_device_limit = coerce_panel_device_limit(panel_user.hwid_device_limit)
-                if sub.device_limit != panel_device_limit:
-                    changes['device_limit'] = {'old': sub.device_limit, 'new': panel_device_limit}
-                    sub.device_limit = panel_device_limit
-
-                # Update connected squads
-                if active_squads and sub.connected_squads != active_squads:
-                    changes['connected_squads'] = {'old': sub.connected_squads, 'new': active_squads}
-                    sub.connected_squads = active_squads
-
-                # Update subscription URL
-                if panel_user.subscription_url and sub.subscription_url != panel_user.subscription_url:
-                    changes['subscription_url'] = {'old': sub.subscription_url, 'new': panel_user.subscription_url}
-                    sub.subscription_url = panel_user.subscription_url
-
-                # Update short UUID
-                if panel_user.short_uuid and sub.remnawave_short_uuid != panel_user.short_uuid:
-                    changes['remnawave_short_uuid'] = {'old': sub.remnawave_short_uuid, 'new': panel_user.short_uuid}
-                    sub.remnawave_short_uuid = panel_user.short_uuid
-
-                # Update crypto link
-                if panel_user.happ_crypto_link and sub.subscription_crypto_link != panel_user.happ_crypto_link:
-                    changes['subscription_crypto_link'] = {'old': sub.subscription_crypto_link, 'new': '***'}
-                    sub.subscription_crypto_link = panel_user.happ_crypto_link
-
-            # Update traffic usage if requested
-            if request.update_traffic and sync_sub:
-                panel_traffic_used = panel_user.used_traffic_bytes / (1024**3) if panel_user.used_traffic_bytes else 0
-                if abs((sync_sub.traffic_used_gb or 0) - panel_traffic_used) > 0.01:
-                    changes['traffic_used_gb'] = {'old': sync_sub.traffic_used_gb, 'new': panel_traffic_used}
-                    sync_sub.traffic_used_gb = panel_traffic_used
-
-            # Create subscription if missing but user exists in panel
-            if request.create_if_missing and not sync_sub and panel_user.expire_at:
-                from app.database.crud.subscription import create_paid_subscription
-
-                panel_traffic_limit = (
-                    int(panel_user.traffic_limit_bytes / (1024**3)) if panel_user.traffic_limit_bytes else 100
-                )
+        # All panel lookups are done: one clock read serves the status check, the create path and the sync stamp
+        now = datetime.now(UTC)
+        # Panel values in bot units, converted once and shared by the info block and the updates below
+        panel_traffic_limit_gb = (panel_user.traffic_limit_bytes or 0) / _BYTES_PER_GB
+        panel_traffic_used = (panel_user.used_traffic_bytes or 0) / _BYTES_PER_GB
+        panel_device_limit = coerce_panel_device_limit(panel_user.hwid_device_limit)
+
+        panel_info = PanelUserInfo(
+            uuid=panel_user.uuid,
+            short_uuid=panel_user.short_uuid,
+            username=panel_user.username,
+            status=panel_user.status.value if panel_user.status else None,
+            expire_at=panel_datetime_to_utc(panel_user.expire_at) if panel_user.expire_at else None,
+            traffic_limit_gb=panel_traffic_limit_gb,
+            traffic_used_gb=panel_traffic_used,
+            device_limit=panel_device_limit,
+            subscription_url=panel_user.subscription_url,
+            active_squads=active_squads,
+        )
+
+        # Update remnawave_uuid if different
+        # In multi-tariff mode the UUID belongs to the subscription, not the user
+        if not settings.is_multi_tariff_enabled() and user.remnawave_uuid != panel_user.uuid:
+            changes['remnawave_uuid'] = {'old': user.remnawave_uuid, 'new': panel_user.uuid}
+            user.remnawave_uuid = panel_user.uuid
+
+        # Update subscription if requested
+        # Use explicitly selected subscription or fall back to first-active
+        sync_sub = selected_sub or next((s for s in from_subs if s.is_active), from_subs[0] if from_subs else None)
+        if request.update_subscription and sync_sub:
+            sub = sync_sub
+
+            # Update end date (normalize timezone)
+            if panel_user.expire_at:
                 panel_expire_utc = panel_datetime_to_utc(panel_user.expire_at)
-                days_remaining = max(1, math.ceil((panel_expire_utc - datetime.now(UTC)).total_seconds() / 86400))
-
-                new_sub = await create_paid_subscription(
-                    db=db,
-                    user_id=user.id,
-                    duration_days=days_remaining,
-                    traffic_limit_gb=panel_traffic_limit,
-                    device_limit=coerce_panel_device_limit(panel_user.hwid_device_limit),
-                    connected_squads=active_squads,
+
+                sub_end_utc = sub.end_date
+                if sub_end_utc is not None and sub_end_utc.tzinfo is None:
+                    sub_end_utc = sub_end_utc.replace(tzinfo=UTC)
+                if sub_end_utc != panel_expire_utc:
+                    # Предупреждаем если локальная дата новее панельной
+                    # (например, автопокупка уже продлила подписку)
+                    if sub_end_utc and panel_expire_utc and sub_end_utc > panel_expire_utc:
+                        logger.warning(
+                            'Sync: локальная end_date новее панельной, перезаписываем. '
+                            'Возможно автопокупка уже продлила подписку.',
+                            user_id=user_id,
+                            local_end_date=sub_end_utc.isoformat(),
+                            panel_expire_at=panel_expire_utc.isoformat(),
+                        )
+                        errors.append(
+                            f'Warning: local end_date ({sub_end_utc.isoformat()}) is newer than '
+                            f'panel expire_at ({panel_expire_utc.isoformat()}). '
+                            f'Panel value applied — check if auto-purchase extended subscription.'
+                        )
+                    changes['end_date'] = {
+                        'old': sub.end_date.isoformat() if sub.end_date else None,
+                        'new': panel_expire_utc.isoformat(),
+                    }
+                    sub.end_date = panel_expire_utc
+
+            # Update status
+            panel_status_str = panel_user.status.value if panel_user.status else 'DISABLED'
+            # Compare with normalized panel expire date
+            panel_expire_for_check = panel_expire_utc if panel_user.expire_at else None
+            if panel_status_str == 'ACTIVE' and panel_expire_for_check and panel_expire_for_check > now:
+                new_status = SubscriptionStatus.ACTIVE.value
+            elif panel_expire_for_check and panel_expire_for_check <= now:
+                new_status = SubscriptionStatus.EXPIRED.value
+            else:
+                new_status = SubscriptionStatus.DISABLED.value
+
+            # Status and limits always follow the panel; squads, URL, short UUID and crypto
+            # link are only taken when the panel has a value, so they are never cleared.
+            field_updates = [
+                ('status', new_status),
+                ('traffic_limit_gb', int(panel_traffic_limit_gb)),
+                ('device_limit', panel_device_limit),
+            ]
+            field_updates.extend(
+                (attr, value)
+                for attr, value in (
+                    ('connected_squads', active_squads),
+                    ('subscription_url', panel_user.subscription_url),
+                    ('remnawave_short_uuid', panel_user.short_uuid),
+                    ('subscription_crypto_link', panel_user.happ_crypto_link),
                 )
-                new_sub.remnawave_short_uuid = panel_user.short_uuid
-                new_sub.subscription_url = panel_user.subscription_url
-                changes['subscription_created'] = True
+                if value
+            )
+            for attr, new_value in field_updates:
+                old_value = getattr(sub, attr)
+                if old_value != new_value:
+                    shown_value = '***' if attr in _SECRET_SYNC_FIELDS else new_value
+                    changes[attr] = {'old': old_value, 'new': shown_value}
+                    setattr(sub, attr, new_value)
+
+        # Update traffic usage if requested
+        if request.update_traffic and sync_sub:
+            if abs((sync_sub.traffic_used_gb or 0) - panel_traffic_used) > 0.01:
+                changes['traffic_used_gb'] = {'old': sync_sub.traffic_used_gb, 'new': panel_traffic_used}
+                sync_sub.traffic_used_gb = panel_traffic_used
+
+        # Create subscription if missing but user exists in panel
+        if request.create_if_missing and not sync_sub and panel_user.expire_at:
+            panel_traffic_limit = int(panel_traffic_limit_gb) if panel_user.traffic_limit_bytes else 100
+            panel_expire_utc = panel_datetime_to_utc(panel_user.expire_at)
+            days_remaining = max(1, math.ceil((panel_expire_utc - now).total_seconds() / 86400))
+
+            new_sub = await create_paid_subscription(
+                db=db,
+                user_id=user.id,
+                duration_days=days_remaining,
+                traffic_limit_gb=panel_traffic_limit,
+                device_limit=panel_device_limit,
+                connected_squads=active_squads,
+            )
+            new_sub.remnawave_short_uuid = panel_user.short_uuid
+            new_sub.subscription_url = panel_user.subscription_url
+            changes['subscription_created'] = True
 
-            # Update last sync time
-            user.last_remnawave_sync = datetime.now(UTC)
-            user.updated_at = datetime.now(UTC)
+        # Every write above is recorded in `changes`, so an idempotent sync skips the UPDATE and COMMIT
+        if changes:
+            user.last_remnawave_sync = now
+            user.updated_at = now
 
             await db.commit()
 
@@ -3379,12 +3508,14 @@ async def sync_user_from_panel(
             'Admin synced user from panel. Changes', admin_id=admin.id, user_id=user_id, value=list(changes.keys())
         )
 
-        return SyncFromPanelResponse(
-            success=True,
-            message=f'Synced {len(changes)} changes from panel' if changes else 'No changes needed',
-            panel_user=panel_info,
-            changes=changes,
-            errors=errors,
+        return json_response(
+            SyncFromPanelResponse(
+                success=True,
+                message=f'Synced {len(changes)} changes from panel' if changes else 'No changes needed',
+                panel_user=panel_info,
+                changes=changes,
+                errors=errors,
+            )
         )
 
     except HTTPException:
@@ -3410,8 +3541,11 @@ async def sync_user_to_panel(
 
     Sends user/subscription data to Remnawave panel, creating or updating as needed.
     When subscription_id is provided, syncs that specific subscription instead of first-active.
+
+    Meant for one user; mass pushes go through POST /admin/remnawave/sync/to-panel.
     """
-    user = await get_user_by_id(db, user_id)
+    # Subscriptions (with tariffs) come in the same round trip; referrer and promo groups are not needed
+    user = await get_user_with_subscriptions(db, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -3435,12 +3569,6 @@ async def sync_user_to_panel(
         )
 
     try:
-        from app.config import settings
-        from app.external.remnawave_api import UserStatus as PanelUserStatus
-        from app.services.remnawave_service import RemnaWaveService
-        from app.services.subscription_service import get_traffic_reset_strategy
-        from app.utils.subscription_utils import resolve_hwid_device_limit_for_payload
-
         service = RemnaWaveService()
         if not service.is_configured:
             raise HTTPException(
@@ -3457,17 +3585,18 @@ async def sync_user_to_panel(
         )
 
         # Prepare data for panel
+        now = datetime.now(UTC)
         is_active = (
             sub.status in (SubscriptionStatus.ACTIVE.value, SubscriptionStatus.TRIAL.value)
             and sub.end_date
-            and sub.end_date > datetime.now(UTC)
+            and sub.end_date > now
         )
         panel_status = PanelUserStatus.ACTIVE if is_active else PanelUserStatus.DISABLED
 
         # Ensure expire_at is in future for panel
         expire_at = sub.end_date
-        if expire_at and expire_at <= datetime.now(UTC):
-            expire_at = datetime.now(UTC) + timedelta(minutes=1)
+        if expire_at and expire_at <= now:
+            expire_at = now + timedelta(minutes=1)
 
         # Same precaution as the per-user sync above: multi-tariff create-path
         # appends `_<remnawave_short_id>`. Helper resрвирует место.
@@ -3494,137 +3623,140 @@ async def sync_user_to_panel(
         )
 
         hwid_limit = resolve_hwid_device_limit_for_payload(sub)
-        traffic_limit_bytes = sub.traffic_limit_gb * (1024**3) if sub.traffic_limit_gb > 0 else 0
+        traffic_limit_bytes = sub.traffic_limit_gb * _BYTES_PER_GB if sub.traffic_limit_gb > 0 else 0
 
-        # Загружаем tariff для внешнего сквада
-        try:
-            await db.refresh(sub, ['tariff'])
-        except Exception:
-            pass
+        # Тариф для внешнего сквада уже подгружен вместе с подписками
         ext_squad_uuid = sub.tariff.external_squad_uuid if sub.tariff else None
 
-        async with service.get_api_client() as api:
-            # Validate existing UUID
-            if panel_uuid:
-                existing_user = await api.get_user_by_uuid(panel_uuid)
-                if not existing_user:
-                    logger.warning('Stale remnawave_uuid, clearing', user_id=user.id, panel_uuid=panel_uuid)
-                    panel_uuid = None
-                    if settings.is_multi_tariff_enabled():
-                        sub.remnawave_uuid = None
-                    else:
-                        user.remnawave_uuid = None
-
-            # Fallback: search by telegram_id (single-tariff only)
-            if not panel_uuid and not settings.is_multi_tariff_enabled() and user.telegram_id:
-                existing_users = await api.get_user_by_telegram_id(user.telegram_id)
-                if existing_users:
-                    panel_uuid = existing_users[0].uuid
-                    user.remnawave_uuid = panel_uuid
-                    changes['remnawave_uuid_discovered'] = panel_uuid
-
-            # Fallback: search by email (single-tariff, OAuth users)
-            if not panel_uuid and not settings.is_multi_tariff_enabled() and user.email:
-                existing_users = await api.get_user_by_email(user.email)
-                if existing_users:
-                    panel_uuid = existing_users[0].uuid
-                    user.remnawave_uuid = panel_uuid
-                    changes['remnawave_uuid_discovered'] = panel_uuid
-
-            if panel_uuid:
-                # Update existing user
-                update_kwargs = {'uuid': panel_uuid}
-
-                if request.update_status:
-                    update_kwargs['status'] = panel_status
-                    changes['status'] = panel_status.value
-
-                if request.update_expire_date and expire_at:
-                    update_kwargs['expire_at'] = expire_at
-                    changes['expire_at'] = expire_at.isoformat()
-
-                if request.update_traffic_limit:
-                    update_kwargs['traffic_limit_bytes'] = traffic_limit_bytes
-                    update_kwargs['traffic_limit_strategy'] = get_traffic_reset_strategy(sub.tariff)
-                    changes['traffic_limit_gb'] = sub.traffic_limit_gb
-
-                if request.update_squads and sub.connected_squads:
-                    update_kwargs['active_internal_squads'] = sub.connected_squads
-                    changes['connected_squads'] = sub.connected_squads
-
-                update_kwargs['description'] = description
-                if hwid_limit is not None:
-                    update_kwargs['hwid_device_limit'] = hwid_limit
-                    changes['device_limit'] = hwid_limit
-
-                # Внешний сквад: синхронизируем из тарифа (если задан)
-                # Не отправляем null — RemnaWave API не принимает null для externalSquadUuid (A039)
-                if ext_squad_uuid is not None:
-                    update_kwargs['external_squad_uuid'] = ext_squad_uuid
+        api = await service.get_shared_api_client()
+        # Panel lookups run in order on purpose: each fallback below only fires when the
+        # previous one found nothing, and the update/create depends on the UUID they yield.
+        # Validate existing UUID
+        stale_uuid_cleared = False
+        if panel_uuid:
+            existing_user = await api.get_user_by_uuid(panel_uuid)
+            if not existing_user:
+                logger.warning('Stale remnawave_uuid, clearing', user_id=user.id, panel_uuid=panel_uuid)
+                panel_uuid = None
+                stale_uuid_cleared = True
+                if settings.is_multi_tariff_enabled():
+                    sub.remnawave_uuid = None
+                else:
+                    user.remnawave_uuid = None
+
+        # Fallback: search by telegram_id (single-tariff only)
+        if not panel_uuid and not settings.is_multi_tariff_enabled() and user.telegram_id:
+            existing_users = await api.get_user_by_telegram_id(user.telegram_id)
+            if existing_users:
+                panel_uuid = existing_users[0].uuid
+                user.remnawave_uuid = panel_uuid
+                changes['remnawave_uuid_discovered'] = panel_uuid
+
+        # Fallback: search by email (single-tariff, OAuth users)
+        if not panel_uuid and not settings.is_multi_tariff_enabled() and user.email:
+            existing_users = await api.get_user_by_email(user.email)
+            if existing_users:
+                panel_uuid = existing_users[0].uuid
+                user.remnawave_uuid = panel_uuid
+                changes['remnawave_uuid_discovered'] = panel_uuid
+
+        if panel_uuid:
+            # Update existing user
+            update_kwargs = {'uuid': panel_uuid}
+
+            if request.update_status:
+                update_kwargs['status'] = panel_status
+                changes['status'] = panel_status.value
+
+            if request.update_expire_date and expire_at:
+                update_kwargs['expire_at'] = expire_at
+                changes['expire_at'] = expire_at.isoformat()
+
+            if request.update_traffic_limit:
+                update_kwargs['traffic_limit_bytes'] = traffic_limit_bytes
+                update_kwargs['traffic_limit_strategy'] = get_traffic_reset_strategy(sub.tariff)
+                changes['traffic_limit_gb'] = sub.traffic_limit_gb
+
+            if request.update_squads and sub.connected_squads:
+                update_kwargs['active_internal_squads'] = sub.connected_squads
+                changes['connected_squads'] = sub.connected_squads
+
+            update_kwargs['description'] = description
+            if hwid_limit is not None:
+                update_kwargs['hwid_device_limit'] = hwid_limit
+                changes['device_limit'] = hwid_limit
+
+            # Внешний сквад: синхронизируем из тарифа (если задан)
+            # Не отправляем null — RemnaWave API не принимает null для externalSquadUuid (A039)
+            if ext_squad_uuid is not None:
+                update_kwargs['external_squad_uuid'] = ext_squad_uuid
 
-                try:
-                    await api.update_user(**update_kwargs)
-                    action = 'updated'
-                except Exception as update_error:
-                    error_code = (getattr(update_error, 'response_data', None) or {}).get('errorCode', '')
-                    if (
-                        hasattr(update_error, 'status_code') and update_error.status_code == 404
-                    ) or error_code == 'A018':
-                        # User not found in panel, create new
-                        panel_uuid = None
-                    else:
-                        raise
-
-            if not panel_uuid and request.create_if_missing:
-                # Create new user in panel
-                create_kwargs = {
-                    'username': username,
-                    'expire_at': expire_at or (datetime.now(UTC) + timedelta(days=30)),
-                    'status': panel_status,
-                    'traffic_limit_bytes': traffic_limit_bytes,
-                    'traffic_limit_strategy': get_traffic_reset_strategy(sub.tariff),
-                    'telegram_id': user.telegram_id,
-                    'email': user.email,
-                    'description': description,
-                    'active_internal_squads': sub.connected_squads or [],
-                }
-
-                if hwid_limit is not None:
-                    create_kwargs['hwid_device_limit'] = hwid_limit
-                if ext_squad_uuid is not None:
-                    create_kwargs['external_squad_uuid'] = ext_squad_uuid
-
-                # multi-tariff suffix уже встроен в `username` через
-                # build_remnawave_subscription_username — больше ничего не клеим.
-
-                new_panel_user = await api.create_user(**create_kwargs)
-                panel_uuid = new_panel_user.uuid
-                sub.remnawave_uuid = new_panel_user.uuid
-                sub.remnawave_short_uuid = new_panel_user.short_uuid
-                sub.subscription_url = new_panel_user.subscription_url
-                if not settings.is_multi_tariff_enabled():
-                    user.remnawave_uuid = new_panel_user.uuid
-
-                changes['created_in_panel'] = True
-                changes['panel_uuid'] = panel_uuid
-                changes['short_uuid'] = new_panel_user.short_uuid
-                action = 'created'
-
-            # Update last sync time
-            user.last_remnawave_sync = datetime.now(UTC)
-            user.updated_at = datetime.now(UTC)
+            try:
+                await api.update_user(**update_kwargs)
+                action = 'updated'
+            except Exception as update_error:
+                error_code = (getattr(update_error, 'response_data', None) or {}).get('errorCode', '')
+                if (hasattr(update_error, 'status_code') and update_error.status_code == 404) or error_code == 'A018':
+                    # User not found in panel, create new
+                    panel_uuid = None
+                else:
+                    raise
+
+        if not panel_uuid and request.create_if_missing:
+            # Create new user in panel
+            create_kwargs = {
+                'username': username,
+                'expire_at': expire_at or (now + timedelta(days=30)),
+                'status': panel_status,
+                'traffic_limit_bytes': traffic_limit_bytes,
+                'traffic_limit_strategy': get_traffic_reset_strategy(sub.tariff),
+                'telegram_id': user.telegram_id,
+                'email': user.email,
+                'description': description,
+                'active_internal_squads': sub.connected_squads or [],
+            }
+
+            if hwid_limit is not None:
+                create_kwargs['hwid_device_limit'] = hwid_limit
+            if ext_squad_uuid is not None:
+                create_kwargs['external_squad_uuid'] = ext_squad_uuid
+
+            # multi-tariff suffix уже встроен в `username` через
+            # build_remnawave_subscription_username — больше ничего не клеим.
+
+            new_panel_user = await api.create_user(**create_kwargs)
+            panel_uuid = new_panel_user.uuid
+            sub.remnawave_uuid = new_panel_user.uuid
+            sub.remnawave_short_uuid = new_panel_user.short_uuid
+            sub.subscription_url = new_panel_user.subscription_url
+            if not settings.is_multi_tariff_enabled():
+                user.remnawave_uuid = new_panel_user.uuid
+
+            changes['created_in_panel'] = True
+            changes['panel_uuid'] = panel_uuid
+            changes['short_uuid'] = new_panel_user.short_uuid
+            action = 'created'
+
+        # Nothing pushed and no local UUID touched: skip the UPDATE and COMMIT
+        if action != 'no_changes' or changes or stale_uuid_cleared:
+            # Update last sync time (read after the panel calls above)
+            synced_at = datetime.now(UTC)
+            user.last_remnawave_sync = synced_at
+            user.updated_at = synced_at
 
             await db.commit()
 
         logger.info('Admin synced user to panel. Action', admin_id=admin.id, user_id=user_id, action=action)
 
-        return SyncToPanelResponse(
-            success=True,
-            message=f'User {action} in panel' if action != 'no_changes' else 'No changes needed',
-            action=action,
-            panel_uuid=panel_uuid,
-            changes=changes,
-            errors=errors,
+        return json_response(
+            SyncToPanelResponse(
+                success=True,
+                message=f'User {action} in panel' if action != 'no_changes' else 'No changes needed',
+                action=action,
+                panel_uuid=panel_uuid,
+                changes=changes,
+                errors=errors,
+            )
         )
 
     except HTTPException:
@@ -3647,8 +3779,6 @@ async def get_user_gifts(
     db: AsyncSession = Depends(get_cabinet_db),
 ) -> AdminUserGiftsResponse:
     """Get all gift subscriptions sent and received by user."""
-    from sqlalchemy.orm import noload
-
     # Lightweight existence check (avoids eager-loading all User relationships)
     user_exists = await db.execute(select(User.id).where(User.id == user_id))
     if not user_exists.scalar_one_or_none():
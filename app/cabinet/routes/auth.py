@@ -7,6 +7,7 @@ from datetime import UTC, datetime
 
 import structlog
 from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.security import HTTPAuthorizationCredentials
 from sqlalchemy import func, select
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -73,7 +74,7 @@ from ..auth.merge_service import (
     get_email_merge_otp,
     store_email_merge_otp,
 )
-from ..dependencies import get_cabinet_db, get_current_cabinet_user
+from ..dependencies import get_cabinet_db, get_current_cabinet_user, invalidate_cached_token, security
 from ..ip_utils import get_client_ip
 from ..schemas.auth import (
     AuthResponse,
@@ -1773,9 +1774,13 @@ async def refresh_token(
 @router.post('/logout')
 async def logout(
     request: RefreshTokenRequest,
+    credentials: HTTPAuthorizationCredentials | None = Depends(security),
     db: AsyncSession = Depends(get_cabinet_db),
 ):
     """Logout and revoke refresh token."""
+    if credentials:
+        invalidate_cached_token(credentials.credentials)
+
     token_hash = hashlib.sha256(request.refresh_token.encode()).hexdigest()
 
     result = await db.execute(
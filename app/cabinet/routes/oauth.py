@@ -1,18 +1,18 @@
 """OAuth 2.0 authentication routes for cabinet."""
 
 from datetime import UTC, datetime
+from functools import lru_cache
 
 import structlog
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from pydantic import BaseModel, Field
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.config import settings
 from app.database.crud.user import (
     create_user_by_oauth,
-    get_user_by_email,
-    get_user_by_oauth_provider,
     get_user_by_referral_code,
+    get_users_for_oauth_login,
     set_user_oauth_provider_id,
 )
 from app.database.models import User, UserStatus
@@ -90,6 +90,17 @@ class OAuthCallbackRequest(BaseModel):
     )
 
 
+@lru_cache(maxsize=16)
+def _providers_body(enabled: tuple[tuple[str, str], ...]) -> str:
+    """Serialized provider list, memoized per set of enabled ``(name, display_name)`` pairs.
+
+    Keyed by value rather than cached once per process: OAuth settings can be
+    changed at runtime from the admin panel, and a new set simply gets its own entry.
+    """
+    providers = [OAuthProviderInfo(name=name, display_name=display_name) for name, display_name in enabled]
+    return OAuthProvidersResponse(providers=providers).model_dump_json()
+
+
 # --- Endpoints ---
 
 
@@ -97,12 +108,8 @@ class OAuthCallbackRequest(BaseModel):
 async def get_oauth_providers():
     """Get list of enabled OAuth providers."""
     providers_config = settings.get_oauth_providers_config()
-    providers = [
-        OAuthProviderInfo(name=name, display_name=cfg['display_name'])
-        for name, cfg in providers_config.items()
-        if cfg['enabled']
-    ]
-    return OAuthProvidersResponse(providers=providers)
+    enabled = tuple((name, cfg['display_name']) for name, cfg in providers_config.items() if cfg['enabled'])
+    return Response(content=_providers_body(enabled), media_type='application/json')
 
 
 @router.get('/{provider}/authorize', response_model=OAuthAuthorizeResponse)
@@ -183,8 +190,10 @@ async def oauth_callback(
             detail='Failed to fetch user information from provider',
         ) from exc
 
-    # 5. Find user by provider ID
-    user = await get_user_by_oauth_provider(db, provider, user_info.provider_id)
+    # 5. Find user by provider ID. The email candidate for step 6 comes back from
+    # the same query, so linking a new provider to an existing account costs one round trip.
+    verified_email = user_info.email if user_info.email_verified else None
+    user, email_user = await get_users_for_oauth_login(db, provider, user_info.provider_id, verified_email)
     if user:
         # If the previously-linked account was soft-deleted for
         # inactivity, the OAuth provider's signed JWT/userinfo is enough
@@ -205,7 +214,7 @@ async def oauth_callback(
     # mail) — the IdP's verification covers IdP-side ownership, not the
     # local row's history. Both must agree.
     if user_info.email and user_info.email_verified:
-        user = await get_user_by_email(db, user_info.email)
+        user = email_user
         if user and not user.email_verified:
             # Same email exists locally but verification was never
             # completed. Falling through to step 8 would attempt to
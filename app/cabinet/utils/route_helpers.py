@@ -0,0 +1,24 @@
+"""Helpers shared by cabinet admin routes: concurrent reads and pre-rendered JSON responses."""
+
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from fastapi import Response, status
+from pydantic import BaseModel
+
+from app.database.database import AsyncSessionLocal
+
+
+async def in_own_session[T](query: Callable[..., Awaitable[T]], *args: Any) -> T:
+    """Run a read-only ``query`` on a short-lived session of its own.
+
+    An AsyncSession must not be shared between tasks, so this lets several
+    independent reads run concurrently.
+    """
+    async with AsyncSessionLocal() as session:
+        return await query(session, *args)
+
+
+def json_response(model: BaseModel, status_code: int = status.HTTP_200_OK) -> Response:
+    """Render ``model`` with pydantic's serializer, bypassing FastAPI's jsonable_encoder pass."""
+    return Response(content=model.model_dump_json(), status_code=status_code, media_type='application/json')
@@ -3,6 +3,7 @@ import os
 import re
 from collections import defaultdict
 from datetime import time
+from functools import lru_cache
 from pathlib import Path
 from typing import ClassVar, Literal
 from urllib.parse import quote as _url_quote, urlparse
@@ -24,6 +25,29 @@ USER_TAG_PATTERN = re.compile(r'^[A-Z0-9_]{1,16}$')
 logger = structlog.get_logger(__name__)
 
 
+# Разбор ADMIN_IDS / ADMIN_EMAILS кешируется по исходной строке: is_admin()
+# вызывается на каждом запросе кабинета, а смена значения в рантайме просто
+# даёт новый ключ кеша.
+@lru_cache(maxsize=8)
+def _parse_admin_ids(raw: str) -> tuple[int, ...]:
+    return tuple(int(x.strip()) for x in raw.split(',') if x.strip())
+
+
+@lru_cache(maxsize=8)
+def _parse_admin_emails(raw: str) -> tuple[str, ...]:
+    return tuple(e.strip().lower() for e in raw.split(',') if e.strip())
+
+
+@lru_cache(maxsize=8)
+def _admin_id_set(raw: str) -> frozenset[int]:
+    return frozenset(_parse_admin_ids(raw))
+
+
+@lru_cache(maxsize=8)
+def _admin_email_set(raw: str) -> frozenset[str]:
+    return frozenset(_parse_admin_emails(raw))
+
+
 class Settings(BaseSettings):
     BOT_TOKEN: str
     BOT_USERNAME: str | None = None
@@ -125,6 +149,11 @@ class Settings(BaseSettings):
     DATABASE_POOL_SIZE: int = 20
     DATABASE_MAX_OVERFLOW: int = 20
     DATABASE_POOL_TIMEOUT: int = 30
+    # Кеш скомпилированных SQLAlchemy-запросов (на engine) и кеш prepared
+    # statements asyncpg (на соединение). 0 в STATEMENT_CACHE_SIZE отключает
+    # prepared statements — нужно за pgbouncer в transaction-режиме.
+    DATABASE_QUERY_CACHE_SIZE: int = 2000
+    DATABASE_STATEMENT_CACHE_SIZE: int = 1024
 
     REDIS_URL: str = 'redis://localhost:6379/0'
     CART_TTL_SECONDS: int = 3600  # Время жизни корзины пользователя в Redis (1 час)
@@ -1296,6 +1325,26 @@ class Settings(BaseSettings):
         except (TypeError, ValueError):
             return 30
 
+    @field_validator('DATABASE_QUERY_CACHE_SIZE', mode='before')
+    @classmethod
+    def ensure_nonnegative_database_query_cache_size(cls, value: int | None) -> int:
+        try:
+            if value is None or value == '':
+                return 2000
+            return max(0, int(value))
+        except (TypeError, ValueError):
+            return 2000
+
+    @field_validator('DATABASE_STATEMENT_CACHE_SIZE', mode='before')
+    @classmethod
+    def ensure_nonnegative_database_statement_cache_size(cls, value: int | None) -> int:
+        try:
+            if value is None or value == '':
+                return 1024
+            return max(0, int(value))
+        except (TypeError, ValueError):
+            return 1024
+
     @field_validator('LOG_FILE', mode='before')
     @classmethod
     def ensure_log_dir(cls, v):
@@ -1369,10 +1418,18 @@ class Settings(BaseSettings):
         Returns:
             True if user is admin
         """
-        if telegram_id and telegram_id in self.get_admin_ids():
-            return True
-        if email and email.lower() in [e.lower() for e in self.get_admin_emails()]:
-            return True
+        if telegram_id:
+            admin_ids = self.ADMIN_IDS
+            if isinstance(admin_ids, str):
+                try:
+                    if telegram_id in _admin_id_set(admin_ids):
+                        return True
+                except ValueError:
+                    pass
+        if email:
+            admin_emails = self.ADMIN_EMAILS
+            if isinstance(admin_emails, str) and email.lower() in _admin_email_set(admin_emails):
+                return True
         return False
 
     def get_admin_ids(self) -> list[int]:
@@ -1380,9 +1437,7 @@ class Settings(BaseSettings):
             admin_ids = self.ADMIN_IDS
 
             if isinstance(admin_ids, str):
-                if not admin_ids.strip():
-                    return []
-                return [int(x.strip()) for x in admin_ids.split(',') if x.strip()]
+                return list(_parse_admin_ids(admin_ids))
 
             return []
 
@@ -1395,9 +1450,7 @@ class Settings(BaseSettings):
             admin_emails = self.ADMIN_EMAILS
 
             if isinstance(admin_emails, str):
-                if not admin_emails.strip():
-                    return []
-                return [e.strip().lower() for e in admin_emails.split(',') if e.strip()]
+                return list(_parse_admin_emails(admin_emails))
 
             return []
 
@@ -49,6 +49,34 @@ async def get_promo_groups_with_counts(
     return result.all()
 
 
+async def get_promo_groups_page_with_total(
+    db: AsyncSession,
+    *,
+    offset: int = 0,
+    limit: int | None = None,
+) -> tuple[list[tuple[PromoGroup, int]], int]:
+    """Like get_promo_groups_with_counts, plus the total number of groups in the same query."""
+    # The window runs after GROUP BY, so it counts groups rather than members.
+    query = (
+        select(PromoGroup, func.count(User.id), func.count().over().label('total'))
+        .outerjoin(User, User.promo_group_id == PromoGroup.id)
+        .group_by(PromoGroup.id)
+        .order_by(PromoGroup.priority.desc(), PromoGroup.name)
+    )
+
+    if offset:
+        query = query.offset(offset)
+    if limit is not None:
+        query = query.limit(limit)
+
+    rows = (await db.execute(query)).all()
+    if rows:
+        return [(group, count) for group, count, _ in rows], int(rows[0].total)
+    if offset:
+        return [], await count_promo_groups(db)
+    return [], 0
+
+
 async def get_auto_assign_promo_groups(db: AsyncSession) -> list[PromoGroup]:
     result = await db.execute(
         select(PromoGroup)
@@ -72,6 +100,18 @@ async def get_promo_group_by_id(db: AsyncSession, group_id: int) -> PromoGroup |
     return await db.get(PromoGroup, group_id)
 
 
+async def get_promo_group_with_count(db: AsyncSession, group_id: int) -> tuple[PromoGroup, int] | None:
+    """Promo group together with its members count, in one query."""
+    members_count = (
+        select(func.count(User.id)).where(User.promo_group_id == PromoGroup.id).correlate(PromoGroup).scalar_subquery()
+    )
+    result = await db.execute(select(PromoGroup, members_count).where(PromoGroup.id == group_id))
+    row = result.one_or_none()
+    if row is None:
+        return None
+    return row[0], int(row[1])
+
+
 async def count_promo_groups(db: AsyncSession) -> int:
     result = await db.execute(select(func.count(PromoGroup.id)))
     return int(result.scalar_one())
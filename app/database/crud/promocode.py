@@ -1,7 +1,9 @@
 from datetime import UTC, datetime, timedelta
 
 import structlog
-from sqlalchemy import and_, func, select
+from sqlalchemy import and_, func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
@@ -84,6 +86,74 @@ async def create_promocode(
     return promocode
 
 
+async def create_promocode_if_code_free(
+    db: AsyncSession,
+    code: str,
+    type: PromoCodeType,
+    balance_bonus_kopeks: int = 0,
+    subscription_days: int = 0,
+    max_uses: int = 1,
+    valid_until: datetime | None = None,
+    created_by: int | None = None,
+    promo_group_id: int | None = None,
+    valid_from: datetime | None = None,
+    is_active: bool = True,
+    first_purchase_only: bool = False,
+    tariff_id: int | None = None,
+) -> PromoCode | None:
+    """Create a promocode unless its code is taken; returns None on a duplicate code.
+
+    A single INSERT ... ON CONFLICT (code) DO NOTHING RETURNING replaces the
+    racy read-then-insert and hands back the fully populated row.
+    """
+    values = {
+        'code': code.upper(),
+        'type': type.value,
+        'balance_bonus_kopeks': balance_bonus_kopeks,
+        'subscription_days': subscription_days,
+        'max_uses': max_uses,
+        'valid_until': valid_until,
+        'created_by': created_by,
+        'promo_group_id': promo_group_id,
+        'is_active': is_active,
+        'first_purchase_only': first_purchase_only,
+        'tariff_id': tariff_id,
+    }
+    # Leave valid_from unset when not given so the column default (now()) applies.
+    if valid_from is not None:
+        values['valid_from'] = valid_from
+
+    result = await db.execute(
+        pg_insert(PromoCode).values(**values).on_conflict_do_nothing(index_elements=['code']).returning(PromoCode)
+    )
+    promocode = result.scalar_one_or_none()
+    await db.commit()
+
+    if promocode is not None:
+        logger.info('✅ Создан промокод', code=code, promo_group_id=promo_group_id)
+    return promocode
+
+
+# ``unique=True, index=True`` on PromoCode.code yields a unique index; older
+# schemas may still carry the plain unique constraint name.
+_PROMOCODE_CODE_CONSTRAINTS = frozenset({'ix_promocodes_code', 'promocodes_code_key'})
+
+
+def is_promocode_code_conflict(exc: IntegrityError) -> bool:
+    """Whether ``exc`` comes from the unique index on ``promocodes.code``.
+
+    Prefers asyncpg's ``constraint_name`` and falls back to the error text
+    (SQLite reports ``UNIQUE constraint failed: promocodes.code``).
+    """
+    orig = getattr(exc, 'orig', None)
+    cause = getattr(orig, '__cause__', None)
+    constraint = getattr(cause, 'constraint_name', None) or getattr(orig, 'constraint_name', None)
+    if constraint:
+        return constraint in _PROMOCODE_CODE_CONSTRAINTS
+    message = str(orig if orig is not None else exc)
+    return 'promocodes.code' in message or any(name in message for name in _PROMOCODE_CODE_CONSTRAINTS)
+
+
 async def check_user_promocode_usage(db: AsyncSession, user_id: int, promocode_id: int) -> bool:
     result = await db.execute(
         select(PromoCodeUse).where(and_(PromoCodeUse.user_id == user_id, PromoCodeUse.promocode_id == promocode_id))
@@ -149,6 +219,31 @@ async def get_promocodes_list(
     return result.scalars().all()
 
 
+async def get_promocodes_page_with_total(
+    db: AsyncSession, offset: int = 0, limit: int = 50, is_active: bool | None = None
+) -> tuple[list[PromoCode], int]:
+    """Page of promocodes plus the total matching count in one round-trip.
+
+    The window count is evaluated before LIMIT/OFFSET, so every row carries
+    the full count; only a page past the end needs a separate COUNT.
+    """
+    query = select(PromoCode, func.count().over().label('total')).options(
+        selectinload(PromoCode.uses), selectinload(PromoCode.promo_group)
+    )
+
+    if is_active is not None:
+        query = query.where(PromoCode.is_active == is_active)
+
+    query = query.order_by(PromoCode.created_at.desc()).offset(offset).limit(limit)
+
+    rows = (await db.execute(query)).all()
+    if rows:
+        return [row[0] for row in rows], int(rows[0].total)
+    if offset:
+        return [], await get_promocodes_count(db, is_active=is_active) or 0
+    return [], 0
+
+
 async def get_promocodes_count(db: AsyncSession, is_active: bool | None = None) -> int:
     query = select(func.count(PromoCode.id))
 
@@ -160,13 +255,16 @@ async def get_promocodes_count(db: AsyncSession, is_active: bool | None = None)
 
 
 async def update_promocode(db: AsyncSession, promocode: PromoCode, **kwargs) -> PromoCode:
-    for field, value in kwargs.items():
-        if hasattr(promocode, field):
-            setattr(promocode, field, value)
+    values = {field: value for field, value in kwargs.items() if field in PromoCode.__table__.c}
+    values['updated_at'] = datetime.now(UTC)
 
-    promocode.updated_at = datetime.now(UTC)
+    # UPDATE ... RETURNING hands back the stored row and refreshes the instance
+    # in the identity map, so no follow-up SELECT is needed.
+    result = await db.execute(
+        update(PromoCode).where(PromoCode.id == promocode.id).values(**values).returning(PromoCode)
+    )
+    promocode = result.scalar_one()
     await db.commit()
-    await db.refresh(promocode)
 
     return promocode
 
@@ -242,6 +340,7 @@ async def get_promocode_statistics(db: AsyncSession, promocode_id: int) -> dict:
     )
     recent_uses_data = recent_uses_result.all()
 
+    # Callers read these user_* fields directly, so set them on every use.
     recent_uses = []
     for use, user in recent_uses_data:
         use.user_username = user.username
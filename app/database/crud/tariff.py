@@ -35,14 +35,21 @@ async def get_all_tariffs(
     include_inactive: bool = False,
     offset: int = 0,
     limit: int | None = None,
+    order_by_tier_level: bool = False,
 ) -> list[Tariff]:
-    """Получает все тарифы с опциональной фильтрацией по активности."""
+    """Получает все тарифы с опциональной фильтрацией по активности.
+
+    order_by_tier_level: внутри одного display_order сортировать по tier_level.
+    """
     query = select(Tariff).options(selectinload(Tariff.allowed_promo_groups))
 
     if not include_inactive:
         query = query.where(Tariff.is_active.is_(True))
 
-    query = query.order_by(Tariff.display_order, Tariff.id)
+    if order_by_tier_level:
+        query = query.order_by(Tariff.display_order, Tariff.tier_level, Tariff.id)
+    else:
+        query = query.order_by(Tariff.display_order, Tariff.id)
 
     if offset:
         query = query.offset(offset)
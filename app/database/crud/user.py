@@ -4,7 +4,8 @@ import string
 from datetime import UTC, datetime, timedelta
 
 import structlog
-from sqlalchemy import and_, case, exists, func, nullslast, or_, select, text
+from sqlalchemy import Integer, and_, any_, bindparam, case, exists, func, nullslast, or_, select, text
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
@@ -111,6 +112,26 @@ async def get_user_by_id(db: AsyncSession, user_id: int) -> User | None:
     return user
 
 
+async def get_user_with_subscriptions(db: AsyncSession, user_id: int) -> User | None:
+    """Облегчённый вариант get_user_by_id: подгружает только подписки с тарифами и промогруппу.
+
+    Для обработчиков, которым не нужны referrer и user_promo_groups, — на два
+    selectin-запроса меньше.
+    """
+    if user_id < POSTGRES_INT4_MIN or user_id > POSTGRES_INT4_MAX:
+        return None
+
+    result = await db.execute(
+        select(User)
+        .options(
+            selectinload(User.subscriptions).selectinload(Subscription.tariff),
+            selectinload(User.promo_group),
+        )
+        .where(User.id == user_id)
+    )
+    return result.scalar_one_or_none()
+
+
 async def get_user_by_telegram_id(db: AsyncSession, telegram_id: int) -> User | None:
     result = await db.execute(
         select(User)
@@ -1142,10 +1163,17 @@ async def get_users_spending_stats(db: AsyncSession, user_ids: list[int]) -> dic
     if not user_ids:
         return {}
 
+    # На PostgreSQL передаём ID одним массивом: = ANY(:user_ids) даёт один и тот же
+    # текст запроса при любом размере страницы, и asyncpg переиспользует prepared statement.
+    if settings.is_postgresql():
+        user_filter = Transaction.user_id == any_(bindparam('user_ids', list(user_ids), type_=ARRAY(Integer)))
+    else:
+        user_filter = Transaction.user_id.in_(user_ids)
+
     stats_query = (
         select(*_build_spending_stats_select())
         .where(
-            Transaction.user_id.in_(user_ids),
+            user_filter,
             Transaction.is_completed.is_(True),
         )
         .group_by(Transaction.user_id)
@@ -1186,6 +1214,26 @@ async def get_referrals(db: AsyncSession, user_id: int) -> list[User]:
     return users
 
 
+async def get_referrals_page(db: AsyncSession, user_id: int, offset: int, limit: int) -> list[User]:
+    """Страница рефералов пользователя (новые первыми) с подписками, тарифами и промогруппой."""
+    result = await db.execute(
+        select(User)
+        .options(
+            selectinload(User.subscriptions).selectinload(Subscription.tariff),
+            selectinload(User.promo_group),
+        )
+        .where(User.referred_by_id == user_id)
+        .order_by(User.created_at.desc(), User.id.desc())
+        .offset(offset)
+        .limit(limit)
+    )
+    return list(result.scalars().all())
+
+
+async def count_referrals(db: AsyncSession, user_id: int) -> int:
+    return await db.scalar(select(func.count(User.id)).where(User.referred_by_id == user_id)) or 0
+
+
 async def get_users_for_promo_segment(db: AsyncSession, segment: str) -> list[User]:
     now = datetime.now(UTC)
 
@@ -1295,29 +1343,25 @@ async def delete_user(db: AsyncSession, user: User) -> bool:
 
 
 async def get_users_statistics(db: AsyncSession) -> dict:
-    total_result = await db.execute(select(func.count(User.id)))
-    total_users = total_result.scalar()
+    total_users = await db.scalar(select(func.count(User.id)))
 
-    active_result = await db.execute(select(func.count(User.id)).where(User.status == UserStatus.ACTIVE.value))
-    active_users = active_result.scalar()
+    active_users = await db.scalar(select(func.count(User.id)).where(User.status == UserStatus.ACTIVE.value))
 
-    today = datetime.now(UTC).date()
-    today_result = await db.execute(
+    now = datetime.now(UTC)
+    today = now.date()
+    new_today = await db.scalar(
         select(func.count(User.id)).where(and_(User.created_at >= today, User.status == UserStatus.ACTIVE.value))
     )
-    new_today = today_result.scalar()
 
-    week_ago = datetime.now(UTC) - timedelta(days=7)
-    week_result = await db.execute(
+    week_ago = now - timedelta(days=7)
+    new_week = await db.scalar(
         select(func.count(User.id)).where(and_(User.created_at >= week_ago, User.status == UserStatus.ACTIVE.value))
     )
-    new_week = week_result.scalar()
 
-    month_ago = datetime.now(UTC) - timedelta(days=30)
-    month_result = await db.execute(
+    month_ago = now - timedelta(days=30)
+    new_month = await db.scalar(
         select(func.count(User.id)).where(and_(User.created_at >= month_ago, User.status == UserStatus.ACTIVE.value))
     )
-    new_month = month_result.scalar()
 
     return {
         'total_users': total_users,
@@ -1590,6 +1634,37 @@ async def get_user_by_oauth_provider(db: AsyncSession, provider: str, provider_i
     return result.scalar_one_or_none()
 
 
+async def get_users_for_oauth_login(
+    db: AsyncSession, provider: str, provider_id: str, email: str | None
+) -> tuple[User | None, User | None]:
+    """Find the login candidates for an OAuth identity in a single round trip.
+
+    Returns ``(provider_user, email_user)``: the user already linked to
+    ``provider_id`` and another user owning ``email`` (case-insensitive).
+    ``email_user`` only matters when nothing is linked yet. Without an email
+    this is a plain provider lookup.
+    """
+    email_lower = email.strip().lower() if email and email.strip() else None
+    column_name = OAUTH_PROVIDER_COLUMNS.get(provider)
+    if not column_name or email_lower is None:
+        provider_user = await get_user_by_oauth_provider(db, provider, provider_id)
+        if provider_user or email_lower is None:
+            return provider_user, None
+        return None, await get_user_by_email(db, email_lower)
+
+    value: str | int = int(provider_id) if provider == 'vk' else provider_id
+    result = await db.execute(
+        select(User).where(or_(getattr(User, column_name) == value, func.lower(User.email) == email_lower))
+    )
+    provider_user = email_user = None
+    for user in result.scalars():
+        if getattr(user, column_name) == value:
+            provider_user = user
+        else:
+            email_user = user
+    return provider_user, email_user
+
+
 async def set_user_oauth_provider_id(db: AsyncSession, user: User, provider: str, provider_id: str) -> None:
     """Link an OAuth provider ID to an existing user."""
     column_name = OAUTH_PROVIDER_COLUMNS.get(provider)
@@ -73,6 +73,10 @@ _pg_connect_args = {
     },
     'command_timeout': 30,  # Уменьшен с 60, быстрее обнаруживать зависшие запросы
     'timeout': 10,  # Уменьшен с 60, быстрый провал при недоступности PostgreSQL
+    # Кеш prepared statements самого asyncpg и адаптера SQLAlchemy поверх него
+    # (по умолчанию по 100 — мало для всех запросов бота и кабинета)
+    'statement_cache_size': settings.DATABASE_STATEMENT_CACHE_SIZE,
+    'prepared_statement_cache_size': settings.DATABASE_STATEMENT_CACHE_SIZE,
 }
 
 engine = create_async_engine(
@@ -81,7 +85,7 @@ engine = create_async_engine(
     echo='debug' if settings.DEBUG else False,
     future=True,
     # Кеш скомпилированных запросов (правильное размещение)
-    query_cache_size=500,
+    query_cache_size=settings.DATABASE_QUERY_CACHE_SIZE,
     connect_args=_pg_connect_args if not IS_SQLITE else {},
     execution_options={
         'isolation_level': 'READ COMMITTED',
@@ -2086,6 +2086,7 @@ class Subscription(Base):
     __tablename__ = 'subscriptions'
     __table_args__ = (
         Index('ix_subscriptions_status_trial', 'status', 'is_trial'),
+        Index('ix_subscriptions_status_end_date', 'status', 'end_date', 'is_trial'),
         Index('ix_subscriptions_trial_created', 'is_trial', 'created_at'),
         Index('ix_subscriptions_user_id', 'user_id'),
         Index('ix_subscriptions_user_status', 'user_id', 'status'),
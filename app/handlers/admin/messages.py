@@ -1723,6 +1723,75 @@ async def get_target_users_count(db: AsyncSession, target: str) -> int:
     return 0
 
 
+def _build_filter_count_predicates(now: datetime) -> dict:
+    """Per-user predicates mirroring get_target_users_count for basic and custom_* targets."""
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    zero_traffic = or_(Subscription.traffic_used_gb == None, Subscription.traffic_used_gb <= 0)
+    is_active_sub = Subscription.status == SubscriptionStatus.ACTIVE.value
+
+    def has_subscription(*conditions):
+        return select(Subscription.id).where(Subscription.user_id == User.id, *conditions).correlate(User).exists()
+
+    has_active_sub = has_subscription(is_active_sub)
+    expired_statuses = [
+        SubscriptionStatus.EXPIRED.value,
+        SubscriptionStatus.DISABLED.value,
+        SubscriptionStatus.LIMITED.value,
+    ]
+
+    return {
+        'all': None,
+        'active': has_subscription(is_active_sub, Subscription.is_trial == False),
+        'trial': has_subscription(Subscription.is_trial == True),
+        'no': ~has_active_sub,
+        'expiring': has_subscription(
+            is_active_sub,
+            Subscription.end_date <= now + timedelta(days=3),
+            Subscription.end_date > now,
+        ),
+        'expired': and_(
+            ~has_active_sub,
+            or_(
+                has_subscription(
+                    or_(
+                        Subscription.status.in_(expired_statuses),
+                        and_(Subscription.end_date <= now, ~is_active_sub),
+                    )
+                ),
+                and_(~has_subscription(), User.has_had_paid_subscription == True),
+            ),
+        ),
+        'zero': has_subscription(is_active_sub, zero_traffic),
+        'active_zero': has_subscription(is_active_sub, Subscription.is_trial == False, zero_traffic),
+        'trial_zero': has_subscription(is_active_sub, Subscription.is_trial == True, zero_traffic),
+        'custom_today': User.created_at >= today,
+        'custom_week': User.created_at >= now - timedelta(days=7),
+        'custom_month': User.created_at >= now - timedelta(days=30),
+        'custom_active_today': User.last_activity >= today,
+        'custom_inactive_week': User.last_activity < now - timedelta(days=7),
+        'custom_inactive_month': User.last_activity < now - timedelta(days=30),
+        'custom_referrals': User.referred_by_id.isnot(None),
+        'custom_direct': User.referred_by_id.is_(None),
+    }
+
+
+async def get_all_filter_counts(db: AsyncSession) -> dict[str, int]:
+    """Считает всех получателей базовых и custom_* фильтров одним запросом.
+
+    Каждый фильтр — условная агрегация COUNT(*) FILTER (WHERE ...) по активным
+    пользователям, поэтому вместо отдельного COUNT на фильтр выполняется один
+    проход по users. Значения совпадают с get_target_users_count.
+    """
+    predicates = _build_filter_count_predicates(datetime.now(UTC))
+    columns = [
+        (func.count() if predicate is None else func.count().filter(predicate)).label(key)
+        for key, predicate in predicates.items()
+    ]
+    result = await db.execute(select(*columns).select_from(User).where(User.status == UserStatus.ACTIVE.value))
+    row = result.one()
+    return {key: int(row._mapping[key] or 0) for key in predicates}
+
+
 async def get_target_users(db: AsyncSession, target: str) -> list:
     # Загружаем всех активных пользователей батчами, чтобы не ограничиваться 10к
     users: list[User] = []
@@ -110,18 +110,19 @@ class BroadcastService:
         task_entry = self._tasks.get(broadcast_id)
         return bool(task_entry and not task_entry.task.done())
 
-    async def start_broadcast(self, broadcast_id: int, config: BroadcastConfig) -> None:
+    async def start_broadcast(self, broadcast_id: int, config: BroadcastConfig) -> bool:
+        """Запускает рассылку в фоне. False — запись сразу помечена как failed."""
         if self._bot is None:
             logger.error('Невозможно запустить рассылку : бот не инициализирован', broadcast_id=broadcast_id)
             await self._mark_failed(broadcast_id)
-            return
+            return False
 
         cancel_event = asyncio.Event()
 
         async with self._lock:
             if broadcast_id in self._tasks and not self._tasks[broadcast_id].task.done():
                 logger.warning('Рассылка уже запущена', broadcast_id=broadcast_id)
-                return
+                return True
 
             task = asyncio.create_task(
                 self._run_broadcast(broadcast_id, config, cancel_event),
@@ -130,6 +131,8 @@ class BroadcastService:
             self._tasks[broadcast_id] = _BroadcastTask(task=task, cancel_event=cancel_event)
             task.add_done_callback(lambda _: self._tasks.pop(broadcast_id, None))
 
+        return True
+
     async def request_stop(self, broadcast_id: int) -> bool:
         async with self._lock:
             task_entry = self._tasks.get(broadcast_id)
@@ -657,24 +660,27 @@ class EmailBroadcastService:
         task_entry = self._tasks.get(broadcast_id)
         return bool(task_entry and not task_entry.task.done())
 
-    async def start_broadcast(self, broadcast_id: int, config: EmailBroadcastConfig) -> None:
-        """Start email broadcast in background."""
+    async def start_broadcast(self, broadcast_id: int, config: EmailBroadcastConfig) -> bool:
+        """Start email broadcast in background.
+
+        Returns False when the broadcast could not be started and was marked as failed.
+        """
         if self._email_service is None:
             logger.error('Cannot start email broadcast : email service not initialized', broadcast_id=broadcast_id)
             await self._mark_failed(broadcast_id)
-            return
+            return False
 
         if not self._email_service.is_configured():
             logger.error('Cannot start email broadcast : SMTP not configured', broadcast_id=broadcast_id)
             await self._mark_failed(broadcast_id)
-            return
+            return False
 
         cancel_event = asyncio.Event()
 
         async with self._lock:
             if broadcast_id in self._tasks and not self._tasks[broadcast_id].task.done():
                 logger.warning('Email broadcast is already running', broadcast_id=broadcast_id)
-                return
+                return True
 
             task = asyncio.create_task(
                 self._run_broadcast(broadcast_id, config, cancel_event),
@@ -683,6 +689,8 @@ class EmailBroadcastService:
             self._tasks[broadcast_id] = _BroadcastTask(task=task, cancel_event=cancel_event)
             task.add_done_callback(lambda _: self._tasks.pop(broadcast_id, None))
 
+        return True
+
     async def request_stop(self, broadcast_id: int) -> bool:
         """Request to stop a running broadcast."""
         async with self._lock:
@@ -65,6 +65,21 @@ def _get_lifetime_traffic_bytes(panel_user: dict[str, Any]) -> int:
     return panel_user.get('lifetimeUsedTrafficBytes', 0)
 
 
+# Process-wide API client reused by hot admin paths. Keyed by the connection
+# settings, so a changed panel URL or key gets a fresh client.
+_shared_api: RemnaWaveAPI | None = None
+_shared_api_kwargs: dict | None = None
+_shared_api_lock = asyncio.Lock()
+
+
+async def close_shared_api_client() -> None:
+    """Close the shared RemnaWave API client, if one was opened."""
+    global _shared_api, _shared_api_kwargs
+    api, _shared_api, _shared_api_kwargs = _shared_api, None, None
+    if api is not None:
+        await api.__aexit__(None, None, None)
+
+
 _UUID_MAP_MISSING = object()
 _ATTR_NOT_CAPTURED = object()
 
@@ -247,6 +262,25 @@ class RemnaWaveService:
         async with api:
             yield api
 
+    async def get_shared_api_client(self) -> RemnaWaveAPI:
+        """Return the process-wide API client, opening it on first use.
+
+        Unlike ``get_api_client`` the client is not closed after use, so its
+        aiohttp session keeps connections to the panel alive between calls;
+        call ``close_shared_api_client()`` on shutdown to release them.
+        """
+        global _shared_api, _shared_api_kwargs
+        self._ensure_configured()
+        async with _shared_api_lock:
+            if _shared_api is None or _shared_api_kwargs != self._api_kwargs or _shared_api.session.closed:
+                stale = _shared_api
+                api = RemnaWaveAPI(**self._api_kwargs)
+                await api.__aenter__()
+                _shared_api, _shared_api_kwargs = api, dict(self._api_kwargs)
+                if stale is not None:
+                    await stale.__aexit__(None, None, None)
+            return _shared_api
+
     def _now_utc(self) -> datetime:
         """Возвращает текущее время в UTC без привязки к часовому поясу."""
         return datetime.now(self._utc_timezone)
@@ -8,6 +8,7 @@ import structlog
 from redis.exceptions import NoScriptError
 
 from app.config import settings
+from app.utils.ttl_cache import TTLCache
 
 
 logger = structlog.get_logger(__name__)
@@ -129,6 +130,56 @@ class CacheService:
             logger.error('Ошибка удаления ключей по шаблону', pattern=pattern, error=e)
             return 0
 
+    async def delete_pattern_scan(self, pattern: str, batch_size: int = 500) -> int:
+        """Delete keys matching ``pattern`` via incremental SCAN, in batches.
+
+        Unlike :meth:`delete_pattern` it never issues KEYS, which walks the
+        whole keyspace in one blocking call, so it is safe on hot write paths.
+        """
+        if not self._connected:
+            return 0
+
+        try:
+            deleted = 0
+            batch: list[bytes] = []
+            async for key in self.redis_client.scan_iter(match=pattern, count=batch_size):
+                batch.append(key)
+                if len(batch) >= batch_size:
+                    deleted += await self.redis_client.delete(*batch)
+                    batch.clear()
+            if batch:
+                deleted += await self.redis_client.delete(*batch)
+            return deleted
+        except Exception as e:
+            logger.error('Ошибка удаления ключей по шаблону через SCAN', pattern=pattern, error=e)
+            return 0
+
+    async def get_raw(self, key: str) -> bytes | None:
+        """Read a value stored with :meth:`set_raw`, without JSON decoding."""
+        if not self._connected:
+            return None
+
+        try:
+            return await self.redis_client.get(key)
+        except Exception as e:
+            logger.error('Ошибка получения из кеша', key=key, error=e)
+            return None
+
+    async def set_raw(self, key: str, value: bytes | str, expire: int | timedelta = None) -> bool:
+        """Store an already serialized value (e.g. a rendered JSON body) as is."""
+        if not self._connected:
+            return False
+
+        try:
+            if isinstance(expire, timedelta):
+                expire = int(expire.total_seconds())
+
+            await self.redis_client.set(key, value, ex=expire)
+            return True
+        except Exception as e:
+            logger.error('Ошибка записи в кеш', key=key, error=e)
+            return False
+
     async def exists(self, key: str) -> bool:
         if not self._connected:
             return False
@@ -450,62 +501,92 @@ class ChannelSubCache:
     Redis keys:
     - channel_sub:{telegram_id}:{channel_id} -> "1" or "0" (TTL 600s)
     - required_channels:active -> JSON list of active channels (TTL 60s)
+
+    Statuses are also mirrored in an in-process TTL cache so that the cabinet
+    auth dependency and the bot middleware don't pay a Redis round-trip on
+    every request. Non-members expire quickly so a fresh subscription is
+    picked up on retry.
     """
 
     SUB_TTL = 600  # 10 min -- individual user subscription status
     CHANNELS_TTL = 60  # 1 min -- list of required channels
+    LOCAL_MEMBER_TTL = 300  # 5 min -- in-process copy of a positive status
+    LOCAL_NON_MEMBER_TTL = 30  # 30 sec -- in-process copy of a negative status
+
+    _local_statuses = TTLCache(maxsize=50000, ttl=LOCAL_MEMBER_TTL)
+
+    @staticmethod
+    def _remember_local(telegram_id: int, channel_id: str, is_member: bool) -> None:
+        ttl = ChannelSubCache.LOCAL_MEMBER_TTL if is_member else ChannelSubCache.LOCAL_NON_MEMBER_TTL
+        ChannelSubCache._local_statuses.set((telegram_id, channel_id), is_member, ttl=ttl)
 
     @staticmethod
     async def get_sub_status(telegram_id: int, channel_id: str) -> bool | None:
         """Get subscription status from cache. None = cache miss."""
+        local = ChannelSubCache._local_statuses.get((telegram_id, channel_id))
+        if local is not None:
+            return local
+
         key = cache_key('channel_sub', telegram_id, channel_id)
         result = await cache.get(key)
         if result is None:
             return None
-        return result == 1
+        is_member = result == 1
+        ChannelSubCache._remember_local(telegram_id, channel_id, is_member)
+        return is_member
 
     @staticmethod
     async def get_sub_statuses(telegram_id: int, channel_ids: list[str]) -> dict[str, bool | None]:
         """Batch-fetch subscription statuses via Redis MGET (single round-trip).
 
         Returns {channel_id: True/False/None} where None = cache miss.
+        Statuses held in the in-process cache skip Redis entirely.
         Falls back to sequential gets if Redis pipeline is unavailable.
         """
         if not channel_ids:
             return {}
 
-        if not cache._connected or cache.redis_client is None:
-            return dict.fromkeys(channel_ids, None)
+        statuses: dict[str, bool | None] = {}
+        missing: list[str] = []
+        for ch_id in channel_ids:
+            local = ChannelSubCache._local_statuses.get((telegram_id, ch_id))
+            statuses[ch_id] = local
+            if local is None:
+                missing.append(ch_id)
 
-        keys = [cache_key('channel_sub', telegram_id, ch_id) for ch_id in channel_ids]
+        if not missing or not cache._connected or cache.redis_client is None:
+            return statuses
+
+        keys = [cache_key('channel_sub', telegram_id, ch_id) for ch_id in missing]
         try:
             raw_values = await cache.redis_client.mget(keys)
         except Exception as e:
             logger.warning('Redis MGET failed, falling back to sequential', error=str(e))
-            result: dict[str, bool | None] = {}
-            for ch_id in channel_ids:
-                result[ch_id] = await ChannelSubCache.get_sub_status(telegram_id, ch_id)
-            return result
+            for ch_id in missing:
+                statuses[ch_id] = await ChannelSubCache.get_sub_status(telegram_id, ch_id)
+            return statuses
 
-        statuses: dict[str, bool | None] = {}
-        for ch_id, raw in zip(channel_ids, raw_values, strict=True):
+        for ch_id, raw in zip(missing, raw_values, strict=True):
             if raw is None:
-                statuses[ch_id] = None
-            else:
-                try:
-                    parsed = json.loads(raw)
-                    statuses[ch_id] = parsed == 1
-                except (ValueError, TypeError):
-                    statuses[ch_id] = None
+                continue
+            try:
+                parsed = json.loads(raw)
+            except (ValueError, TypeError):
+                continue
+            is_member = parsed == 1
+            statuses[ch_id] = is_member
+            ChannelSubCache._remember_local(telegram_id, ch_id, is_member)
         return statuses
 
     @staticmethod
     async def set_sub_status(telegram_id: int, channel_id: str, is_member: bool) -> None:
+        ChannelSubCache._remember_local(telegram_id, channel_id, is_member)
         key = cache_key('channel_sub', telegram_id, channel_id)
         await cache.set(key, 1 if is_member else 0, expire=ChannelSubCache.SUB_TTL)
 
     @staticmethod
     async def invalidate_sub(telegram_id: int, channel_id: str) -> None:
+        ChannelSubCache._local_statuses.pop((telegram_id, channel_id), None)
         key = cache_key('channel_sub', telegram_id, channel_id)
         await cache.delete(key)
 
@@ -516,6 +597,8 @@ class ChannelSubCache:
         Uses multi-key DELETE (O(K)) instead of delete_pattern() which uses KEYS (O(N)).
         At 100k users * 5 channels = 500k keys, KEYS would block Redis for seconds.
         """
+        for ch_id in channel_ids:
+            ChannelSubCache._local_statuses.pop((telegram_id, ch_id), None)
         if not channel_ids or not cache._connected or not cache.redis_client:
             return
         keys = [cache_key('channel_sub', telegram_id, ch_id) for ch_id in channel_ids]
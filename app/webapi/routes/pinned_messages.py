@@ -8,7 +8,7 @@ from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy import func, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.bot_factory import create_bot
+from app.bot_factory import get_shared_bot
 from app.database.models import PinnedMessage
 from app.services.pinned_message_service import (
     broadcast_pinned_message,
@@ -49,8 +49,8 @@ def _serialize_pinned_message(msg: PinnedMessage) -> PinnedMessageResponse:
 
 
 def _get_bot() -> Bot:
-    """Создать экземпляр бота для API операций."""
-    return create_bot()
+    """Общий экземпляр бота для API операций (сессия закрывается при остановке)."""
+    return get_shared_bot()
 
 
 @router.get('', response_model=PinnedMessageListResponse)
@@ -4,16 +4,17 @@ from datetime import UTC, datetime
 from typing import Any
 
 from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database.crud.promocode import (
-    create_promocode,
+    create_promocode_if_code_free,
     delete_promocode,
-    get_promocode_by_code,
     get_promocode_by_id,
     get_promocode_statistics,
     get_promocodes_count,
     get_promocodes_list,
+    is_promocode_code_conflict,
     update_promocode,
 )
 from app.database.models import PromoCode, PromoCodeType, PromoCodeUse
@@ -68,12 +69,13 @@ def _serialize_promocode(promocode: PromoCode) -> PromoCodeResponse:
 
 
 def _serialize_recent_use(use: PromoCodeUse) -> PromoCodeRecentUse:
+    # get_promocode_statistics sets the user_* fields on every use it returns.
     return PromoCodeRecentUse(
         id=use.id,
         user_id=use.user_id,
-        user_username=getattr(use, 'user_username', None),
-        user_full_name=getattr(use, 'user_full_name', None),
-        user_telegram_id=getattr(use, 'user_telegram_id', None),
+        user_username=use.user_username,
+        user_full_name=use.user_full_name,
+        user_telegram_id=use.user_telegram_id,
         used_at=use.used_at,
     )
 
@@ -184,36 +186,25 @@ async def create_promocode_endpoint(
     normalized_valid_from = _normalize_datetime(payload.valid_from)
     normalized_valid_until = _normalize_datetime(payload.valid_until)
 
-    existing = await get_promocode_by_code(db, normalized_code)
-    if existing:
-        raise HTTPException(status.HTTP_400_BAD_REQUEST, 'Promo code with this code already exists')
-
     creator_id = payload.created_by if payload.created_by is not None and payload.created_by > 0 else None
 
     # 0 means unlimited — convert to large number for is_valid check (current_uses < max_uses)
     effective_max_uses = 999999 if payload.max_uses == 0 else payload.max_uses
 
-    promocode = await create_promocode(
+    promocode = await create_promocode_if_code_free(
         db,
         code=normalized_code,
         type=payload.type,
         balance_bonus_kopeks=payload.balance_bonus_kopeks,
         subscription_days=payload.subscription_days,
         max_uses=effective_max_uses,
+        valid_from=normalized_valid_from,
         valid_until=normalized_valid_until,
+        is_active=payload.is_active,
         created_by=creator_id,
     )
-
-    update_fields = {}
-    if normalized_valid_from is not None:
-        update_fields['valid_from'] = normalized_valid_from
-    if payload.is_active is not None and payload.is_active != promocode.is_active:
-        update_fields['is_active'] = payload.is_active
-    if normalized_valid_until is not None:
-        update_fields['valid_until'] = normalized_valid_until
-
-    if update_fields:
-        promocode = await update_promocode(db, promocode, **update_fields)
+    if promocode is None:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, 'Promo code with this code already exists')
 
     return _serialize_promocode(promocode)
 
@@ -234,12 +225,8 @@ async def update_promocode_endpoint(
     updates: dict[str, Any] = {}
 
     if payload.code is not None:
-        normalized_code = payload.code.strip().upper()
-        if normalized_code != promocode.code:
-            existing = await get_promocode_by_code(db, normalized_code)
-            if existing and existing.id != promocode_id:
-                raise HTTPException(status.HTTP_400_BAD_REQUEST, 'Promo code with this code already exists')
-        updates['code'] = normalized_code
+        # Duplicates are caught by the unique constraint on commit below.
+        updates['code'] = payload.code.strip().upper()
 
     if payload.type is not None:
         updates['type'] = payload.type.value
@@ -265,7 +252,13 @@ async def update_promocode_endpoint(
     if not updates:
         return _serialize_promocode(promocode)
 
-    promocode = await update_promocode(db, promocode, **updates)
+    try:
+        promocode = await update_promocode(db, promocode, **updates)
+    except IntegrityError as exc:
+        await db.rollback()
+        if 'code' in updates and is_promocode_code_conflict(exc):
+            raise HTTPException(status.HTTP_400_BAD_REQUEST, 'Promo code with this code already exists') from exc
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, 'Promo code update violates a database constraint') from exc
     return _serialize_promocode(promocode)
 
 
@@ -11,10 +11,13 @@ from fastapi import FastAPI, Response, status
 from fastapi.responses import JSONResponse, PlainTextResponse, RedirectResponse
 from fastapi.staticfiles import StaticFiles
 
+from app.bot_factory import close_shared_bot
 from app.cabinet.apple_iap import apple_iap_only_router
+from app.cabinet.auth.oauth_providers import close_oauth_http_client
 from app.config import settings
 from app.services.disposable_email_service import disposable_email_service
 from app.services.payment_service import PaymentService
+from app.services.remnawave_service import close_shared_api_client
 from app.webapi.docs import add_redoc_endpoint
 
 from . import payments, telegram
@@ -227,6 +230,19 @@ def create_unified_app(
 
     startup_handlers.append(disposable_email_service.start)
     shutdown_handlers.append(disposable_email_service.stop)
+    if settings.is_cabinet_enabled():
+        from app.cabinet.routes.admin_users import drain_panel_sync_tasks
+
+        # Фоновые синхронизации подписок с панелью ходят через общий клиент
+        # RemnaWave API — дожидаемся их до закрытия клиента.
+        shutdown_handlers.append(drain_panel_sync_tasks)
+    # Общий бот API-роутов (закреплённые сообщения и т.п.) держит keep-alive
+    # соединения к Telegram — закрываем его сессию вместе с веб-сервером.
+    shutdown_handlers.append(close_shared_bot)
+    # То же для общего клиента RemnaWave API, который переиспользуют админ-роуты.
+    shutdown_handlers.append(close_shared_api_client)
+    # И для keep-alive клиента OAuth-провайдеров (обмен кода и запрос профиля).
+    shutdown_handlers.append(close_oauth_http_client)
 
     miniapp_mounted, miniapp_path = _mount_miniapp_static(app)
     _mount_uploads_static(app)
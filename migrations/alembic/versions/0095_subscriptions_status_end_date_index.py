@@ -0,0 +1,66 @@
+"""composite index on subscriptions(status, end_date, is_trial)
+
+The admin users dashboard aggregates every subscription in one pass
+
+    SELECT count(*),
+           count(*) FILTER (WHERE status = 'active' AND end_date > $1),
+           count(*) FILTER (WHERE is_trial),
+           count(*) FILTER (WHERE status = 'expired' OR end_date <= $1)
+    FROM subscriptions
+
+and the expiry monitors filter on ``status = 'active' AND end_date <op> now``.
+Without an index covering these columns PostgreSQL has to walk the whole heap,
+including every historical subscription. With it the dashboard aggregate can
+plan as an index-only scan and the status + end_date range lookups stay
+O(log N).
+
+``CREATE INDEX CONCURRENTLY`` avoids an ``ACCESS EXCLUSIVE`` lock on
+``subscriptions`` during the build, as in 0080 and 0086.
+
+Revision ID: 0095
+Revises: 0094
+Create Date: 2026-10-16
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+revision: str = '0095'
+down_revision: Union[str, None] = '0094'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+INDEX_NAME = 'ix_subscriptions_status_end_date'
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    dialect_name = bind.dialect.name
+
+    if dialect_name == 'postgresql':
+        with op.get_context().autocommit_block():
+            op.execute(
+                f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {INDEX_NAME} '
+                'ON subscriptions (status, end_date, is_trial)'
+            )
+    else:
+        op.create_index(
+            INDEX_NAME,
+            'subscriptions',
+            ['status', 'end_date', 'is_trial'],
+            unique=False,
+        )
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    dialect_name = bind.dialect.name
+
+    if dialect_name == 'postgresql':
+        with op.get_context().autocommit_block():
+            op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {INDEX_NAME}')
+    else:
+        op.drop_index(INDEX_NAME, table_name='subscriptions')
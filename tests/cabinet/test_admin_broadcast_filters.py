@@ -0,0 +1,271 @@
+"""Tests for the aggregated queries behind the admin broadcast endpoints."""
+
+from __future__ import annotations
+
+from types import SimpleNamespace
+from typing import NamedTuple
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.cabinet.routes.admin_broadcasts import (
+    CUSTOM_FILTER_LABELS,
+    EMAIL_FILTER_LABELS,
+    FILTER_LABELS,
+    _get_active_tariffs_with_user_counts,
+    _get_tariff_ids,
+    _on_tariff_changed,
+    _validate_buttons,
+    _validate_target,
+    get_buttons,
+    get_email_filters,
+    get_filters,
+    invalidate_filters_cache,
+    list_broadcasts,
+)
+from app.cabinet.schemas.broadcasts import BroadcastButtonsResponse
+from app.handlers.admin.messages import get_all_filter_counts
+from app.keyboards.admin import BROADCAST_BUTTONS, DEFAULT_BROADCAST_BUTTONS
+
+
+@pytest.fixture(autouse=True)
+def _reset_filters_cache():
+    _on_tariff_changed(None, None, None)
+    yield
+    _on_tariff_changed(None, None, None)
+
+
+class _BroadcastRow(NamedTuple):
+    broadcast: object
+    total: int
+
+
+def _result_row(values: dict[str, int]) -> MagicMock:
+    result = MagicMock()
+    result.one.return_value = SimpleNamespace(_mapping=values)
+    return result
+
+
+@pytest.mark.asyncio
+async def test_all_filter_counts_use_single_conditional_aggregate() -> None:
+    keys = [*FILTER_LABELS, *CUSTOM_FILTER_LABELS]
+    db = AsyncMock()
+    db.execute = AsyncMock(return_value=_result_row({key: index for index, key in enumerate(keys)}))
+
+    counts = await get_all_filter_counts(db)
+
+    db.execute.assert_awaited_once()
+    assert counts == {key: index for index, key in enumerate(keys)}
+
+    sql = str(db.execute.await_args.args[0].compile(dialect=postgresql.dialect()))
+    assert sql.count('FILTER (WHERE') == len(keys) - 1  # 'all' is a plain COUNT(*)
+
+
+@pytest.mark.asyncio
+async def test_get_filters_reads_counts_from_aggregate() -> None:
+    counts = dict.fromkeys([*FILTER_LABELS, *CUSTOM_FILTER_LABELS], 7)
+    db = AsyncMock()
+    with (
+        patch('app.cabinet.routes.admin_broadcasts.get_all_filter_counts', AsyncMock(return_value=counts)),
+        patch('app.cabinet.routes.admin_broadcasts.get_target_users_count', AsyncMock()) as per_filter,
+        patch('app.cabinet.routes.admin_broadcasts._get_active_tariffs_with_user_counts', AsyncMock(return_value=[])),
+    ):
+        response = await get_filters(admin=MagicMock(), db=db)
+
+    per_filter.assert_not_awaited()
+    assert [f.key for f in response.filters] == list(FILTER_LABELS)
+    assert [f.key for f in response.custom_filters] == list(CUSTOM_FILTER_LABELS)
+    assert all(f.count == 7 for f in [*response.filters, *response.custom_filters])
+
+
+@pytest.mark.asyncio
+async def test_get_filters_serves_cached_payload_until_invalidated() -> None:
+    counts = dict.fromkeys([*FILTER_LABELS, *CUSTOM_FILTER_LABELS], 1)
+    aggregate = AsyncMock(return_value=counts)
+    db = AsyncMock()
+    with (
+        patch('app.cabinet.routes.admin_broadcasts.get_all_filter_counts', aggregate),
+        patch('app.cabinet.routes.admin_broadcasts._get_active_tariffs_with_user_counts', AsyncMock(return_value=[])),
+    ):
+        first = await get_filters(admin=MagicMock(), db=db)
+        second = await get_filters(admin=MagicMock(), db=db)
+        invalidate_filters_cache()
+        await get_filters(admin=MagicMock(), db=db)
+
+    assert second is first
+    assert aggregate.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_get_filters_falls_back_to_per_filter_counts() -> None:
+    async def per_filter(db, key: str) -> int:
+        if key == 'trial':
+            raise RuntimeError('broken predicate')
+        return 3
+
+    db = AsyncMock()
+    with (
+        patch(
+            'app.cabinet.routes.admin_broadcasts.get_all_filter_counts',
+            AsyncMock(side_effect=RuntimeError('db down')),
+        ),
+        patch('app.cabinet.routes.admin_broadcasts.get_target_users_count', per_filter),
+        patch('app.cabinet.routes.admin_broadcasts._get_active_tariffs_with_user_counts', AsyncMock(return_value=[])),
+    ):
+        response = await get_filters(admin=MagicMock(), db=db)
+
+    assert {f.key: f.count for f in response.filters} == {key: 0 if key == 'trial' else 3 for key in FILTER_LABELS}
+    assert all(f.count == 3 for f in response.custom_filters)
+
+
+@pytest.mark.asyncio
+async def test_get_filters_does_not_cache_failed_counts() -> None:
+    aggregate = AsyncMock(side_effect=RuntimeError('db down'))
+    db = AsyncMock()
+    with (
+        patch('app.cabinet.routes.admin_broadcasts.get_all_filter_counts', aggregate),
+        patch(
+            'app.cabinet.routes.admin_broadcasts.get_target_users_count',
+            AsyncMock(side_effect=RuntimeError('db down')),
+        ),
+        patch('app.cabinet.routes.admin_broadcasts._get_active_tariffs_with_user_counts', AsyncMock(return_value=[])),
+    ):
+        await get_filters(admin=MagicMock(), db=db)
+        await get_filters(admin=MagicMock(), db=db)
+
+    assert aggregate.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_email_filters_count_concurrently_with_own_sessions() -> None:
+    sessions: list[object] = []
+
+    class _Session:
+        async def __aenter__(self):
+            sessions.append(self)
+            return self
+
+        async def __aexit__(self, *exc_info):
+            return False
+
+    async def fake_count(session, key: str) -> int:
+        if key == 'email_only':
+            raise RuntimeError('boom')
+        return len(key)
+
+    with (
+        patch('app.cabinet.routes.admin_broadcasts.AsyncSessionLocal', _Session),
+        patch('app.cabinet.routes.admin_broadcasts._get_email_filter_count', fake_count),
+    ):
+        response = await get_email_filters(admin=MagicMock())
+
+    assert len(sessions) == len(EMAIL_FILTER_LABELS)
+    assert {f.key: f.count for f in response.filters} == {
+        key: 0 if key == 'email_only' else len(key) for key in EMAIL_FILTER_LABELS
+    }
+    assert response.total_with_email == len('all_email')
+
+
+@pytest.mark.asyncio
+async def test_tariffs_and_user_counts_fetched_in_one_query() -> None:
+    tariff_a = SimpleNamespace(id=1, name='A')
+    tariff_b = SimpleNamespace(id=2, name='B')
+    result = MagicMock()
+    result.all.return_value = [(tariff_a, 0), (tariff_b, 5)]
+    db = AsyncMock()
+    db.execute = AsyncMock(return_value=result)
+
+    rows = await _get_active_tariffs_with_user_counts(db)
+
+    db.execute.assert_awaited_once()
+    assert rows == [(tariff_a, 0), (tariff_b, 5)]
+    sql = str(db.execute.await_args.args[0].compile(dialect=postgresql.dialect()))
+    assert 'LEFT OUTER JOIN' in sql
+    assert 'coalesce' in sql
+
+
+@pytest.mark.asyncio
+async def test_tariff_ids_cached_until_tariff_changes() -> None:
+    result = MagicMock()
+    result.all.return_value = [(1,), (2,)]
+    db = AsyncMock()
+    db.execute = AsyncMock(return_value=result)
+
+    assert await _get_tariff_ids(db) == frozenset({1, 2})
+    assert await _get_tariff_ids(db) == frozenset({1, 2})
+    assert db.execute.await_count == 1
+
+    _on_tariff_changed(None, None, None)
+    await _get_tariff_ids(db)
+    assert db.execute.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_list_broadcasts_reads_total_from_window_count() -> None:
+    result = MagicMock()
+    result.all.return_value = [_BroadcastRow('first', 42), _BroadcastRow('second', 42)]
+    db = AsyncMock()
+    db.execute = AsyncMock(return_value=result)
+
+    with (
+        patch('app.cabinet.routes.admin_broadcasts._serialize_broadcast', side_effect=lambda b: b),
+        patch('app.cabinet.routes.admin_broadcasts.BroadcastListResponse', SimpleNamespace),
+    ):
+        response = await list_broadcasts(admin=MagicMock(), db=db, limit=2, offset=0)
+
+    db.execute.assert_awaited_once()
+    db.scalar.assert_not_awaited()
+    assert response.items == ['first', 'second']
+    assert response.total == 42
+    sql = str(db.execute.await_args.args[0].compile(dialect=postgresql.dialect()))
+    assert 'count(*) OVER ()' in sql
+
+
+@pytest.mark.asyncio
+async def test_list_broadcasts_counts_separately_past_last_page() -> None:
+    result = MagicMock()
+    result.all.return_value = []
+    db = AsyncMock()
+    db.execute = AsyncMock(return_value=result)
+    db.scalar = AsyncMock(return_value=3)
+
+    response = await list_broadcasts(admin=MagicMock(), db=db, limit=20, offset=40)
+
+    assert response.total == 3
+    assert response.items == []
+
+
+@pytest.mark.parametrize(
+    ('target', 'expected'),
+    [
+        ('all', True),
+        ('custom_today', True),
+        ('tariff_2', True),
+        ('tariff_3', False),
+        ('tariff_', False),
+        ('tariff_abc', False),
+        ('tariff_2_extra', False),
+        ('unknown', False),
+    ],
+)
+def test_validate_target(target: str, expected: bool) -> None:
+    assert _validate_target(target, frozenset({1, 2})) is expected
+
+
+def test_validate_buttons() -> None:
+    assert _validate_buttons([]) is True
+    assert _validate_buttons(['home', 'home']) is True
+    assert _validate_buttons(['home', 'missing']) is False
+
+
+@pytest.mark.asyncio
+async def test_buttons_payload_is_prerendered() -> None:
+    first = await get_buttons(admin=MagicMock())
+    second = await get_buttons(admin=MagicMock())
+
+    assert first.body == second.body
+    assert first.media_type == 'application/json'
+    payload = BroadcastButtonsResponse.model_validate_json(first.body)
+    assert [button.key for button in payload.buttons] == list(BROADCAST_BUTTONS)
+    assert {button.key for button in payload.buttons if button.default} == set(DEFAULT_BROADCAST_BUTTONS)
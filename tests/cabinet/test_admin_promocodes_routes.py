@@ -0,0 +1,409 @@
+"""Tests for the cabinet admin promocode and promo-group routes."""
+
+from __future__ import annotations
+
+import json
+from datetime import UTC, datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import NamedTuple
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import IntegrityError
+
+from app.cabinet.routes.admin_promocodes import (
+    PromoCodeCreateRequest,
+    PromoCodeUpdateRequest,
+    _normalize_datetime,
+    _normalize_period_discounts,
+    create_promocode_endpoint,
+    get_promo_group,
+    get_promocode,
+    list_promo_groups,
+    list_promocodes,
+    update_promocode_endpoint,
+)
+from app.database.crud.promo_group import get_promo_groups_page_with_total
+from app.database.crud.promocode import (
+    create_promocode_if_code_free,
+    get_promocodes_page_with_total,
+    update_promocode,
+)
+from app.database.models import PromoCodeType
+
+
+_NOW = datetime(2026, 1, 1, tzinfo=UTC)
+
+
+class _WindowRow(NamedTuple):
+    promocode: object
+    total: int
+
+
+class _Session:
+    opened: list[_Session] = []
+
+    async def __aenter__(self):
+        self.opened.append(self)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+def _promocode(**overrides) -> SimpleNamespace:
+    fields = {
+        'id': 1,
+        'code': 'WELCOME',
+        'type': PromoCodeType.BALANCE.value,
+        'balance_bonus_kopeks': 15050,
+        'subscription_days': 0,
+        'max_uses': 10,
+        'current_uses': 2,
+        'uses_left': 8,
+        'is_active': True,
+        'is_valid': True,
+        'first_purchase_only': False,
+        'valid_from': _NOW,
+        'valid_until': None,
+        'promo_group_id': None,
+        'tariff_id': None,
+        'created_by': 5,
+        'created_at': _NOW,
+        'updated_at': _NOW,
+    }
+    fields.update(overrides)
+    return SimpleNamespace(**fields)
+
+
+def _promo_group(**overrides) -> SimpleNamespace:
+    fields = {
+        'id': 3,
+        'name': 'VIP',
+        'server_discount_percent': 10,
+        'traffic_discount_percent': 0,
+        'device_discount_percent': 0,
+        'period_discounts': {'30': '5'},
+        'auto_assign_total_spent_kopeks': None,
+        'apply_discounts_to_addons': True,
+        'is_default': False,
+        'created_at': _NOW,
+        'updated_at': None,
+    }
+    fields.update(overrides)
+    return SimpleNamespace(**fields)
+
+
+@pytest.mark.asyncio
+async def test_list_promocodes_returns_prerendered_json() -> None:
+    with patch(
+        'app.cabinet.routes.admin_promocodes.get_promocodes_page_with_total',
+        AsyncMock(return_value=([_promocode()], 1)),
+    ):
+        response = await list_promocodes(admin=MagicMock(), db=AsyncMock(), limit=50, offset=0, is_active=None)
+
+    assert response.media_type == 'application/json'
+    payload = json.loads(response.body)
+    assert payload['total'] == 1
+    assert payload['items'][0]['code'] == 'WELCOME'
+    assert payload['items'][0]['type'] == PromoCodeType.BALANCE.value
+    assert payload['items'][0]['balance_bonus_rubles'] == 150.5
+
+
+@pytest.mark.asyncio
+async def test_get_promocode_merges_statistics() -> None:
+    stats = {
+        'total_uses': 2,
+        'today_uses': 1,
+        'recent_uses': [
+            SimpleNamespace(
+                id=9,
+                user_id=4,
+                user_username=None,
+                user_full_name='Ann',
+                user_telegram_id=77,
+                used_at=_NOW,
+            )
+        ],
+    }
+    with (
+        patch('app.cabinet.utils.route_helpers.AsyncSessionLocal', _Session),
+        patch('app.cabinet.routes.admin_promocodes.get_promocode_by_id', AsyncMock(return_value=_promocode())),
+        patch('app.cabinet.routes.admin_promocodes.get_promocode_statistics', AsyncMock(return_value=stats)),
+    ):
+        response = await get_promocode(promocode_id=1, admin=MagicMock(), db=AsyncMock())
+
+    payload = json.loads(response.body)
+    assert payload['code'] == 'WELCOME'
+    assert payload['total_uses'] == 2
+    assert payload['today_uses'] == 1
+    assert payload['recent_uses'][0]['user_id'] == 4
+    assert payload['recent_uses'][0]['user_username'] is None
+    assert payload['recent_uses'][0]['user_telegram_id'] == 77
+
+
+@pytest.mark.asyncio
+async def test_list_promo_groups_returns_prerendered_json() -> None:
+    with patch(
+        'app.cabinet.routes.admin_promocodes.get_promo_groups_page_with_total',
+        AsyncMock(return_value=([(_promo_group(), 4)], 1)),
+    ):
+        response = await list_promo_groups(admin=MagicMock(), db=AsyncMock(), limit=50, offset=0)
+
+    payload = json.loads(response.body)
+    assert payload['total'] == 1
+    assert payload['items'][0]['members_count'] == 4
+    assert payload['items'][0]['period_discounts'] == {'30': 5}
+
+
+@pytest.mark.asyncio
+async def test_get_promo_group_fetches_members_count_in_same_query() -> None:
+    group = _promo_group()
+    result = MagicMock()
+    result.one_or_none.return_value = (group, 6)
+    db = AsyncMock()
+    db.execute = AsyncMock(return_value=result)
+
+    response = await get_promo_group(group_id=3, admin=MagicMock(), db=db)
+
+    db.execute.assert_awaited_once()
+    assert json.loads(response.body)['members_count'] == 6
+    sql = str(db.execute.await_args.args[0].compile(dialect=postgresql.dialect()))
+    assert '(SELECT count(users.id)' in sql
+
+
+@pytest.mark.asyncio
+async def test_promocodes_page_reads_total_from_window_count() -> None:
+    result = MagicMock()
+    result.all.return_value = [_WindowRow('first', 12), _WindowRow('second', 12)]
+    db = AsyncMock()
+    db.execute = AsyncMock(return_value=result)
+
+    promocodes, total = await get_promocodes_page_with_total(db, offset=0, limit=2, is_active=True)
+
+    db.execute.assert_awaited_once()
+    assert promocodes == ['first', 'second']
+    assert total == 12
+    sql = str(db.execute.await_args.args[0].compile(dialect=postgresql.dialect()))
+    assert 'count(*) OVER ()' in sql
+
+
+@pytest.mark.asyncio
+async def test_promo_groups_page_counts_members_in_one_grouped_query() -> None:
+    group = _promo_group()
+    result = MagicMock()
+    result.all.return_value = [(group, 4, 1)]
+    db = AsyncMock()
+    db.execute = AsyncMock(return_value=result)
+
+    groups, total = await get_promo_groups_page_with_total(db, offset=0, limit=20)
+
+    db.execute.assert_awaited_once()
+    assert groups == [(group, 4)]
+    assert total == 1
+    sql = str(db.execute.await_args.args[0].compile(dialect=postgresql.dialect()))
+    assert 'LEFT OUTER JOIN users' in sql
+    assert 'GROUP BY promo_groups.id' in sql
+
+
+@pytest.mark.asyncio
+async def test_promo_groups_page_counts_separately_past_last_page() -> None:
+    empty = MagicMock()
+    empty.all.return_value = []
+    counted = MagicMock()
+    counted.scalar_one.return_value = 3
+    db = AsyncMock()
+    db.execute = AsyncMock(side_effect=[empty, counted])
+
+    groups, total = await get_promo_groups_page_with_total(db, offset=40, limit=20)
+
+    assert groups == []
+    assert total == 3
+
+
+@pytest.mark.asyncio
+async def test_create_promocode_inserts_final_values_at_once() -> None:
+    payload = PromoCodeCreateRequest(
+        code=' spring ',
+        type=PromoCodeType.BALANCE,
+        balance_bonus_kopeks=1000,
+        valid_from=_NOW,
+        is_active=False,
+        first_purchase_only=True,
+        promo_group_id=3,
+    )
+    create = AsyncMock(return_value=_promocode(code='SPRING'))
+    update = AsyncMock()
+    with (
+        patch('app.cabinet.routes.admin_promocodes.create_promocode_if_code_free', create),
+        patch('app.cabinet.routes.admin_promocodes.update_promocode', update),
+    ):
+        response = await create_promocode_endpoint(payload=payload, admin=SimpleNamespace(id=5), db=AsyncMock())
+
+    assert response.status_code == 201
+    update.assert_not_awaited()
+    kwargs = create.await_args.kwargs
+    assert kwargs['code'] == 'SPRING'
+    assert kwargs['valid_from'] == _NOW
+    assert kwargs['is_active'] is False
+    assert kwargs['first_purchase_only'] is True
+    assert kwargs['promo_group_id'] == 3
+
+
+@pytest.mark.asyncio
+async def test_create_promocode_rejects_taken_code() -> None:
+    payload = PromoCodeCreateRequest(code='SPRING', type=PromoCodeType.BALANCE, balance_bonus_kopeks=1000)
+    with (
+        patch('app.cabinet.routes.admin_promocodes.create_promocode_if_code_free', AsyncMock(return_value=None)),
+        pytest.raises(HTTPException) as exc_info,
+    ):
+        await create_promocode_endpoint(payload=payload, admin=SimpleNamespace(id=5), db=AsyncMock())
+
+    assert exc_info.value.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_create_promocode_if_code_free_uses_on_conflict() -> None:
+    result = MagicMock()
+    result.scalar_one_or_none.return_value = None
+    db = AsyncMock()
+    db.execute = AsyncMock(return_value=result)
+
+    created = await create_promocode_if_code_free(db, code='spring', type=PromoCodeType.BALANCE)
+
+    assert created is None
+    db.execute.assert_awaited_once()
+    sql = str(db.execute.await_args.args[0].compile(dialect=postgresql.dialect()))
+    assert 'ON CONFLICT (code) DO NOTHING' in sql
+    assert 'RETURNING' in sql
+
+
+@pytest.mark.asyncio
+async def test_list_promocodes_serves_cached_json() -> None:
+    fake_cache = SimpleNamespace(get_raw=AsyncMock(return_value=b'{"items": [], "total": 0}'), set_raw=AsyncMock())
+    page = AsyncMock()
+    with (
+        patch('app.cabinet.routes.admin_promocodes.cache', fake_cache),
+        patch('app.cabinet.routes.admin_promocodes.get_promocodes_page_with_total', page),
+    ):
+        response = await list_promocodes(admin=MagicMock(), db=AsyncMock(), limit=50, offset=0, is_active=True)
+
+    page.assert_not_awaited()
+    fake_cache.get_raw.assert_awaited_once_with('admin:promocodes:list:v2:50:0:True')
+    assert json.loads(response.body) == {'items': [], 'total': 0}
+
+
+@pytest.mark.asyncio
+async def test_list_promocodes_stores_rendered_json_on_miss() -> None:
+    fake_cache = SimpleNamespace(get_raw=AsyncMock(return_value=None), set_raw=AsyncMock())
+    with (
+        patch('app.cabinet.routes.admin_promocodes.cache', fake_cache),
+        patch(
+            'app.cabinet.routes.admin_promocodes.get_promocodes_page_with_total',
+            AsyncMock(return_value=([], 0)),
+        ),
+    ):
+        response = await list_promocodes(admin=MagicMock(), db=AsyncMock(), limit=50, offset=0, is_active=None)
+
+    key, body, ttl = fake_cache.set_raw.await_args.args
+    assert key == 'admin:promocodes:list:v2:50:0:None'
+    assert body == response.body.decode()
+    assert ttl == 30
+
+
+@pytest.mark.parametrize(
+    ('raw', 'expected'),
+    [
+        (None, {}),
+        ([], {}),
+        ({'30': 5, 90: '10'}, {30: 5, 90: 10}),
+        ({'30': 5, 'bad': 1, '60': None}, {30: 5}),
+    ],
+)
+def test_normalize_period_discounts(raw, expected) -> None:
+    assert _normalize_period_discounts(SimpleNamespace(period_discounts=raw)) == expected
+
+
+@pytest.mark.asyncio
+async def test_empty_promocode_patch_skips_the_write() -> None:
+    update = AsyncMock()
+    with (
+        patch('app.cabinet.routes.admin_promocodes.get_promocode_by_id', AsyncMock(return_value=_promocode())),
+        patch('app.cabinet.routes.admin_promocodes.update_promocode', update),
+    ):
+        response = await update_promocode_endpoint(
+            promocode_id=1, payload=PromoCodeUpdateRequest(), admin=MagicMock(), db=AsyncMock()
+        )
+
+    update.assert_not_awaited()
+    assert json.loads(response.body)['code'] == 'WELCOME'
+
+
+def test_normalize_datetime() -> None:
+    naive = datetime(2026, 1, 1, 12)
+    shifted = datetime(2026, 1, 1, 15, tzinfo=timezone(timedelta(hours=3)))
+
+    assert _normalize_datetime(None) is None
+    assert _normalize_datetime(naive) is naive
+    assert _normalize_datetime(shifted) == datetime(2026, 1, 1, 12, tzinfo=UTC)
+    assert _normalize_datetime(shifted).tzinfo is UTC
+
+
+@pytest.mark.asyncio
+async def test_update_promocode_returns_row_without_refresh() -> None:
+    updated = _promocode(code='RENAMED')
+    result = MagicMock()
+    result.scalar_one.return_value = updated
+    db = AsyncMock()
+    db.execute = AsyncMock(return_value=result)
+
+    promocode = await update_promocode(db, _promocode(), code='RENAMED', is_valid=False)
+
+    assert promocode is updated
+    db.refresh.assert_not_awaited()
+    db.commit.assert_awaited_once()
+    sql = str(db.execute.await_args.args[0].compile(dialect=postgresql.dialect()))
+    assert sql.startswith('UPDATE promocodes SET code=')
+    assert 'is_valid' not in sql
+    assert 'RETURNING' in sql
+
+
+async def _failed_update_error(payload: PromoCodeUpdateRequest, error_text: str) -> HTTPException:
+    failing = AsyncMock(side_effect=IntegrityError('UPDATE promocodes', {}, Exception(error_text)))
+    with (
+        patch('app.cabinet.routes.admin_promocodes.get_promocode_by_id', AsyncMock(return_value=_promocode())),
+        patch('app.cabinet.routes.admin_promocodes.update_promocode', failing),
+        pytest.raises(HTTPException) as exc_info,
+    ):
+        await update_promocode_endpoint(promocode_id=1, payload=payload, admin=MagicMock(), db=AsyncMock())
+    return exc_info.value
+
+
+@pytest.mark.asyncio
+async def test_update_promocode_reports_taken_code() -> None:
+    error = await _failed_update_error(
+        PromoCodeUpdateRequest(code='spring'), 'duplicate key value violates unique constraint "ix_promocodes_code"'
+    )
+
+    assert error.status_code == 400
+    assert error.detail == 'Promo code with this code already exists'
+
+
+@pytest.mark.asyncio
+async def test_update_promocode_names_missing_reference() -> None:
+    error = await _failed_update_error(
+        PromoCodeUpdateRequest(tariff_id=99, promo_group_id=3),
+        'violates foreign key constraint "promocodes_tariff_id_fkey"',
+    )
+
+    assert error.status_code == 400
+    assert error.detail == 'Tariff not found'
+
+
+@pytest.mark.asyncio
+async def test_update_promocode_fk_error_is_not_a_code_conflict_without_code() -> None:
+    error = await _failed_update_error(PromoCodeUpdateRequest(promo_group_id=3), 'FOREIGN KEY constraint failed')
+
+    assert error.detail == 'Promo group not found'
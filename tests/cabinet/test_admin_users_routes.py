@@ -0,0 +1,939 @@
+"""Tests for the cabinet admin user routes."""
+
+from __future__ import annotations
+
+import asyncio
+from datetime import UTC, datetime, timedelta
+from types import SimpleNamespace
+from typing import NamedTuple
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import IntegrityError
+
+from app.cabinet.routes.admin_users import (
+    _build_subscription_info,
+    _build_subscriptions_info,
+    _build_user_list_item,
+    _disable_panel_users,
+    _panel_sync_tasks,
+    _period_prices_info,
+    _schedule_panel_sync,
+    _stats_cache,
+    _sync_subscription_to_panel_in_background,
+    delete_user,
+    drain_panel_sync_tasks,
+    get_user_detail,
+    get_user_referrals,
+    get_user_sync_status,
+    get_user_transactions,
+    get_users_stats,
+    list_users,
+    reset_user_subscription,
+    sync_user_from_panel,
+    sync_user_to_panel,
+    update_user_promo_group,
+    update_user_status,
+    update_user_subscription,
+)
+from app.cabinet.schemas.users import (
+    DeleteUserRequest,
+    ResetSubscriptionRequest,
+    SortByEnum,
+    SyncFromPanelRequest,
+    SyncFromPanelResponse,
+    SyncToPanelRequest,
+    SyncToPanelResponse,
+    UpdatePromoGroupRequest,
+    UpdateSubscriptionRequest,
+    UpdateUserStatusRequest,
+    UserDetailResponse,
+    UserListItem,
+    UsersListResponse,
+    UsersStatsResponse,
+    UserStatusEnum,
+    UserSubscriptionInfo,
+)
+from app.config import Settings
+
+
+_NOW = datetime(2026, 1, 1, tzinfo=UTC)
+_STATISTICS = {
+    'total_users': 10,
+    'active_users': 8,
+    'blocked_users': 2,
+    'new_today': 1,
+    'new_week': 2,
+    'new_month': 3,
+}
+
+
+@pytest.fixture(autouse=True)
+def _reset_stats_cache():
+    _stats_cache.clear()
+    yield
+    _stats_cache.clear()
+
+
+def _subscription(**overrides) -> SimpleNamespace:
+    values = {
+        'id': 5,
+        'status': 'active',
+        'is_active': True,
+        'is_trial': False,
+        'start_date': _NOW - timedelta(days=10),
+        'end_date': datetime.now(UTC) + timedelta(days=3, hours=1),
+        'traffic_limit_gb': 100,
+        'traffic_used_gb': 12.5,
+        'device_limit': 3,
+        'tariff_id': 2,
+        'tariff': SimpleNamespace(name='Pro'),
+        'autopay_enabled': True,
+    }
+    values.update(overrides)
+    return SimpleNamespace(**values)
+
+
+def _user(**overrides) -> SimpleNamespace:
+    values = {
+        'id': 1,
+        'telegram_id': 100,
+        'username': 'alice',
+        'first_name': 'Alice',
+        'last_name': None,
+        'full_name': 'Alice',
+        'status': 'active',
+        'balance_kopeks': 1500,
+        'balance_rubles': 15.0,
+        'created_at': _NOW,
+        'last_activity': None,
+        'subscriptions': [_subscription()],
+        'promo_group_id': 7,
+        'promo_group': SimpleNamespace(name='VIP'),
+        'has_restrictions': False,
+        'restriction_topup': False,
+        'restriction_subscription': False,
+    }
+    values.update(overrides)
+    return SimpleNamespace(**values)
+
+
+def test_build_user_list_item_serializes_trusted_rows() -> None:
+    item = _build_user_list_item(_user(), {1: {'total_spent': 900, 'purchase_count': 2}})
+
+    assert isinstance(item, UserListItem)
+    payload = item.model_dump()
+    assert payload['tariff_name'] == 'Pro'
+    assert payload['promo_group_name'] == 'VIP'
+    assert payload['days_remaining'] == 3
+    assert payload['total_spent_kopeks'] == 900
+    assert [s['id'] for s in payload['subscriptions']] == [5]
+    assert UserListItem.model_validate(payload) == item
+
+
+def test_build_user_list_item_counts_days_from_given_now() -> None:
+    subscription = _subscription(end_date=_NOW + timedelta(days=5, hours=2))
+
+    item = _build_user_list_item(_user(subscriptions=[subscription]), {}, _NOW)
+
+    assert item.days_remaining == 5
+    assert item.subscriptions[0].days_remaining == 5
+    assert _build_subscription_info(subscription, now=_NOW + timedelta(days=6)).is_active is False
+
+
+def test_build_user_list_item_fills_defaults_without_subscription() -> None:
+    item = _build_user_list_item(_user(subscriptions=[], promo_group=None))
+
+    assert item.has_subscription is False
+    assert item.subscriptions == []
+    assert item.total_spent_kopeks == 0
+    assert item.promo_group_name is None
+
+
+def test_build_subscription_info_keeps_construct_defaults() -> None:
+    info = _build_subscription_info(_subscription(), tariff_name='Pro')
+
+    assert isinstance(info, UserSubscriptionInfo)
+    assert info.is_active is True
+    assert info.purchased_traffic_gb == 0
+    assert info.traffic_purchases == []
+    assert info.model_dump_json()
+
+
+@pytest.mark.asyncio
+async def test_subscriptions_info_batches_tariffs_and_traffic_purchases() -> None:
+    purchase = SimpleNamespace(
+        id=9,
+        subscription_id=6,
+        traffic_gb=50,
+        expires_at=datetime.now(UTC) + timedelta(days=2, hours=1),
+        created_at=_NOW,
+    )
+    tariffs = MagicMock()
+    tariffs.all.return_value = [(2, 'Pro'), (3, 'Max')]
+    purchases = MagicMock()
+    purchases.scalars.return_value.all.return_value = [purchase]
+    db = AsyncMock()
+    db.execute = AsyncMock(side_effect=[tariffs, purchases])
+
+    infos = await _build_subscriptions_info(db, [_subscription(), _subscription(id=6, tariff_id=3)])
+
+    assert db.execute.await_count == 2
+    assert [info.tariff_name for info in infos] == ['Pro', 'Max']
+    assert infos[0].traffic_purchases == []
+    assert [p.id for p in infos[1].traffic_purchases] == [9]
+    assert infos[1].traffic_purchases[0].days_remaining == 2
+
+
+@pytest.mark.asyncio
+async def test_list_users_renders_json_directly() -> None:
+    with (
+        patch('app.cabinet.routes.admin_users.get_users_list', AsyncMock(return_value=[_user()])),
+        patch('app.cabinet.routes.admin_users.get_users_count', AsyncMock(return_value=41)),
+        patch('app.cabinet.routes.admin_users.get_users_spending_stats', AsyncMock(return_value={})),
+    ):
+        response = await list_users(
+            offset=40,
+            limit=20,
+            search=None,
+            email=None,
+            status=None,
+            subscription_status=None,
+            tariff_id=None,
+            promo_group_id=None,
+            campaign_id=None,
+            partner_id=None,
+            sort_by=SortByEnum.CREATED_AT,
+            admin=MagicMock(),
+            db=AsyncMock(),
+        )
+
+    assert response.media_type == 'application/json'
+    payload = UsersListResponse.model_validate_json(response.body)
+    assert payload.total == 41
+    assert payload.offset == 40
+    assert [user.id for user in payload.users] == [1]
+    assert payload.users[0].tariff_name == 'Pro'
+
+
+class _Session:
+    opened: list[_Session] = []
+
+    def __init__(self) -> None:
+        self.execute = AsyncMock(side_effect=self._execute)
+
+    async def __aenter__(self):
+        _Session.opened.append(self)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def _execute(self, statement):
+        result = MagicMock()
+        result.one_or_none.return_value = SimpleNamespace(
+            total=4,
+            active=3,
+            trial=1,
+            expired=1,
+            avg=250,
+            today=5,
+            week=6,
+            month=7,
+            deleted=2,
+            referrals_count=3,
+            earnings=1200,
+        )
+        return result
+
+
+@pytest.mark.asyncio
+async def test_users_stats_run_aggregates_on_own_sessions() -> None:
+    _Session.opened = []
+    db = AsyncMock()
+    with (
+        patch('app.cabinet.utils.route_helpers.AsyncSessionLocal', _Session),
+        patch('app.cabinet.routes.admin_users.get_users_statistics', AsyncMock(return_value=_STATISTICS)),
+    ):
+        response = await get_users_stats(admin=MagicMock(), db=db)
+
+    db.execute.assert_not_awaited()
+    assert all(session.execute.await_count == 1 for session in _Session.opened)
+    stats = UsersStatsResponse.model_validate_json(response.body)
+    assert stats.total_users == 10
+    assert stats.users_with_active_subscription == 3
+    assert stats.total_balance_kopeks == 4
+    assert stats.avg_balance_kopeks == 250
+    assert stats.active_today == 5
+    assert stats.active_week == 6
+    assert stats.active_month == 7
+    assert stats.deleted_users == 2
+
+
+@pytest.mark.asyncio
+async def test_users_stats_fold_activity_counts_into_one_query() -> None:
+    _Session.opened = []
+    db = AsyncMock()
+    with (
+        patch('app.cabinet.utils.route_helpers.AsyncSessionLocal', _Session),
+        patch('app.cabinet.routes.admin_users.get_users_statistics', AsyncMock(return_value=_STATISTICS)),
+    ):
+        await get_users_stats(admin=MagicMock(), db=db)
+
+    assert len(_Session.opened) == 3
+    statements = [session.execute.await_args.args[0] for session in _Session.opened]
+    sql = [str(statement.compile(dialect=postgresql.dialect())) for statement in statements]
+    assert sum('last_activity' in query for query in sql) == 1
+    assert sorted(query.count('count(*) FILTER (WHERE') for query in sql) == [0, 3, 4]
+    assert not any('CAST(' in query for query in sql)
+
+
+@pytest.mark.asyncio
+async def test_users_stats_serve_cached_body_within_ttl() -> None:
+    _Session.opened = []
+    statistics = AsyncMock(return_value=_STATISTICS)
+    with (
+        patch('app.cabinet.utils.route_helpers.AsyncSessionLocal', _Session),
+        patch('app.cabinet.routes.admin_users.get_users_statistics', statistics),
+    ):
+        first = await get_users_stats(admin=MagicMock(), db=AsyncMock())
+        second = await get_users_stats(admin=MagicMock(), db=AsyncMock())
+        _stats_cache.clear()
+        await get_users_stats(admin=MagicMock(), db=AsyncMock())
+
+    assert second.body == first.body
+    assert second.media_type == 'application/json'
+    assert statistics.await_count == 2
+    assert len(_Session.opened) == 6
+
+
+@pytest.mark.asyncio
+async def test_background_panel_sync_reloads_entities_on_own_session(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(Settings, 'is_multi_tariff_enabled', lambda self: True)
+    _Session.opened = []
+    subscription = _subscription(remnawave_uuid='panel-uuid')
+    user = _user(subscriptions=[_subscription(id=4), subscription], remnawave_uuid='legacy-uuid')
+    sync = AsyncMock(return_value={'action': 'updated'})
+    service = MagicMock()
+    service.return_value.enable_remnawave_user = AsyncMock()
+    with (
+        patch('app.cabinet.routes.admin_users.AsyncSessionLocal', _Session),
+        patch('app.cabinet.routes.admin_users.get_user_by_id', AsyncMock(return_value=user)),
+        patch('app.cabinet.routes.admin_users._sync_subscription_to_panel', sync),
+        patch('app.cabinet.routes.admin_users.SubscriptionService', service),
+    ):
+        await _sync_subscription_to_panel_in_background(user.id, subscription.id, enable_after_sync=True)
+
+    assert len(_Session.opened) == 1
+    sync.assert_awaited_once_with(
+        _Session.opened[0], user, subscription, reset_traffic=False, reset_traffic_reason=None
+    )
+    service.return_value.enable_remnawave_user.assert_awaited_once_with('panel-uuid')
+
+
+@pytest.mark.asyncio
+async def test_panel_syncs_of_one_subscription_run_one_after_another() -> None:
+    running: list[int] = []
+    calls: list[tuple[int, bool]] = []
+
+    async def fake_sync(user_id: int, subscription_id: int, **kwargs) -> None:
+        calls.append((subscription_id, bool(running)))
+        running.append(subscription_id)
+        await asyncio.sleep(0)
+        running.remove(subscription_id)
+
+    with patch('app.cabinet.routes.admin_users._sync_subscription_to_panel_in_background', fake_sync):
+        _schedule_panel_sync(1, 7)
+        _schedule_panel_sync(1, 7, reset_traffic=True)
+        await drain_panel_sync_tasks()
+
+    assert calls == [(7, False), (7, False)]
+    assert _panel_sync_tasks == {}
+
+
+@pytest.mark.asyncio
+async def test_drain_cancels_panel_syncs_still_running_after_timeout() -> None:
+    started = asyncio.Event()
+
+    async def hanging_sync(*args, **kwargs) -> None:
+        started.set()
+        await asyncio.sleep(3600)
+
+    with patch('app.cabinet.routes.admin_users._sync_subscription_to_panel_in_background', hanging_sync):
+        _schedule_panel_sync(1, 8)
+        await started.wait()
+        task = _panel_sync_tasks[8]
+        await drain_panel_sync_tasks(timeout=0.01)
+        await asyncio.sleep(0)
+
+    assert task.cancelled()
+    assert _panel_sync_tasks == {}
+
+
+@pytest.mark.asyncio
+async def test_user_detail_fans_out_reads_on_own_sessions() -> None:
+    _Session.opened = []
+    referrer = SimpleNamespace(username=None, full_name='Bob')
+    user = _user(
+        promo_group=SimpleNamespace(id=7, name='VIP', is_default=False),
+        referred_by_id=2,
+        referrer=referrer,
+        referral_code='REF',
+        referral_commission_percent=None,
+        language='ru',
+        email=None,
+        email_verified=False,
+        updated_at=None,
+        cabinet_last_login=None,
+        used_promocodes=0,
+        has_had_paid_subscription=True,
+        lifetime_used_traffic_bytes=0,
+        restriction_reason=None,
+        promo_offer_discount_percent=0,
+        promo_offer_discount_source=None,
+        promo_offer_discount_expires_at=None,
+        remnawave_uuid=None,
+    )
+    transaction = SimpleNamespace(
+        id=1,
+        type='withdrawal',
+        amount_kopeks=300,
+        description=None,
+        payment_method=None,
+        is_completed=True,
+        created_at=_NOW,
+    )
+    info = _build_subscription_info(user.subscriptions[0])
+    db = AsyncMock()
+    with (
+        patch('app.cabinet.utils.route_helpers.AsyncSessionLocal', _Session),
+        patch('app.cabinet.routes.admin_users.get_user_by_id', AsyncMock(return_value=user)),
+        patch('app.cabinet.routes.admin_users.get_users_spending_stats', AsyncMock(return_value={})),
+        patch('app.cabinet.routes.admin_users.get_campaign_registration_by_user', AsyncMock(return_value=None)),
+        patch('app.cabinet.routes.admin_users._fetch_scalars', AsyncMock(return_value=[transaction])),
+        patch('app.cabinet.routes.admin_users._build_subscriptions_info', AsyncMock(return_value=[info])),
+    ):
+        response = await get_user_detail(user.id, admin=MagicMock(), db=db)
+
+    detail = UserDetailResponse.model_validate_json(response.body)
+
+    db.execute.assert_not_awaited()
+    assert len(_Session.opened) == 4
+    assert detail.subscription == info
+    assert detail.referral.referrals_count == 3
+    assert detail.referral.total_earnings_kopeks == 1200
+    assert detail.referral.referred_by_username == 'Bob'
+    assert [t.amount_kopeks for t in detail.recent_transactions] == [-300]
+
+
+@pytest.mark.asyncio
+async def test_sync_status_reads_eager_loaded_tariff_without_refresh() -> None:
+    subscription = _subscription(connected_squads=['squad'], remnawave_uuid=None)
+    user = _user(subscriptions=[subscription], remnawave_uuid=None, email=None, last_remnawave_sync=None)
+    service = MagicMock()
+    service.return_value.is_configured = False
+    db = AsyncMock()
+    with (
+        patch('app.cabinet.routes.admin_users.get_user_with_subscriptions', AsyncMock(return_value=user)),
+        patch('app.cabinet.routes.admin_users.RemnaWaveService', service),
+    ):
+        response = await get_user_sync_status(user.id, subscription_id=None, admin=MagicMock(), db=db)
+
+    db.refresh.assert_not_awaited()
+    assert response.subscription_id == 5
+    assert response.subscription_tariff_name == 'Pro'
+    assert response.bot_squads == ['squad']
+    assert response.panel_found is False
+
+
+def _panel_user(**overrides) -> SimpleNamespace:
+    values = {
+        'status': None,
+        'expire_at': None,
+        'traffic_limit_bytes': 100 * 1024**3,
+        'used_traffic_bytes': 0,
+        'hwid_device_limit': 3,
+        'active_internal_squads': [],
+    }
+    values.update(overrides)
+    return SimpleNamespace(**values)
+
+
+async def _sync_status(subscription: SimpleNamespace, panel_user: SimpleNamespace):
+    user = _user(subscriptions=[subscription], remnawave_uuid='panel-uuid', email=None, last_remnawave_sync=None)
+    api = MagicMock()
+    api.get_user_by_uuid = AsyncMock(return_value=panel_user)
+    service = MagicMock()
+    service.return_value.get_shared_api_client = AsyncMock(return_value=api)
+    with (
+        patch('app.cabinet.routes.admin_users.get_user_with_subscriptions', AsyncMock(return_value=user)),
+        patch('app.cabinet.routes.admin_users.RemnaWaveService', service),
+    ):
+        response = await get_user_sync_status(user.id, subscription_id=None, admin=MagicMock(), db=AsyncMock())
+    return response, service, api
+
+
+@pytest.mark.asyncio
+async def test_sync_status_queries_panel_through_shared_client() -> None:
+    subscription = _subscription(connected_squads=[], remnawave_uuid=None, traffic_used_gb=0.0)
+
+    response, service, api = await _sync_status(subscription, _panel_user())
+
+    service.return_value.get_api_client.assert_not_called()
+    api.get_user_by_uuid.assert_awaited_once_with('panel-uuid')
+    assert response.panel_found is True
+    assert response.panel_traffic_limit_gb == 100
+    assert response.has_differences is False
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    ('offset', 'page_size', 'counted', 'total'),
+    [(0, 2, False, 2), (20, 20, True, 57), (40, 0, True, 57), (0, 0, False, 0)],
+)
+async def test_user_referrals_paginate_in_sql(offset: int, page_size: int, counted: bool, total: int) -> None:
+    page = [_user(id=index + 10) for index in range(page_size)]
+    get_page = AsyncMock(return_value=page)
+    count = AsyncMock(return_value=57)
+    spending = AsyncMock(return_value={})
+    probe = MagicMock()
+    probe.scalar_one_or_none.return_value = 1
+    db = AsyncMock()
+    db.execute = AsyncMock(return_value=probe)
+    with (
+        patch('app.cabinet.routes.admin_users.get_user_by_id', AsyncMock()) as get_user,
+        patch('app.cabinet.routes.admin_users.get_referrals_page', get_page),
+        patch('app.cabinet.routes.admin_users.count_referrals', count),
+        patch('app.cabinet.routes.admin_users.get_users_spending_stats', spending),
+    ):
+        response = await get_user_referrals(1, offset=offset, limit=20, admin=MagicMock(), db=db)
+
+    # The referrer is only probed for existence, never loaded with its relationships
+    get_user.assert_not_awaited()
+    assert str(db.execute.await_args.args[0]).startswith('SELECT users.id')
+    get_page.assert_awaited_once()
+    assert get_page.await_args.args[1:] == (1, offset, 20)
+    assert count.await_count == int(counted)
+    # Spending stats for the whole page come from one batched call, never one per referral
+    assert spending.await_count == int(bool(page))
+    if page:
+        assert spending.await_args.args[1] == [user.id for user in page]
+    assert response.total == total
+    assert [user.id for user in response.users] == [user.id for user in page]
+
+
+def _promo_group_db(row) -> AsyncMock:
+    lookup = MagicMock()
+    lookup.one_or_none.return_value = row
+    db = AsyncMock()
+    db.add = MagicMock()
+    db.execute = AsyncMock(side_effect=[lookup, MagicMock()])
+    return db
+
+
+@pytest.mark.asyncio
+async def test_update_promo_group_reads_user_and_group_in_one_statement() -> None:
+    user = _user(promo_group_id=3)
+    db = _promo_group_db((user, 'VIP'))
+    with patch('app.cabinet.routes.admin_users.sync_user_primary_promo_group', AsyncMock()) as sync:
+        response = await update_user_promo_group(
+            user.id, UpdatePromoGroupRequest(promo_group_id=7), admin=MagicMock(), db=db
+        )
+
+    sql = str(db.execute.await_args_list[0].args[0].compile(dialect=postgresql.dialect()))
+    assert 'promo_groups.name' in sql
+    sync.assert_awaited_once_with(db, user.id)
+    db.commit.assert_awaited_once()
+    db.refresh.assert_not_awaited()
+    assert response.old_promo_group_id == 3
+    assert response.new_promo_group_id == 7
+    assert response.promo_group_name == 'VIP'
+
+
+@pytest.mark.asyncio
+async def test_update_promo_group_rejects_unknown_group() -> None:
+    db = _promo_group_db((_user(), None))
+
+    with pytest.raises(HTTPException) as exc_info:
+        await update_user_promo_group(1, UpdatePromoGroupRequest(promo_group_id=99), admin=MagicMock(), db=db)
+
+    assert exc_info.value.detail == 'Promo group not found'
+    assert db.execute.await_count == 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    ('payload', 'field', 'value'),
+    [
+        ({'action': 'toggle_autopay', 'autopay_enabled': False}, 'autopay_enabled', False),
+        ({'action': 'cancel'}, 'status', 'expired'),
+        ({'action': 'set_traffic', 'traffic_limit_gb': 250}, 'traffic_limit_gb', 250),
+        ({'action': 'set_device_limit', 'device_limit': 5}, 'device_limit', 5),
+    ],
+)
+async def test_subscription_actions_skip_refresh_after_commit(
+    monkeypatch: pytest.MonkeyPatch, payload: dict, field: str, value: object
+) -> None:
+    monkeypatch.setattr(Settings, 'is_multi_tariff_enabled', lambda self: False)
+    subscription = _subscription()
+    user = _user(subscriptions=[subscription])
+    db = AsyncMock()
+    with (
+        patch('app.cabinet.routes.admin_users.get_user_by_id', AsyncMock(return_value=user)),
+        patch('app.cabinet.routes.admin_users._schedule_panel_sync'),
+        patch(
+            'app.cabinet.routes.admin_users._build_subscriptions_info',
+            AsyncMock(return_value=[_build_subscription_info(subscription)]),
+        ),
+    ):
+        request = UpdateSubscriptionRequest(**payload)
+        response = await update_user_subscription(user.id, request, admin=MagicMock(), db=db)
+
+    assert response.success is True
+    assert getattr(subscription, field) == value
+    db.commit.assert_awaited_once()
+    db.refresh.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_reset_subscription_deletes_server_links_in_one_statement() -> None:
+    user = _user(subscriptions=[_subscription(id=5), _subscription(id=6), _subscription(id=7)])
+    db = AsyncMock()
+    with patch('app.cabinet.routes.admin_users.get_user_by_id', AsyncMock(return_value=user)):
+        response = await reset_user_subscription(
+            user.id, ResetSubscriptionRequest(deactivate_in_panel=False), admin=MagicMock(), db=db
+        )
+
+    assert response.subscription_deleted is True
+    assert db.execute.await_count == 2
+    links, subscriptions = (call.args[0] for call in db.execute.await_args_list)
+    assert links.table.name == 'subscription_servers'
+    assert subscriptions.table.name == 'subscriptions'
+    db.commit.assert_awaited_once()
+
+
+def test_period_prices_are_sorted_and_memoized() -> None:
+    _period_prices_info.cache_clear()
+
+    first = _period_prices_info((('90', 25000), ('30', 10000)))
+    second = _period_prices_info((('90', 25000), ('30', 10000)))
+    edited = _period_prices_info((('90', 24000), ('30', 10000)))
+
+    assert [(p.days, p.price_kopeks, p.price_rubles) for p in first] == [(30, 10000, 100.0), (90, 25000, 250.0)]
+    assert second is first
+    assert edited[1].price_kopeks == 24000
+    assert _period_prices_info.cache_info().hits == 1
+
+
+class _TransactionRow(NamedTuple):
+    transaction: object
+    total: int
+
+
+def _transaction(**overrides) -> SimpleNamespace:
+    values = {
+        'id': 1,
+        'type': 'deposit',
+        'amount_kopeks': 500,
+        'description': None,
+        'payment_method': None,
+        'is_completed': True,
+        'created_at': _NOW,
+    }
+    values.update(overrides)
+    return SimpleNamespace(**values)
+
+
+@pytest.mark.asyncio
+async def test_user_transactions_read_total_from_window_count() -> None:
+    result = MagicMock()
+    result.all.return_value = [
+        _TransactionRow(_transaction(id=1), 42),
+        _TransactionRow(_transaction(id=2, type='withdrawal', amount_kopeks=300), 42),
+    ]
+    db = AsyncMock()
+    db.execute = AsyncMock(return_value=result)
+    with patch('app.cabinet.routes.admin_users.get_user_by_id', AsyncMock(return_value=_user())):
+        response = await get_user_transactions(
+            1, offset=0, limit=2, transaction_type='deposit', admin=MagicMock(), db=db
+        )
+
+    db.execute.assert_awaited_once()
+    db.scalar.assert_not_awaited()
+    assert response['total'] == 42
+    assert [t.amount_kopeks for t in response['transactions']] == [500, -300]
+    sql = str(db.execute.await_args.args[0].compile(dialect=postgresql.dialect()))
+    assert 'count(*) OVER ()' in sql
+    assert 'transactions.type =' in sql
+
+
+@pytest.mark.asyncio
+async def test_user_transactions_count_separately_past_last_page() -> None:
+    result = MagicMock()
+    result.all.return_value = []
+    db = AsyncMock()
+    db.execute = AsyncMock(return_value=result)
+    db.scalar = AsyncMock(return_value=3)
+    with patch('app.cabinet.routes.admin_users.get_user_by_id', AsyncMock(return_value=_user())):
+        response = await get_user_transactions(1, offset=40, limit=20, transaction_type=None, admin=MagicMock(), db=db)
+
+    assert response['total'] == 3
+    assert response['transactions'] == []
+
+
+@pytest.mark.asyncio
+async def test_disable_panel_users_runs_requests_concurrently() -> None:
+    in_flight: list[str] = []
+    peak = 0
+
+    async def disable(uuid: str) -> bool:
+        nonlocal peak
+        in_flight.append(uuid)
+        peak = max(peak, len(in_flight))
+        await asyncio.sleep(0)
+        in_flight.remove(uuid)
+        if uuid == 'broken':
+            raise RuntimeError('panel down')
+        return True
+
+    service = MagicMock()
+    service.disable_remnawave_user = AsyncMock(side_effect=disable)
+
+    await _disable_panel_users(service, ['a', None, 'broken', 'b'])
+
+    assert peak == 3
+    assert [call.args[0] for call in service.disable_remnawave_user.await_args_list] == ['a', 'broken', 'b']
+
+
+@pytest.mark.asyncio
+async def test_sync_status_counts_squads_on_each_side() -> None:
+    subscription = _subscription(connected_squads=['a', 'b', 'c'], remnawave_uuid=None, traffic_used_gb=0.0)
+    panel_user = _panel_user(active_internal_squads=[{'uuid': 'b'}, {'uuid': 'c'}, {'uuid': 'd'}, {'name': 'x'}])
+
+    response, _, _ = await _sync_status(subscription, panel_user)
+
+    assert response.panel_squads == ['b', 'c', 'd']
+    assert response.differences == ['Squads mismatch (only in bot: 1, only in panel: 1)']
+
+
+@pytest.mark.asyncio
+async def test_sync_status_reports_differences_in_check_order() -> None:
+    end_date = datetime(2026, 1, 10, tzinfo=UTC)
+    subscription = _subscription(
+        connected_squads=[], remnawave_uuid=None, status='expired', end_date=end_date, traffic_used_gb=0.0
+    )
+    panel_user = _panel_user(
+        status=SimpleNamespace(value='ACTIVE'),
+        expire_at=end_date + timedelta(hours=5),
+        traffic_limit_bytes=50 * 1024**3,
+        hwid_device_limit=5,
+    )
+
+    response, _, _ = await _sync_status(subscription, panel_user)
+
+    assert response.differences == [
+        'Status: bot=expired, panel=ACTIVE',
+        'End date differs by 5.0 hours',
+        'Traffic limit: bot=100GB, panel=50.0GB',
+        'Device limit: bot=3, panel=5',
+    ]
+
+
+def _status_db(current_status: str | None) -> AsyncMock:
+    probe = MagicMock()
+    probe.scalar_one_or_none.return_value = current_status
+    db = AsyncMock()
+    db.execute = AsyncMock(side_effect=[probe, MagicMock()])
+    return db
+
+
+@pytest.mark.asyncio
+async def test_update_status_no_op_reads_only_the_status_column() -> None:
+    db = _status_db('blocked')
+    request = UpdateUserStatusRequest(status=UserStatusEnum.BLOCKED)
+
+    response = await update_user_status(1, request, admin=MagicMock(), db=db)
+
+    sql = str(db.execute.await_args.args[0].compile(dialect=postgresql.dialect()))
+    assert sql.startswith('SELECT users.status \nFROM users')
+    db.execute.assert_awaited_once()
+    db.commit.assert_not_awaited()
+    assert response.message == 'Status unchanged'
+
+
+@pytest.mark.asyncio
+async def test_update_status_writes_without_loading_the_user() -> None:
+    db = _status_db('active')
+    request = UpdateUserStatusRequest(status=UserStatusEnum.BLOCKED)
+
+    with patch('app.cabinet.routes.admin_users.invalidate_cached_user') as invalidate:
+        response = await update_user_status(1, request, admin=MagicMock(), db=db)
+
+    sql = str(db.execute.await_args_list[1].args[0].compile(dialect=postgresql.dialect()))
+    assert sql.startswith('UPDATE users SET status=')
+    db.commit.assert_awaited_once()
+    db.refresh.assert_not_awaited()
+    invalidate.assert_called_once_with(1)
+    assert (response.old_status, response.new_status) == ('active', 'blocked')
+
+
+@pytest.mark.asyncio
+async def test_update_status_rejects_ids_outside_int4_without_querying() -> None:
+    db = _status_db(None)
+
+    with pytest.raises(HTTPException) as exc_info:
+        await update_user_status(2**31, UpdateUserStatusRequest(status=UserStatusEnum.ACTIVE), admin=MagicMock(), db=db)
+
+    assert exc_info.value.status_code == 404
+    db.execute.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_hard_delete_is_a_single_delete_statement() -> None:
+    db = AsyncMock()
+    db.execute = AsyncMock(return_value=SimpleNamespace(rowcount=1))
+
+    with patch('app.cabinet.routes.admin_users.get_user_by_id', AsyncMock()) as get_user:
+        response = await delete_user(7, DeleteUserRequest(soft_delete=False), admin=MagicMock(), db=db)
+
+    get_user.assert_not_awaited()
+    sql = str(db.execute.await_args.args[0].compile(dialect=postgresql.dialect()))
+    assert sql.startswith('DELETE FROM users WHERE users.id =')
+    db.delete.assert_not_awaited()
+    db.commit.assert_awaited_once()
+    assert response.success is True
+
+
+@pytest.mark.asyncio
+async def test_hard_delete_of_missing_user_is_not_found() -> None:
+    db = AsyncMock()
+    db.execute = AsyncMock(return_value=SimpleNamespace(rowcount=0))
+
+    with pytest.raises(HTTPException) as exc_info:
+        await delete_user(7, DeleteUserRequest(soft_delete=False), admin=MagicMock(), db=db)
+
+    assert exc_info.value.status_code == 404
+    db.commit.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_hard_delete_blocked_by_foreign_key_is_conflict() -> None:
+    db = AsyncMock()
+    db.execute = AsyncMock(
+        side_effect=IntegrityError('DELETE FROM users', {}, Exception('saved_payment_methods_user_id_fkey'))
+    )
+
+    with pytest.raises(HTTPException) as exc_info:
+        await delete_user(7, DeleteUserRequest(soft_delete=False), admin=MagicMock(), db=db)
+
+    assert exc_info.value.status_code == 409
+    db.rollback.assert_awaited_once()
+    db.commit.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_sync_to_panel_reads_external_squad_from_eager_loaded_tariff() -> None:
+    subscription = _subscription(
+        remnawave_uuid=None,
+        remnawave_short_id=None,
+        connected_squads=['sq'],
+        tariff=SimpleNamespace(name='Pro', external_squad_uuid='ext-1'),
+    )
+    user = _user(subscriptions=[subscription], remnawave_uuid='panel-uuid', email=None)
+    api = MagicMock()
+    api.get_user_by_uuid = AsyncMock(return_value=SimpleNamespace(uuid='panel-uuid'))
+    api.update_user = AsyncMock()
+    service = MagicMock(is_configured=True, get_shared_api_client=AsyncMock(return_value=api))
+    db = AsyncMock()
+    with (
+        patch.object(Settings, 'is_multi_tariff_enabled', lambda self: False),
+        patch('app.cabinet.routes.admin_users.get_user_with_subscriptions', AsyncMock(return_value=user)),
+        patch('app.cabinet.routes.admin_users.RemnaWaveService', return_value=service),
+        patch('app.cabinet.routes.admin_users.resolve_hwid_device_limit_for_payload', return_value=None),
+        patch('app.cabinet.routes.admin_users.get_traffic_reset_strategy', return_value='NO_RESET'),
+    ):
+        response = await sync_user_to_panel(
+            user.id, subscription_id=None, request=SyncToPanelRequest(), admin=MagicMock(), db=db
+        )
+    payload = SyncToPanelResponse.model_validate_json(response.body)
+
+    db.refresh.assert_not_awaited()
+    service.get_api_client.assert_not_called()
+    api.get_user_by_telegram_id.assert_not_called()
+    assert api.update_user.await_args.kwargs['external_squad_uuid'] == 'ext-1'
+    assert payload.action == 'updated'
+
+
+def _synced_pair(**panel_overrides) -> tuple[SimpleNamespace, SimpleNamespace]:
+    """A bot user and panel user that agree on everything unless overridden."""
+    end_date = datetime.now(UTC) + timedelta(days=30)
+    subscription = _subscription(
+        end_date=end_date,
+        remnawave_uuid=None,
+        remnawave_short_uuid='short-1',
+        connected_squads=['sq1'],
+        subscription_url='https://panel/old',
+        subscription_crypto_link=None,
+        traffic_used_gb=0.0,
+    )
+    user = _user(subscriptions=[subscription], remnawave_uuid='panel-uuid', email=None, last_remnawave_sync=None)
+    values = {
+        'uuid': 'panel-uuid',
+        'short_uuid': 'short-1',
+        'username': 'alice',
+        'status': SimpleNamespace(value='ACTIVE'),
+        'expire_at': end_date,
+        'active_internal_squads': [{'uuid': 'sq1'}],
+        'subscription_url': None,
+        'happ_crypto_link': None,
+    }
+    values.update(panel_overrides)
+    return user, _panel_user(**values)
+
+
+async def _sync_from_panel(user: SimpleNamespace, panel_user: SimpleNamespace):
+    api = MagicMock()
+    api.get_user_by_uuid = AsyncMock(return_value=panel_user)
+    service = MagicMock(is_configured=True, get_shared_api_client=AsyncMock(return_value=api))
+    db = AsyncMock()
+    with (
+        patch.object(Settings, 'is_multi_tariff_enabled', lambda self: False),
+        patch('app.cabinet.routes.admin_users.get_user_with_subscriptions', AsyncMock(return_value=user)),
+        patch('app.cabinet.routes.admin_users.RemnaWaveService', return_value=service),
+    ):
+        response = await sync_user_from_panel(
+            user.id, subscription_id=None, request=SyncFromPanelRequest(), admin=MagicMock(), db=db
+        )
+    return SyncFromPanelResponse.model_validate_json(response.body), db
+
+
+@pytest.mark.asyncio
+async def test_sync_from_panel_reports_changed_fields_only() -> None:
+    user, panel_user = _synced_pair(hwid_device_limit=5, happ_crypto_link='happ://secret')
+    subscription = user.subscriptions[0]
+
+    response, db = await _sync_from_panel(user, panel_user)
+
+    db.commit.assert_awaited_once()
+    assert user.last_remnawave_sync is user.updated_at
+    assert response.changes == {
+        'device_limit': {'old': 3, 'new': 5},
+        'subscription_crypto_link': {'old': None, 'new': '***'},
+    }
+    assert subscription.subscription_crypto_link == 'happ://secret'
+    # An empty panel value never clears the bot's copy
+    assert subscription.subscription_url == 'https://panel/old'
+
+
+@pytest.mark.asyncio
+async def test_sync_from_panel_without_changes_skips_the_write() -> None:
+    user, panel_user = _synced_pair()
+
+    response, db = await _sync_from_panel(user, panel_user)
+
+    assert response.changes == {}
+    assert response.message == 'No changes needed'
+    db.commit.assert_not_awaited()
+    assert user.last_remnawave_sync is None
@@ -0,0 +1,147 @@
+"""Tests for the in-process caches used by cabinet auth dependencies."""
+
+from __future__ import annotations
+
+import time
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from fastapi import HTTPException, status
+
+from app.cabinet import dependencies as cabinet_dependencies
+from app.cabinet.dependencies import (
+    get_current_cabinet_user,
+    get_optional_cabinet_user,
+    invalidate_cached_token,
+)
+from app.database.models import User, UserStatus
+from app.utils import ttl_cache
+
+
+@pytest.fixture(autouse=True)
+def _reset_auth_caches() -> None:
+    cabinet_dependencies._jwt_cache.clear()
+    cabinet_dependencies._user_state_cache.clear()
+
+
+def _request() -> MagicMock:
+    req = MagicMock()
+    req.headers = MagicMock()
+    req.headers.get = MagicMock(return_value=None)
+    return req
+
+
+def _credentials(token: str = 'fake.jwt.token') -> MagicMock:  # noqa: S107 — test sentinel, not a real secret
+    return MagicMock(credentials=token)
+
+
+def test_access_payload_is_verified_once_per_token() -> None:
+    payload = {'sub': '1', 'type': 'access', 'exp': time.time() + 600}
+    with patch('app.cabinet.dependencies.get_token_payload', return_value=payload) as decode:
+        assert cabinet_dependencies._get_cached_access_payload('tok') == payload
+        assert cabinet_dependencies._get_cached_access_payload('tok') == payload
+
+    decode.assert_called_once()
+
+
+def test_access_payload_not_cached_past_token_expiry() -> None:
+    payload = {'sub': '1', 'type': 'access', 'exp': time.time() - 1}
+    with patch('app.cabinet.dependencies.get_token_payload', return_value=payload) as decode:
+        cabinet_dependencies._get_cached_access_payload('tok')
+        cabinet_dependencies._get_cached_access_payload('tok')
+
+    assert decode.call_count == 2
+
+
+def test_invalid_token_is_rejected_from_cache_briefly(monkeypatch) -> None:
+    now = [1000.0]
+    monkeypatch.setattr(ttl_cache.time, 'monotonic', lambda: now[0])
+    with patch('app.cabinet.dependencies.get_token_payload', return_value=None) as decode:
+        assert cabinet_dependencies._get_cached_access_payload('bad') is None
+        assert cabinet_dependencies._get_cached_access_payload('bad') is None
+        decode.assert_called_once()
+
+        now[0] += cabinet_dependencies._INVALID_TOKEN_TTL
+        assert cabinet_dependencies._get_cached_access_payload('bad') is None
+        assert decode.call_count == 2
+
+
+def test_invalidate_cached_token_forces_reverification() -> None:
+    payload = {'sub': '1', 'type': 'access'}
+    with patch('app.cabinet.dependencies.get_token_payload', return_value=payload) as decode:
+        cabinet_dependencies._get_cached_access_payload('tok')
+        invalidate_cached_token('tok')
+        cabinet_dependencies._get_cached_access_payload('tok')
+
+    assert decode.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_missing_user_is_answered_from_cache() -> None:
+    lookup = AsyncMock(return_value=None)
+    with (
+        patch('app.cabinet.dependencies.get_token_payload', return_value={'sub': '42', 'type': 'access'}),
+        patch('app.cabinet.dependencies.get_user_by_id', lookup),
+    ):
+        for _ in range(2):
+            with pytest.raises(HTTPException) as exc_info:
+                await get_current_cabinet_user(request=_request(), credentials=_credentials(), db=AsyncMock())
+            assert exc_info.value.status_code == status.HTTP_404_NOT_FOUND
+
+    lookup.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_optional_user_skips_lookup_for_cached_inactive_user() -> None:
+    blocked = SimpleNamespace(id=7, telegram_id=None, status=UserStatus.BLOCKED.value)
+    lookup = AsyncMock(return_value=blocked)
+    with (
+        patch('app.cabinet.dependencies.get_token_payload', return_value={'sub': '7', 'type': 'access'}),
+        patch('app.cabinet.dependencies.get_user_by_id', lookup),
+    ):
+        assert await get_optional_cabinet_user(request=_request(), credentials=_credentials(), db=AsyncMock()) is None
+        assert await get_optional_cabinet_user(request=_request(), credentials=_credentials(), db=AsyncMock()) is None
+
+    lookup.assert_awaited_once()
+
+
+def test_status_change_invalidates_cached_user() -> None:
+    user = User(id=7, status=UserStatus.BLOCKED.value)
+    cabinet_dependencies._user_state_cache[7] = UserStatus.BLOCKED.value
+
+    user.status = UserStatus.ACTIVE.value
+
+    assert cabinet_dependencies._user_state_cache.get(7) is None
+
+
+def test_cabinet_db_session_is_shared_within_request() -> None:
+    from fastapi import Depends, FastAPI
+    from fastapi.testclient import TestClient
+
+    from app.cabinet.dependencies import get_cabinet_db
+
+    opened: list[object] = []
+
+    class _Session:
+        async def __aenter__(self):
+            opened.append(self)
+            return self
+
+        async def __aexit__(self, *exc_info):
+            return None
+
+    async def auth_dep(db=Depends(get_cabinet_db)):
+        return db
+
+    app = FastAPI()
+
+    @app.get('/probe')
+    async def probe(auth_db=Depends(auth_dep), db=Depends(get_cabinet_db)):
+        return {'shared': auth_db is db}
+
+    with patch('app.cabinet.dependencies.AsyncSessionLocal', _Session):
+        response = TestClient(app).get('/probe')
+
+    assert response.json() == {'shared': True}
+    assert len(opened) == 1
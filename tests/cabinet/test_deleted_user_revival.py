@@ -25,6 +25,7 @@ from unittest.mock import AsyncMock, MagicMock, patch
 import pytest
 from fastapi import HTTPException, status
 
+from app.cabinet import dependencies as cabinet_dependencies
 from app.cabinet.dependencies import get_current_cabinet_user
 from app.database.models import UserStatus
 
@@ -74,6 +75,13 @@ def _credentials(token: str = 'fake.jwt.token') -> MagicMock:  # noqa: S107 —
     return MagicMock(credentials=token)
 
 
+@pytest.fixture(autouse=True)
+def _reset_auth_caches() -> None:
+    # Every test reuses the same fake token/user id with a different stub.
+    cabinet_dependencies._jwt_cache.clear()
+    cabinet_dependencies._user_state_cache.clear()
+
+
 @pytest.fixture
 def db() -> AsyncMock:
     session = AsyncMock()
@@ -97,8 +97,10 @@ def _common_oauth_patches(local_user_to_return: SimpleNamespace | None) -> list:
             ),
         ),
         # No provider_id match → falls into the email-merge branch (step 6).
-        patch('app.cabinet.routes.oauth.get_user_by_oauth_provider', AsyncMock(return_value=None)),
-        patch('app.cabinet.routes.oauth.get_user_by_email', AsyncMock(return_value=local_user_to_return)),
+        patch(
+            'app.cabinet.routes.oauth.get_users_for_oauth_login',
+            AsyncMock(return_value=(None, local_user_to_return)),
+        ),
         patch('app.cabinet.routes.oauth.set_user_oauth_provider_id', AsyncMock(return_value=None)),
         patch(
             'app.cabinet.routes.oauth._finalize_oauth_login',
@@ -120,7 +122,7 @@ async def test_email_merge_revives_deleted_user_when_both_verified(db: AsyncMock
     request = _callback_request()
 
     patches = _common_oauth_patches(local_user_to_return=deleted_user)
-    with patches[0], patches[1], patches[2], patches[3], patches[4], patches[5]:
+    with patches[0], patches[1], patches[2], patches[3], patches[4]:
         await oauth_callback(provider='google', request=request, db=db)
 
     assert deleted_user.status == UserStatus.ACTIVE.value, (
@@ -146,7 +148,7 @@ async def test_email_merge_blocks_409_when_local_email_unverified(db: AsyncMock)
     request = _callback_request()
 
     patches = _common_oauth_patches(local_user_to_return=unverified)
-    with patches[0], patches[1], patches[2], patches[3], patches[4], patches[5]:
+    with patches[0], patches[1], patches[2], patches[3], patches[4]:
         with pytest.raises(HTTPException) as exc:
             await oauth_callback(provider='google', request=request, db=db)
 
@@ -181,7 +183,6 @@ async def test_email_merge_active_user_links_without_revive(db: AsyncMock) -> No
         patches[2],
         patches[3],
         patches[4],
-        patches[5],
         patch('app.cabinet.routes.oauth.logger.info', side_effect=_log_capture),
     ):
         await oauth_callback(provider='google', request=request, db=db)
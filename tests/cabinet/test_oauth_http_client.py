@@ -0,0 +1,38 @@
+"""OAuth providers share one keep-alive HTTP client across the code exchange and user-info fetch."""
+
+from __future__ import annotations
+
+import pytest
+
+from app.cabinet.auth import oauth_providers
+from app.cabinet.auth.oauth_providers import _get_http_client, close_oauth_http_client
+
+
+@pytest.mark.asyncio
+async def test_client_is_reused_between_calls() -> None:
+    try:
+        assert _get_http_client() is _get_http_client()
+    finally:
+        await close_oauth_http_client()
+
+
+@pytest.mark.asyncio
+async def test_close_releases_client_and_next_call_reopens() -> None:
+    client = _get_http_client()
+
+    await close_oauth_http_client()
+
+    assert client.is_closed
+    assert oauth_providers._http_client is None
+    try:
+        assert _get_http_client() is not client
+    finally:
+        await close_oauth_http_client()
+
+
+@pytest.mark.asyncio
+async def test_close_without_client_is_noop() -> None:
+    await close_oauth_http_client()
+    await close_oauth_http_client()
+
+    assert oauth_providers._http_client is None
@@ -0,0 +1,45 @@
+"""``GET /auth/oauth/providers`` reuses its serialized body until the enabled set changes."""
+
+from __future__ import annotations
+
+import pytest
+
+from app.cabinet.routes.oauth import OAuthProvidersResponse, _providers_body, get_oauth_providers
+from app.config import settings
+
+
+@pytest.fixture(autouse=True)
+def _clear_providers_body():
+    _providers_body.cache_clear()
+    yield
+    _providers_body.cache_clear()
+
+
+def _enable_only(monkeypatch: pytest.MonkeyPatch, *enabled: str) -> None:
+    for name in ('GOOGLE', 'YANDEX', 'DISCORD', 'VK'):
+        monkeypatch.setattr(settings, f'OAUTH_{name}_ENABLED', name.lower() in enabled)
+
+
+@pytest.mark.asyncio
+async def test_providers_body_is_reused_between_requests(monkeypatch: pytest.MonkeyPatch) -> None:
+    _enable_only(monkeypatch, 'google', 'vk')
+
+    first = await get_oauth_providers()
+    second = await get_oauth_providers()
+
+    payload = OAuthProvidersResponse.model_validate_json(first.body)
+    assert [(p.name, p.display_name) for p in payload.providers] == [('google', 'Google'), ('vk', 'VK')]
+    assert second.body == first.body
+    assert _providers_body.cache_info().hits == 1
+
+
+@pytest.mark.asyncio
+async def test_runtime_settings_change_is_picked_up(monkeypatch: pytest.MonkeyPatch) -> None:
+    _enable_only(monkeypatch, 'google')
+    await get_oauth_providers()
+
+    _enable_only(monkeypatch, 'yandex')
+    response = await get_oauth_providers()
+
+    payload = OAuthProvidersResponse.model_validate_json(response.body)
+    assert [p.name for p in payload.providers] == ['yandex']
@@ -36,9 +36,11 @@ def test_email_merge_requires_local_user_email_verified() -> None:
     source = OAUTH_FILE.read_text(encoding='utf-8')
 
     # Find the email-merge branch block.
-    assert 'get_user_by_email(db, user_info.email)' in source, (
+    assert 'get_users_for_oauth_login(db, provider, user_info.provider_id, verified_email)' in source, (
         'email-merge branch helper call missing — test obsolete or oauth.py refactored'
     )
+    # The email candidate is only looked up when the IdP attests the email.
+    assert 'verified_email = user_info.email if user_info.email_verified else None' in source
 
     # The line establishing the local user must also enforce
     # `user.email_verified` before any provider-link or revival action.
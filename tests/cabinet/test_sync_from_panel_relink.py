@@ -9,7 +9,6 @@ because active_internal_squads is a list[dict] — so squads were never restored
 
 from __future__ import annotations
 
-from contextlib import asynccontextmanager
 from datetime import UTC, datetime, timedelta
 from types import SimpleNamespace
 from unittest.mock import AsyncMock, MagicMock, patch
@@ -18,7 +17,7 @@ import pytest
 from fastapi import HTTPException
 
 import app.cabinet.routes.admin_users as au
-from app.cabinet.schemas.users import SyncFromPanelRequest
+from app.cabinet.schemas.users import SyncFromPanelRequest, SyncFromPanelResponse
 from app.database.models import SubscriptionStatus
 
 
@@ -56,13 +55,9 @@ def _wiped_sub(sub_id: int = 84):
 
 
 def _service(api):
-    @asynccontextmanager
-    async def _client():
-        yield api
-
     svc = MagicMock()
     svc.is_configured = True
-    svc.get_api_client = _client
+    svc.get_shared_api_client = AsyncMock(return_value=api)
     return svc
 
 
@@ -70,12 +65,13 @@ async def _call(user, sub_id, api):
     db = AsyncMock()
     with (
         patch.object(type(au.settings), 'is_multi_tariff_enabled', MagicMock(return_value=True)),
-        patch.object(au, 'get_user_by_id', AsyncMock(return_value=user)),
-        patch('app.services.remnawave_service.RemnaWaveService', return_value=_service(api)),
+        patch.object(au, 'get_user_with_subscriptions', AsyncMock(return_value=user)),
+        patch.object(au, 'RemnaWaveService', return_value=_service(api)),
     ):
-        return await au.sync_user_from_panel(
+        response = await au.sync_user_from_panel(
             user_id=user.id, subscription_id=sub_id, request=SyncFromPanelRequest(), admin=MagicMock(), db=db
         )
+    return SyncFromPanelResponse.model_validate_json(response.body)
 
 
 @pytest.mark.asyncio
@@ -0,0 +1,48 @@
+"""``get_users_for_oauth_login`` finds the provider and email candidates in one query."""
+
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from app.database.crud.user import get_users_for_oauth_login
+
+
+def _db(rows: list) -> AsyncMock:
+    result = MagicMock()
+    result.scalars.return_value = iter(rows)
+    result.scalar_one_or_none.return_value = rows[0] if rows else None
+    db = AsyncMock()
+    db.execute = AsyncMock(return_value=result)
+    return db
+
+
+@pytest.mark.asyncio
+async def test_provider_and_email_rows_come_from_one_query() -> None:
+    linked = SimpleNamespace(id=1, google_id='g-1', email='old@example.com')
+    by_email = SimpleNamespace(id=2, google_id=None, email='Alice@example.com')
+    db = _db([by_email, linked])
+
+    provider_user, email_user = await get_users_for_oauth_login(db, 'google', 'g-1', ' alice@example.com ')
+
+    db.execute.assert_awaited_once()
+    assert provider_user is linked
+    assert email_user is by_email
+    assert 'lower(users.email)' in str(db.execute.await_args.args[0])
+
+
+@pytest.mark.asyncio
+async def test_row_matching_both_is_the_provider_user() -> None:
+    user = SimpleNamespace(id=1, vk_id=42, email='alice@example.com')
+    db = _db([user])
+
+    assert await get_users_for_oauth_login(db, 'vk', '42', 'alice@example.com') == (user, None)
+
+
+@pytest.mark.asyncio
+async def test_without_email_only_provider_is_looked_up() -> None:
+    db = _db([])
+
+    assert await get_users_for_oauth_login(db, 'google', 'g-1', None) == (None, None)
+    db.execute.assert_awaited_once()
+    assert 'lower(users.email)' not in str(db.execute.await_args.args[0])
@@ -0,0 +1,39 @@
+"""``get_all_tariffs`` сортирует тарифы в SQL, а не в вызывающем коде."""
+
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.database.crud.tariff import get_all_tariffs
+
+
+def _db() -> AsyncMock:
+    result = MagicMock()
+    result.scalars.return_value.all.return_value = []
+    db = AsyncMock()
+    db.execute = AsyncMock(return_value=result)
+    return db
+
+
+def _order_by(db: AsyncMock) -> str:
+    sql = str(db.execute.await_args.args[0].compile(dialect=postgresql.dialect()))
+    return sql.split('ORDER BY', 1)[1]
+
+
+@pytest.mark.asyncio
+async def test_default_order_is_display_order_then_id() -> None:
+    db = _db()
+
+    await get_all_tariffs(db)
+
+    assert _order_by(db).strip() == 'tariffs.display_order, tariffs.id'
+
+
+@pytest.mark.asyncio
+async def test_tier_level_breaks_display_order_ties() -> None:
+    db = _db()
+
+    await get_all_tariffs(db, include_inactive=True, order_by_tier_level=True)
+
+    assert _order_by(db).strip() == 'tariffs.display_order, tariffs.tier_level, tariffs.id'
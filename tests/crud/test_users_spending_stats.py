@@ -0,0 +1,65 @@
+"""``get_users_spending_stats`` передаёт ID страницы одним массивом на PostgreSQL."""
+
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.config import Settings
+from app.database.crud.user import get_users_spending_stats
+
+
+def _db(rows: list) -> AsyncMock:
+    result = MagicMock()
+    result.all.return_value = rows
+    db = AsyncMock()
+    db.execute = AsyncMock(return_value=result)
+    return db
+
+
+def _compiled_sql(db: AsyncMock) -> str:
+    return str(db.execute.await_args.args[0].compile(dialect=postgresql.dialect()))
+
+
+@pytest.mark.asyncio
+async def test_spending_stats_bind_ids_as_single_array(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(Settings, 'is_postgresql', lambda self: True)
+    db = _db([SimpleNamespace(user_id=1, total_spent=900, purchase_count=None)])
+
+    stats = await get_users_spending_stats(db, [1, 2, 3])
+
+    db.execute.assert_awaited_once()
+    assert stats == {1: {'total_spent': 900, 'purchase_count': 0}}
+    sql = _compiled_sql(db)
+    assert 'ANY (%(user_ids)s' in sql
+    assert 'POSTCOMPILE' not in sql
+
+
+@pytest.mark.asyncio
+async def test_spending_stats_statement_does_not_depend_on_page_size(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(Settings, 'is_postgresql', lambda self: True)
+    small, large = _db([]), _db([])
+
+    await get_users_spending_stats(small, [1])
+    await get_users_spending_stats(large, list(range(100)))
+
+    assert _compiled_sql(small) == _compiled_sql(large)
+
+
+@pytest.mark.asyncio
+async def test_spending_stats_fall_back_to_in_list_on_sqlite(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(Settings, 'is_postgresql', lambda self: False)
+    db = _db([])
+
+    await get_users_spending_stats(db, [1, 2])
+
+    assert 'ANY' not in _compiled_sql(db)
+
+
+@pytest.mark.asyncio
+async def test_spending_stats_skip_query_for_empty_page() -> None:
+    db = _db([])
+
+    assert await get_users_spending_stats(db, []) == {}
+    db.execute.assert_not_awaited()
@@ -112,3 +112,20 @@ def test_custom_pool_values_reach_a_real_engine(monkeypatch):
         assert eng.pool._timeout == 45
     finally:
         eng.sync_engine.dispose()
+
+
+def test_statement_cache_defaults_and_clamping():
+    """Кеши запросов настраиваются через env; 0 (pgbouncer) допустим, мусор — к дефолтам."""
+    s = Settings()
+    assert s.DATABASE_QUERY_CACHE_SIZE == 2000
+    assert s.DATABASE_STATEMENT_CACHE_SIZE == 1024
+    assert Settings(DATABASE_STATEMENT_CACHE_SIZE='0').DATABASE_STATEMENT_CACHE_SIZE == 0
+    assert Settings(DATABASE_QUERY_CACHE_SIZE=-1).DATABASE_QUERY_CACHE_SIZE == 0
+    assert Settings(DATABASE_STATEMENT_CACHE_SIZE='abc').DATABASE_STATEMENT_CACHE_SIZE == 1024
+
+
+def test_live_engine_is_wired_with_statement_caches():
+    """Боевой engine получает размер кеша компиляции, asyncpg — размер кеша statements."""
+    assert db.engine.sync_engine._compiled_cache.capacity == settings.DATABASE_QUERY_CACHE_SIZE
+    assert db._pg_connect_args['statement_cache_size'] == settings.DATABASE_STATEMENT_CACHE_SIZE
+    assert db._pg_connect_args['prepared_statement_cache_size'] == settings.DATABASE_STATEMENT_CACHE_SIZE
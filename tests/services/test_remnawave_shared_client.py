@@ -0,0 +1,50 @@
+"""Тесты общего клиента RemnaWave API из app.services.remnawave_service."""
+
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import remnawave_service
+from app.services.remnawave_service import RemnaWaveService
+
+
+class _FakeAPI:
+    def __init__(self, **kwargs) -> None:
+        self.kwargs = kwargs
+        self.session = None
+        self.exits = 0
+
+    async def __aenter__(self):
+        self.session = SimpleNamespace(closed=False)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.exits += 1
+        self.session.closed = True
+
+
+def _service(**api_kwargs) -> RemnaWaveService:
+    service = RemnaWaveService.__new__(RemnaWaveService)
+    service._config_error = None
+    service._api_kwargs = {'base_url': 'https://panel', 'api_key': 'key', **api_kwargs}
+    return service
+
+
+@pytest.mark.asyncio
+async def test_shared_api_client_is_reused_and_closed(monkeypatch) -> None:
+    """Клиент открывается один раз, пересоздаётся при смене настроек и закрывается на shutdown."""
+    monkeypatch.setattr(remnawave_service, 'RemnaWaveAPI', _FakeAPI)
+    monkeypatch.setattr(remnawave_service, '_shared_api', None)
+    monkeypatch.setattr(remnawave_service, '_shared_api_kwargs', None)
+
+    api = await _service().get_shared_api_client()
+    assert await _service().get_shared_api_client() is api
+
+    rotated = await _service(api_key='rotated').get_shared_api_client()
+    assert rotated is not api
+    assert api.exits == 1
+    assert rotated.kwargs['api_key'] == 'rotated'
+
+    await remnawave_service.close_shared_api_client()
+    assert rotated.exits == 1
+    assert remnawave_service._shared_api is None
@@ -0,0 +1,25 @@
+"""Тесты общего экземпляра бота из app.bot_factory."""
+
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app import bot_factory
+
+
+@pytest.mark.asyncio
+async def test_shared_bot_is_reused_and_closed(monkeypatch) -> None:
+    """get_shared_bot() возвращает один и тот же бот, close_shared_bot() закрывает его сессию."""
+    monkeypatch.setattr(bot_factory.settings, 'BOT_TOKEN', '123456:TEST')
+    monkeypatch.setattr(bot_factory, '_shared_bot', None)
+
+    bot = bot_factory.get_shared_bot()
+    assert bot_factory.get_shared_bot() is bot
+    assert bot.session._connector_init['limit'] == bot_factory.SHARED_BOT_CONNECTION_LIMIT
+
+    bot.session.close = AsyncMock()
+    await bot_factory.close_shared_bot()
+
+    bot.session.close.assert_awaited_once()
+    assert bot_factory.get_shared_bot() is not bot
+    await bot_factory.close_shared_bot()
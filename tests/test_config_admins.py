@@ -0,0 +1,20 @@
+from app.config import settings
+
+
+def test_is_admin_follows_runtime_admin_ids(monkeypatch):
+    monkeypatch.setattr(settings, 'ADMIN_IDS', '1, 2', raising=False)
+    assert settings.is_admin(telegram_id=2)
+    assert not settings.is_admin(telegram_id=3)
+
+    monkeypatch.setattr(settings, 'ADMIN_IDS', '3', raising=False)
+    assert settings.is_admin(telegram_id=3)
+    assert not settings.is_admin(telegram_id=2)
+    assert settings.get_admin_ids() == [3]
+
+
+def test_is_admin_matches_email_case_insensitively(monkeypatch):
+    monkeypatch.setattr(settings, 'ADMIN_IDS', 'not-a-number', raising=False)
+    monkeypatch.setattr(settings, 'ADMIN_EMAILS', 'Admin@Example.com', raising=False)
+    assert settings.get_admin_ids() == []
+    assert settings.is_admin(telegram_id=1, email='ADMIN@example.com')
+    assert not settings.is_admin(telegram_id=1, email='other@example.com')
@@ -0,0 +1,54 @@
+"""``CacheService.delete_pattern_scan`` deletes via SCAN in batches and never calls KEYS."""
+
+from __future__ import annotations
+
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.utils.cache import CacheService
+
+
+class _FakeRedis:
+    def __init__(self, keys: list[bytes]) -> None:
+        self._keys = keys
+        self.keys = AsyncMock(side_effect=AssertionError('KEYS must not be used'))
+        self.delete = AsyncMock(side_effect=lambda *batch: len(batch))
+        self.scan_match: str | None = None
+
+    async def scan_iter(self, match: str, count: int):
+        self.scan_match = match
+        for key in self._keys:
+            yield key
+
+
+def _service(redis_client: _FakeRedis) -> CacheService:
+    service = CacheService()
+    service.redis_client = redis_client
+    service._connected = True
+    return service
+
+
+@pytest.mark.asyncio
+async def test_deletes_matching_keys_in_batches() -> None:
+    redis_client = _FakeRedis([f'admin:list:{i}'.encode() for i in range(5)])
+
+    deleted = await _service(redis_client).delete_pattern_scan('admin:list:*', batch_size=2)
+
+    assert deleted == 5
+    assert redis_client.scan_match == 'admin:list:*'
+    assert [len(call.args) for call in redis_client.delete.await_args_list] == [2, 2, 1]
+    redis_client.keys.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_no_matches_skips_delete() -> None:
+    redis_client = _FakeRedis([])
+
+    assert await _service(redis_client).delete_pattern_scan('admin:list:*') == 0
+    redis_client.delete.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_disconnected_cache_is_noop() -> None:
+    assert await CacheService().delete_pattern_scan('admin:list:*') == 0
@@ -0,0 +1,39 @@
+"""Тесты in-process слоя ChannelSubCache."""
+
+import pytest
+
+from app.utils.cache import ChannelSubCache
+
+
+@pytest.fixture(autouse=True)
+def _clear_local_statuses():
+    ChannelSubCache._local_statuses.clear()
+    yield
+    ChannelSubCache._local_statuses.clear()
+
+
+@pytest.mark.asyncio
+async def test_set_status_is_served_without_redis() -> None:
+    """Статус, записанный через set_sub_status, читается из памяти процесса."""
+    await ChannelSubCache.set_sub_status(1, '-100', True)
+    await ChannelSubCache.set_sub_status(1, '-200', False)
+
+    statuses = await ChannelSubCache.get_sub_statuses(1, ['-100', '-200', '-300'])
+
+    assert statuses == {'-100': True, '-200': False, '-300': None}
+    assert await ChannelSubCache.get_sub_status(1, '-100') is True
+
+
+@pytest.mark.asyncio
+async def test_invalidate_user_channels_drops_local_statuses() -> None:
+    """Инвалидация пользователя очищает и локальный слой."""
+    await ChannelSubCache.set_sub_status(1, '-100', True)
+
+    await ChannelSubCache.invalidate_user_channels(1, ['-100'])
+
+    assert await ChannelSubCache.get_sub_status(1, '-100') is None
+
+
+def test_non_member_status_has_shorter_local_ttl() -> None:
+    """Отрицательный статус живёт в памяти меньше положительного."""
+    assert ChannelSubCache.LOCAL_NON_MEMBER_TTL < ChannelSubCache.LOCAL_MEMBER_TTL <= ChannelSubCache.SUB_TTL
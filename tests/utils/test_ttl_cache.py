@@ -0,0 +1,59 @@
+"""Тесты для in-process TTL-кеша из app.utils.ttl_cache."""
+
+from app.utils import ttl_cache
+from app.utils.ttl_cache import TTLCache
+
+
+def test_get_returns_value_until_expiry(monkeypatch) -> None:
+    """Значение доступно до истечения TTL и пропадает после."""
+    now = [100.0]
+    monkeypatch.setattr(ttl_cache.time, 'monotonic', lambda: now[0])
+
+    cache = TTLCache(maxsize=10, ttl=30)
+    cache['key'] = 'value'
+    assert cache.get('key') == 'value'
+    assert 'key' in cache
+
+    now[0] += 30
+    assert cache.get('key') is None
+    assert 'key' not in cache
+
+
+def test_per_entry_ttl_overrides_default(monkeypatch) -> None:
+    """Явный ttl в set() перекрывает общий TTL кеша."""
+    now = [0.0]
+    monkeypatch.setattr(ttl_cache.time, 'monotonic', lambda: now[0])
+
+    cache = TTLCache(maxsize=10, ttl=300)
+    cache.set('short', 1, ttl=5)
+    cache.set('long', 2)
+
+    now[0] += 10
+    assert cache.get('short') is None
+    assert cache.get('long') == 2
+
+
+def test_oldest_entry_evicted_when_full() -> None:
+    """При переполнении вытесняется самая старая запись."""
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache['a'] = 1
+    cache['b'] = 2
+    cache['c'] = 3
+
+    assert len(cache) == 2
+    assert cache.get('a') is None
+    assert cache.get('b') == 2
+    assert cache.get('c') == 3
+
+
+def test_pop_and_clear() -> None:
+    """pop() возвращает значение и удаляет его, clear() очищает кеш."""
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache['a'] = 1
+    cache['b'] = 2
+
+    assert cache.pop('a') == 1
+    assert cache.pop('a', 'missing') == 'missing'
+
+    cache.clear()
+    assert len(cache) == 0